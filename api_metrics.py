@@ -0,0 +1,150 @@
+# api_metrics.py
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class CallRecord(NamedTuple):
+    """One HTTP attempt made by SteganographyAPI; retries produce one record each"""
+    endpoint: str  # e.g. "/decode" or "/images", without IDs
+    method: str
+    outcome: str  # "ok", "client_error", "server_error", "timeout" or "connection_error"
+    status: Optional[int]
+    request_bytes: int
+    response_bytes: int
+    ttfb: float  # Seconds until the response headers arrived
+    total: float  # Seconds until the response body was read
+    attempt: int
+    timestamp: float
+
+def outcome_class(status: Optional[int], error: Optional[Exception] = None) -> str:
+    """Classify an attempt by its HTTP status, or by the exception raised instead of a response"""
+    if error is not None:
+        return "timeout" if "Timeout" in type(error).__name__ else "connection_error"
+    if status >= 500:
+        return "server_error"
+    if status >= 400:
+        return "client_error"
+    return "ok"
+
+class HistogramSink:
+    """In-memory latency histograms and byte counters per endpoint and outcome"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, str], Dict[str, list]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, record: CallRecord) -> None:
+        key = (record.endpoint, record.outcome)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    'total': [0] * (len(self.buckets) + 1),
+                    'ttfb': [0] * (len(self.buckets) + 1),
+                    # count, total seconds, ttfb seconds, request bytes, response bytes
+                    'sums': [0, 0.0, 0.0, 0, 0],
+                }
+            series['total'][bisect.bisect_left(self.buckets, record.total)] += 1
+            series['ttfb'][bisect.bisect_left(self.buckets, record.ttfb)] += 1
+            sums = series['sums']
+            sums[0] += 1
+            sums[1] += record.total
+            sums[2] += record.ttfb
+            sums[3] += record.request_bytes
+            sums[4] += record.response_bytes
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Return count, mean times and byte totals per "endpoint outcome" series"""
+        with self._lock:
+            return {
+                f"{endpoint} {outcome}": {
+                    'count': sums[0],
+                    'mean_ms': sums[1] / sums[0] * 1000,
+                    'mean_ttfb_ms': sums[2] / sums[0] * 1000,
+                    'request_bytes': sums[3],
+                    'response_bytes': sums[4],
+                }
+                for (endpoint, outcome), series in sorted(self._series.items())
+                for sums in [series['sums']]
+            }
+
+    def prometheus_text(self, prefix: str = "hide_api") -> str:
+        """Render the histograms and counters in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            series = sorted(self._series.items())
+            for metric, field, sum_index, help_text in (
+                ('request_duration_seconds', 'total', 1, 'Time until the response body was read'),
+                ('time_to_first_byte_seconds', 'ttfb', 2, 'Time until the response headers arrived'),
+            ):
+                name = f"{prefix}_{metric}"
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for (endpoint, outcome), data in series:
+                    labels = f'endpoint="{endpoint}",outcome="{outcome}"'
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + (float('inf'),), data[field]):
+                        cumulative += count
+                        le = "+Inf" if bound == float('inf') else repr(bound)
+                        lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+                    lines.append(f"{name}_sum{{{labels}}} {data['sums'][sum_index]}")
+                    lines.append(f"{name}_count{{{labels}}} {data['sums'][0]}")
+            for metric, sum_index, help_text in (
+                ('request_bytes_total', 3, 'Bytes sent in request bodies'),
+                ('response_bytes_total', 4, 'Bytes received in response bodies'),
+            ):
+                name = f"{prefix}_{metric}"
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for (endpoint, outcome), data in series:
+                    lines.append(f'{name}{{endpoint="{endpoint}",outcome="{outcome}"}} {data["sums"][sum_index]}')
+        return "\n".join(lines) + "\n"
+
+class JsonLinesSink:
+    """Appends every record as one JSON object per line"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', buffering=1)
+        self._lock = threading.Lock()
+
+    def __call__(self, record: CallRecord) -> None:
+        line = json.dumps(record._asdict())
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+class PrometheusTextSink:
+    """Keeps histograms and rewrites a Prometheus text file (e.g. for the node exporter) at most every `interval` seconds"""
+
+    def __init__(self, path: str, interval: float = 10.0, prefix: str = "hide_api"):
+        self.path = path
+        self.interval = interval
+        self.prefix = prefix
+        self.histogram = HistogramSink()
+        self._written_at = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, record: CallRecord) -> None:
+        self.histogram(record)
+        if time.monotonic() - self._written_at >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the file now; it is replaced atomically so scrapers never read a partial file"""
+        with self._lock:
+            self._written_at = time.monotonic()
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-", suffix=".prom")
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.histogram.prometheus_text(self.prefix))
+            os.replace(temp_path, self.path)
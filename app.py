@@ -2,6 +2,9 @@ import streamlit as st
 from auth import register_user, login_user, init_db
 from profile_manager import create_profile, get_profile, update_profile
 from PIL import Image
+import lsb
+from stego_engine import SteganographyEngine
+from steganography_api import NoMessageFoundError
 import os
 from io import BytesIO
 import datetime
@@ -64,56 +67,27 @@ def download_icon_button(file_path):
                 key=file_path  # Ensure unique key for each button
             )
 
+# One engine per server process; it picks the fastest local backend at startup
+@st.cache_resource
+def get_engine() -> SteganographyEngine:
+    return SteganographyEngine.create()
+
 # Updated encoding function
 def encode(img_path: str, data: str, new_img_name: str) -> None:
     if not data:
         raise ValueError("Data is empty")
-    image = Image.open(img_path)
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
-    encoded_image = embed_data(image, data)
-    encoded_image.save(new_img_name, format='PNG')
+    get_engine().encode(img_path, data, new_img_name)
 
-# Updated decoding function
+# Updated decoding function; also reads images encoded by older versions
 def decode(img_path: str) -> str:
-    image = Image.open(img_path)
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
-    width, height = image.size
-    binary_data = ""
-    for y in range(height):
-        for x in range(width):
-            pixel = list(image.getpixel((x, y)))
-            for color in pixel:
-                binary_data += str(color & 1)
-            if len(binary_data) >= 8 and binary_data[-8:] == '00000000':
-                break
-        if len(binary_data) >= 8 and binary_data[-8:] == '00000000':
-            break
-    decoded_data = ""
-    for i in range(0, len(binary_data) - 8, 8):
-        byte = binary_data[i:i+8]
-        decoded_data += chr(int(byte, 2))
-    return decoded_data.rstrip('\x00')
+    try:
+        return get_engine().decode(img_path)
+    except NoMessageFoundError:
+        return ""  # No hidden data in this image
 
 # Updated helper function for embedding data
 def embed_data(image: Image.Image, data: str) -> Image.Image:
-    width, height = image.size
-    binary_data = ''.join(format(ord(char), '08b') for char in data) + '00000000'
-    data_index = 0
-    encoded_image = image.copy()
-    
-    for y in range(height):
-        for x in range(width):
-            pixel = list(encoded_image.getpixel((x, y)))
-            for color_channel in range(3):
-                if data_index < len(binary_data):
-                    pixel[color_channel] = (pixel[color_channel] & ~1) | int(binary_data[data_index])
-                    data_index += 1
-            encoded_image.putpixel((x, y), tuple(pixel))
-            if data_index >= len(binary_data):
-                return encoded_image
-    return encoded_image
+    return lsb.embed_container(image, data)
 
 def main():
     load_css()
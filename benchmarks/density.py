@@ -0,0 +1,74 @@
+"""
+Density benchmark for `lsb`: compares pixels touched and time per KB of payload for every LSB density.
+
+Run from the repository root:
+
+    python -m benchmarks.density --payload-kb 1 16 64
+"""
+
+import argparse
+import time
+
+import numpy as np
+from PIL import Image
+
+import lsb
+
+
+def pixels_touched(length: int, bits_per_channel: int, use_alpha: bool) -> int:
+    """
+    Count the pixels modified when encoding a payload of the given length.
+
+    Args:
+    length (int): The payload length in bytes.
+    bits_per_channel (int): The number of LSBs used per channel value.
+    use_alpha (bool): Whether the alpha channel carries payload.
+
+    Returns:
+    int: The number of pixels holding the header and the payload.
+    """
+    flags = lsb.density_flags(bits_per_channel, use_alpha)
+    if not flags:
+        return -(-(lsb.HEADER.size + length) * 8 // 3)
+    return lsb.HEADER_PIXELS + lsb.dense_pixel_count(length, flags)
+
+
+def time_call(function, *args) -> float:
+    """Return the wall-clock time of one call, in seconds."""
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--payload-kb", type=float, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--size", type=int, nargs=2, default=[2000, 1500], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    width, height = args.size
+    pixels = np.random.default_rng(0).integers(0, 256, (height, width, 4), dtype=np.uint8)
+    image = Image.fromarray(pixels, "RGBA")
+
+    print(f"{'KB':>6} {'bits':>5} {'alpha':>6} {'pixels':>10} {'enc ms/KB':>10} {'dec ms/KB':>10}")
+    for payload_kb in args.payload_kb:
+        data = "x" * int(payload_kb * 1024)
+        for bits_per_channel in range(1, lsb.MAX_BITS_PER_CHANNEL + 1):
+            for use_alpha in (False, True):
+                try:
+                    encoded = lsb.embed_container(image, data, bits_per_channel, use_alpha)
+                except ValueError:
+                    print(f"{payload_kb:>6g} {bits_per_channel:>5} {str(use_alpha):>6} {'does not fit':>10}")
+                    continue
+
+                encode_time = min(time_call(lsb.embed_container, image, data, bits_per_channel, use_alpha)
+                                  for _ in range(args.repeat))
+                decode_time = min(time_call(lsb.decode_image, encoded) for _ in range(args.repeat))
+                print(f"{payload_kb:>6g} {bits_per_channel:>5} {str(use_alpha):>6} "
+                      f"{pixels_touched(len(data), bits_per_channel, use_alpha):>10} "
+                      f"{encode_time * 1000 / payload_kb:>10.3f} {decode_time * 1000 / payload_kb:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Load test of the API client: simulated feed users decode pages of posts against a Hide-rs server.
+
+Without --url, a `stand_in_server` is started in-process with the given injected latency and error rate, so
+client and caching changes can be measured offline. Run from the repository root:
+
+    python -m benchmarks.load_test --users 16 --duration 30 --latency 0.02 --error-rate 0.01
+    python -m benchmarks.load_test --users 16 --mode batch --cache
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from PIL import Image
+
+import lsb
+from decode_cache import DecodeCache
+from stand_in_server import ServerConfig, StandInServer
+from steganography_api import NoMessageFoundError, SteganographyAPI
+
+
+def make_corpus(directory: str, count: int, megapixels: float, seed: int = 0) -> list[str]:
+    """
+    Write `count` random PNG posts, two thirds of them carrying a copyright mark.
+
+    Returns:
+    list[str]: The paths of the posts.
+    """
+    rng = random.Random(seed)
+    height = max(8, int((megapixels * 1e6 / 1.5) ** 0.5))
+    width = int(height * 1.5)
+    paths = []
+    for index in range(count):
+        image = Image.frombytes("RGB", (width, height), rng.randbytes(width * height * 3))
+        path = os.path.join(directory, f"post_{index}.png")
+        if index % 3:
+            image = lsb.embed_container(image, f"Copyright_user{index}_2024-01-01 00:00:00")
+        image.save(path, "PNG", compress_level=1)
+        paths.append(path)
+    return paths
+
+
+class Recorder:
+    """Thread-safe latency lists per operation, plus error counts."""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, operation: str, seconds: float, failed: bool = False) -> None:
+        with self._lock:
+            self.latencies.setdefault(operation, []).append(seconds)
+            if failed:
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+
+    def report(self, elapsed: float) -> dict:
+        """Return count, throughput, p50/p95/p99 latency and errors per operation."""
+        report = {}
+        for operation, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            report[operation] = {
+                "count": len(values),
+                "per_s": len(values) / elapsed,
+                "p50_ms": _percentile(values, 50) * 1000,
+                "p95_ms": _percentile(values, 95) * 1000,
+                "p99_ms": _percentile(values, 99) * 1000,
+                "errors": self.errors.get(operation, 0),
+            }
+        return report
+
+
+def feed_user(api: SteganographyAPI, posts: list[str], args: argparse.Namespace, recorder: Recorder,
+              deadline: float, seed: int) -> None:
+    """Render feed pages until the deadline; occasionally publish a new post."""
+    rng = random.Random(seed)
+    upload = io.BytesIO()
+    Image.open(posts[0]).save(upload, "PNG")
+    workdir = tempfile.mkdtemp(prefix="hide-load-user-")
+    try:
+        while time.perf_counter() < deadline:
+            if rng.random() < args.post_ratio:
+                start = time.perf_counter()
+                try:
+                    api.encode_to_file(upload.getvalue(), f"Copyright_load{seed}_{time.time()}",
+                                       os.path.join(workdir, "encoded.png"))
+                    recorder.add("post", time.perf_counter() - start)
+                except Exception:
+                    recorder.add("post", time.perf_counter() - start, failed=True)
+                continue
+
+            page = rng.sample(posts, min(args.page_size, len(posts)))
+            page_start = time.perf_counter()
+            if args.mode == "batch":
+                # A batch item's latency is the time until its result arrived
+                for result in api.decode_batch(page):
+                    failed = result.error is not None and not isinstance(result.error, NoMessageFoundError)
+                    recorder.add("decode", time.perf_counter() - page_start, failed)
+            else:
+                for post in page:
+                    start = time.perf_counter()
+                    failed = False
+                    try:
+                        api.decode(post)
+                    except NoMessageFoundError:
+                        pass
+                    except Exception:
+                        failed = True
+                    recorder.add("decode", time.perf_counter() - start, failed)
+            recorder.add("page", time.perf_counter() - page_start)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="Base URL of a running server; a stand-in is started if omitted")
+    parser.add_argument("--users", type=int, default=8, help="Concurrent simulated feed users")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to run")
+    parser.add_argument("--mode", choices=["sequential", "batch"], default="sequential",
+                        help="Decode a page post by post, or with one decode_batch call")
+    parser.add_argument("--page-size", type=int, default=9)
+    parser.add_argument("--posts", type=int, default=50, help="Number of distinct posts in the feed")
+    parser.add_argument("--megapixels", type=float, default=0.3, help="Size of every post")
+    parser.add_argument("--post-ratio", type=float, default=0.05, help="Fraction of iterations that publish a post")
+    parser.add_argument("--cache", action="store_true", help="Use a DecodeCache in the client")
+    parser.add_argument("--latency", type=float, default=0.0, help="Stand-in server latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        server = StandInServer(("127.0.0.1", 0), ServerConfig(args.latency, args.jitter, args.error_rate))
+        server.start()
+        url = server.base_url
+
+    corpus_dir = tempfile.mkdtemp(prefix="hide-load-")
+    try:
+        posts = make_corpus(corpus_dir, args.posts, args.megapixels)
+        api = SteganographyAPI(url, cache=DecodeCache() if args.cache else None, pool_size=args.users)
+        recorder = Recorder()
+        start = time.perf_counter()
+        deadline = start + args.duration
+        users = [
+            threading.Thread(target=feed_user, args=(api, posts, args, recorder, deadline, seed))
+            for seed in range(args.users)
+        ]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(corpus_dir, ignore_errors=True)
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    report = recorder.report(elapsed)
+    print(f"{args.users} users, {args.mode} decoding, cache {'on' if args.cache else 'off'}, {elapsed:.1f} s")
+    print(f"{'operation':>10} {'count':>7} {'per s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for operation, stats in report.items():
+        print(f"{operation:>10} {stats['count']:>7} {stats['per_s']:>8.1f} {stats['p50_ms']:>9.1f} "
+              f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['errors']:>7}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "elapsed": elapsed, "operations": report,
+                       "client": api.latency_stats()}, f, indent=2)
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    return values[min(len(values) - 1, max(0, math.ceil(len(values) * percent / 100) - 1))] if values else 0.0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Scaling benchmark for `lsb_parallel`: times tiled encoding and decoding of a single large image with 1 to N workers.
+
+Run from the repository root:
+
+    python -m benchmarks.parallel_scaling --megapixels 20 50 100 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+import lsb
+import lsb_parallel
+
+
+def make_image(megapixels: float, seed: int = 0) -> Image.Image:
+    """
+    Generate a random RGB image of roughly the given size with a 3:2 aspect ratio.
+
+    Args:
+    megapixels (float): The number of pixels in millions.
+    seed (int): The seed of the random generator.
+
+    Returns:
+    Image.Image: The generated image.
+    """
+    height = int((megapixels * 1e6 / 1.5) ** 0.5)
+    width = int(height * 1.5)
+    pixels = np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    return Image.fromarray(pixels)
+
+
+def time_call(function, *args, repeat: int = 3) -> float:
+    """Return the best wall-clock time of `repeat` calls, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[20, 50, 100])
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--fill", type=float, default=0.5,
+                        help="Fraction of the image capacity filled with payload")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'MP':>6} {'workers':>8} {'encode s':>9} {'decode s':>9} {'speedup':>8}")
+    for megapixels in args.megapixels:
+        image = make_image(megapixels)
+        capacity = image.width * image.height * 3 // 8 - lsb.HEADER.size
+        data = "x" * int(capacity * args.fill)
+
+        serial = time_call(lsb.embed_container, image, data, repeat=args.repeat)
+        encoded = lsb.embed_container(image, data)
+        print(f"{megapixels:>6g} {'serial':>8} {serial:>9.2f} "
+              f"{time_call(lsb.decode_image, encoded, repeat=args.repeat):>9.2f} {1:>8.2f}")
+
+        for workers in args.workers:
+            encode_time = time_call(lsb_parallel.embed_container, image, data, workers, repeat=args.repeat)
+            decode_time = time_call(lsb_parallel.extract_container, encoded, workers, repeat=args.repeat)
+            print(f"{megapixels:>6g} {workers:>8} {encode_time:>9.2f} {decode_time:>9.2f} "
+                  f"{serial / encode_time:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
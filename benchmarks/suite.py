@@ -0,0 +1,309 @@
+"""
+Benchmark suite covering every encode/decode implementation in the project.
+
+Each case (implementation, operation, image size, image mode, payload size) runs in a fresh process, so
+peak memory can be measured from the process's maximum resident set size. Results are written as JSON
+and can be compared against a stored baseline:
+
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --output new.json --baseline bench.json
+
+`app.encode` and `app.decode` go through `stego_engine`, whose vectorized backend calls
+`lsb.encode(..., streaming=True)` and `lsb.decode`; these are measured as the "lsb-streaming" and "lsb"
+implementations.
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+import lsb
+import lsb_parallel
+import lsb_probe
+from steganography_api import SteganographyAPI
+
+QUICK_MEGAPIXELS = [0.1, 1, 12]
+FULL_MEGAPIXELS = [0.1, 1, 12, 50]
+QUICK_PAYLOADS = [16, 1024]
+FULL_PAYLOADS = [16, 1024, 16 * 1024, 64 * 1024]
+MODES = ["RGB", "RGBA", "L", "P"]
+DEFAULT_REPEAT = 20
+# Tail percentiles are only reported once a case has enough repeats to resolve them:
+# with fewer than 100 / (100 - p) latencies, the p-th percentile is simply the maximum.
+TAIL_PERCENTILES = [95, 99]
+
+
+def legacy_pure_encode(src: str, data: str, dst: str) -> None:
+    """The original iterator-based stop-bit encoder of `lsb`."""
+    image = Image.open(src)
+    new_image = image.copy()
+    lsb.embed_data(new_image, data)
+    new_image.save(dst, "PNG")
+
+
+def legacy_pure_decode(path: str) -> str:
+    """The original iterator-based stop-bit decoder of `lsb`."""
+    return lsb.decode_pixels(Image.open(path).getdata())
+
+
+def container_pure_encode(src: str, data: str, dst: str) -> None:
+    """The container format written without NumPy."""
+    image = Image.open(src)
+    image = image.convert("RGB") if image.mode not in ("RGB", "RGBA") else image.copy()
+    lsb.embed_bytes_pixels(image, lsb.build_container(data))
+    image.save(dst, "PNG")
+
+
+def container_pure_decode(path: str) -> str:
+    """The container format read without NumPy."""
+    image = Image.open(path)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+    return lsb.extract_container_pixels(image.getdata())
+
+
+def remote_encode(url: str):
+    api = SteganographyAPI(url)
+
+    def encode(src: str, data: str, dst: str) -> None:
+        result = api.encode(src, data)
+        api.download_image(result["image_id"], dst)
+    return encode
+
+
+def remote_decode(url: str):
+    return SteganographyAPI(url).decode
+
+
+def implementations(remote_url: str | None) -> dict:
+    """
+    Return the benchmarked implementations.
+
+    Returns:
+    dict: Maps each name to an (encode, decode) pair; encode takes
+        (source path, data, output path) and decode takes a path.
+    """
+    impls = {
+        "legacy-pure": (legacy_pure_encode, legacy_pure_decode),
+        "container-pure": (container_pure_encode, container_pure_decode),
+        "lsb": (lsb.encode, lsb.decode),
+        "lsb-streaming": (lambda src, data, dst: lsb.encode_streaming(src, data, dst), lsb.decode),
+        "lsb-parallel": (lsb_parallel.encode, lsb_parallel.decode),
+        "lsb-probe": (lsb.encode, lsb_probe.probe),
+    }
+    if remote_url:
+        impls["remote"] = (remote_encode(remote_url), remote_decode(remote_url))
+    return impls
+
+
+def make_payload(size: int) -> str:
+    """Return a copyright mark padded to `size` characters, so probes take the path of a marked image."""
+    return f"{lsb_probe.COPYRIGHT_PREFIX}bench_2000-01-01 00:00:00".ljust(size, "x")
+
+
+def make_image(path: str, megapixels: float, mode: str, seed: int = 0) -> None:
+    """Write a random image of roughly the given size and mode, with a 3:2 aspect ratio, as PNG."""
+    height = max(1, int((megapixels * 1e6 / 1.5) ** 0.5))
+    width = max(1, int(height * 1.5))
+    pixels = np.random.default_rng(seed).integers(0, 256, (height, width, 4), dtype=np.uint8)
+    image = Image.fromarray(pixels, "RGBA")
+    if mode == "P":
+        image = image.convert("RGB").quantize(256)
+    elif mode != "RGBA":
+        image = image.convert(mode)
+    image.save(path, "PNG", compress_level=1)
+
+
+def max_rss_mb() -> float:
+    """Return the peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(case: dict) -> dict:
+    """
+    Run one case in the current process and return its measurements.
+
+    Args:
+    case (dict): The implementation, operation, paths, payload and repeat count.
+
+    Returns:
+    dict: The case with latency percentiles and maximum, throughput and peak memory (the process peak
+        and its growth over the peak after imports), or an error. Decodes that do not return the
+        encoded payload are reported as errors.
+    """
+    encode, decode = implementations(case["remote_url"])[case["impl"]]
+    data = make_payload(case["payload"])
+    baseline = max_rss_mb()
+
+    latencies = []
+    try:
+        for _ in range(case["repeat"]):
+            start = time.perf_counter()
+            if case["op"] == "encode":
+                encode(case["src"], data, case["dst"])
+            else:
+                decoded = decode(case["dst"])
+            latencies.append(time.perf_counter() - start)
+        if case["op"] == "decode":
+            message = decoded.message if isinstance(decoded, lsb_probe.ProbeResult) else decoded
+            if message != data:
+                raise ValueError(f"Decoded {str(message)[:32]!r} instead of the encoded payload")
+    except Exception as e:  # Unsupported modes and capacity errors are recorded, not fatal
+        return {**_public(case), "error": f"{type(e).__name__}: {e}"}
+
+    latencies.sort()
+    mean = statistics.fmean(latencies)
+    result = {**_public(case), "p50_ms": _percentile(latencies, 50) * 1000}
+    for percent in TAIL_PERCENTILES:
+        if len(latencies) >= 100 / (100 - percent):
+            result[f"p{percent}_ms"] = _percentile(latencies, percent) * 1000
+    return {
+        **result,
+        "max_ms": latencies[-1] * 1000,
+        "mean_ms": mean * 1000,
+        "ops_per_s": 1 / mean,
+        "payload_kb_per_s": case["payload"] / 1024 / mean,
+        "peak_rss_mb": max_rss_mb(),
+        "rss_growth_mb": max(0.0, max_rss_mb() - baseline),
+    }
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    """
+    Compare median latencies against a baseline run.
+
+    Args:
+    results (list[dict]): The current results.
+    baseline (list[dict]): The stored results.
+    tolerance (float): The relative slowdown reported as a regression.
+
+    Returns:
+    list[str]: One line per regressed case.
+    """
+    previous = {_key(result): result for result in baseline if "p50_ms" in result}
+    regressions = []
+    for result in results:
+        old = previous.get(_key(result))
+        if old is None or "p50_ms" not in result:
+            continue
+        change = result["p50_ms"] / old["p50_ms"] - 1
+        line = (f"{result['impl']:>15} {result['op']:>6} {result['megapixels']:>5g}MP {result['mode']:>4} "
+                f"{result['payload']:>6}B  {old['p50_ms']:>9.2f} -> {result['p50_ms']:>9.2f} ms ({change:+.0%})")
+        print(line)
+        if change > tolerance:
+            regressions.append(line)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--full", action="store_true", help="Run the full 0.1-50 MP, 16 B-64 KB matrix")
+    parser.add_argument("--impl", nargs="+", help="Only run these implementations")
+    parser.add_argument("--megapixels", type=float, nargs="+")
+    parser.add_argument("--payload", type=int, nargs="+", help="Payload sizes in bytes")
+    parser.add_argument("--mode", nargs="+", choices=MODES)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help="Runs per case; p95 needs at least 20 and p99 at least 100")
+    parser.add_argument("--remote-url", help="Base URL of a Hide-rs server to include")
+    parser.add_argument("--workdir", help="Directory for generated images (kept between runs)")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Slowdown reported as a regression")
+    args = parser.parse_args()
+
+    megapixels = args.megapixels or (FULL_MEGAPIXELS if args.full else QUICK_MEGAPIXELS)
+    payloads = args.payload or (FULL_PAYLOADS if args.full else QUICK_PAYLOADS)
+    modes = args.mode or MODES
+    impls = args.impl or list(implementations(args.remote_url))
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="hide-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    context = multiprocessing.get_context("spawn")
+    results = []
+
+    try:
+        for size in megapixels:
+            for mode in modes:
+                src = os.path.join(workdir, f"{size:g}mp_{mode}.png")
+                if not os.path.exists(src):
+                    make_image(src, size, mode)
+                for payload in payloads:
+                    for impl in impls:
+                        dst = os.path.join(workdir, f"{size:g}mp_{mode}_{payload}_{impl}.out.png")
+                        for op in ("encode", "decode"):
+                            case = {"impl": impl, "op": op, "megapixels": size, "mode": mode,
+                                    "payload": payload, "repeat": args.repeat, "src": src, "dst": dst,
+                                    "remote_url": args.remote_url}
+                            with context.Pool(1) as pool:
+                                result = pool.apply(run_case, (case,))
+                            results.append(result)
+                            _print_result(result)
+                            if "error" in result:
+                                break
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pillow": Image.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+def _public(case: dict) -> dict:
+    return {key: case[key] for key in ("impl", "op", "megapixels", "mode", "payload", "repeat")}
+
+
+def _key(result: dict) -> tuple:
+    return result["impl"], result["op"], result["megapixels"], result["mode"], result["payload"]
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    return values[min(len(values) - 1, max(0, math.ceil(len(values) * percent / 100) - 1))]
+
+
+def _print_result(result: dict) -> None:
+    label = (f"{result['impl']:>15} {result['op']:>6} {result['megapixels']:>5g}MP {result['mode']:>4} "
+             f"{result['payload']:>6}B")
+    if "error" in result:
+        print(f"{label}  {result['error']}")
+    else:
+        tail = f"p95 {result['p95_ms']:>9.2f} ms" if "p95_ms" in result else f"max {result['max_ms']:>9.2f} ms"
+        print(f"{label}  p50 {result['p50_ms']:>9.2f} ms  {tail}  "
+              f"{result['ops_per_s']:>8.2f} ops/s  {result['peak_rss_mb']:>7.1f} MB "
+              f"(+{result['rss_growth_mb']:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# circuit_breaker.py
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+class CircuitBreaker:
+    """Stops calls to a failing backend and lets a trial call through once it may have recovered
+
+    The circuit opens after `failure_threshold` consecutive failures; calls slower than
+    `slow_call_threshold` seconds count as failures. After `reset_timeout` seconds a single trial call
+    is allowed (half-open): its success closes the circuit, its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int = 5, slow_call_threshold: float = 5.0, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return self.CLOSED
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return self.OPEN
+            return self.HALF_OPEN
+
+    def allow_request(self) -> bool:
+        """Return whether the next call may go to the backend"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self, latency: float) -> None:
+        """Record a completed call and its latency in seconds"""
+        if latency > self.slow_call_threshold:
+            self.record_failure()
+            return
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        """Record a failed call"""
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+class LatencyStats:
+    """Call and error counts of one backend, with percentiles over its most recent latencies"""
+
+    def __init__(self, window: int = 1024):
+        self.calls = 0
+        self.errors = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, failed: bool = False) -> None:
+        """Record one call and its latency in seconds"""
+        with self._lock:
+            self.calls += 1
+            self.errors += failed
+            self._latencies.append(latency)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Return the counts and the mean, p50, p95 and max latency in milliseconds"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {'calls': self.calls, 'errors': self.errors}
+        if not latencies:
+            return stats
+        stats.update({
+            'mean_ms': sum(latencies) / len(latencies) * 1000,
+            'p50_ms': latencies[(len(latencies) - 1) // 2] * 1000,
+            'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+            'max_ms': latencies[-1] * 1000,
+        })
+        return stats
@@ -0,0 +1,128 @@
+# decode_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# Read size used when hashing files
+HASH_CHUNK_SIZE = 1 << 20
+
+class DecodeCache:
+    """LRU cache of decode results keyed by the SHA-256 of the image contents, with an optional SQLite tier
+
+    A cached result is either the decoded message or None, meaning the image holds no message.
+    The digests of file paths are remembered for up to `max_entries` paths as well.
+    """
+
+    def __init__(self, max_entries: int = 1024, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        # path -> (digest, mtime_ns, size), so unchanged files are not hashed again; least recently used first
+        self._paths: "OrderedDict[str, Tuple[str, int, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute('CREATE TABLE IF NOT EXISTS decode_cache '
+                               '(digest TEXT PRIMARY KEY, message TEXT, found INTEGER, created REAL)')
+            self._conn.commit()
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        """Return the SHA-256 hex digest of image contents"""
+        return hashlib.sha256(data).hexdigest()
+
+    def digest_for_path(self, path: str) -> str:
+        """Return the digest of a file, hashing it only if it changed since it was last seen"""
+        stat = os.stat(path)
+        with self._lock:
+            known = self._paths.get(path)
+            if known:
+                self._paths.move_to_end(path)
+        if known and known[1:] == (stat.st_mtime_ns, stat.st_size):
+            return known[0]
+
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        with self._lock:
+            self._paths[path] = (digest, stat.st_mtime_ns, stat.st_size)
+            self._paths.move_to_end(path)
+            while len(self._paths) > self.max_entries:
+                self._paths.popitem(last=False)
+        return digest
+
+    def get(self, digest: str) -> Tuple[bool, Optional[str]]:
+        """Look up a result; returns (found, message)"""
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return True, self._entries[digest]
+
+            if self._conn is not None:
+                row = self._conn.execute('SELECT message, found FROM decode_cache WHERE digest=?',
+                                         (digest,)).fetchone()
+                if row:
+                    message = row[0] if row[1] else None
+                    self._remember(digest, message)
+                    self.hits += 1
+                    return True, message
+
+            self.misses += 1
+            return False, None
+
+    def put(self, digest: str, message: Optional[str]) -> None:
+        """Store a result; None records that the image holds no message"""
+        with self._lock:
+            self._remember(digest, message)
+            if self._conn is not None:
+                self._conn.execute('INSERT OR REPLACE INTO decode_cache (digest, message, found, created) '
+                                   'VALUES (?, ?, ?, ?)', (digest, message, message is not None, time.time()))
+                self._conn.commit()
+
+    def invalidate(self, key: str) -> bool:
+        """Drop the result for a file path or a digest; returns whether anything was removed"""
+        with self._lock:
+            known = self._paths.pop(key, None)
+        if known is None and os.path.isfile(key):
+            self.digest_for_path(key)
+            with self._lock:
+                known = self._paths.pop(key, None)
+        with self._lock:
+            digest = known[0] if known else key
+            removed = digest in self._entries
+            self._entries.pop(digest, None)
+            if self._conn is not None:
+                cursor = self._conn.execute('DELETE FROM decode_cache WHERE digest=?', (digest,))
+                self._conn.commit()
+                removed = removed or cursor.rowcount > 0
+            return removed
+
+    def clear(self) -> None:
+        """Drop every cached result"""
+        with self._lock:
+            self._entries.clear()
+            self._paths.clear()
+            if self._conn is not None:
+                self._conn.execute('DELETE FROM decode_cache')
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hit/miss counters and the number of in-memory entries"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+    def _remember(self, digest: str, message: Optional[str]) -> None:
+        self._entries[digest] = message
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -1,87 +1,201 @@
 import os
+import tempfile
 import streamlit as st
 from auth import register_user, login_user, init_db
 from profile_manager import create_profile, get_profile, update_profile
 from PIL import Image
-import glob
 from io import BytesIO
-import datetime
-import hashlib
-import uuid
-from steganography_api import SteganographyAPI, SteganographyError, VersionCompatibilityError, NoMessageFoundError
-
-# Initialize the database and API client
+from steganography_api import SteganographyAPI, LocalSteganographyAPI, VersionCompatibilityError, NoMessageFoundError
+from decode_cache import DecodeCache
+from post_index import PostIndex
+from thumbnails import ThumbnailCache
+from job_queue import JobQueue, QueueFullError, WorkerPool
+from media_store import MediaStore
+from post_pipeline import make_handlers, submit_post
+from stego_engine import SteganographyEngine
+import lsb_probe
+import mp4_mark
+
+# Initialize the database
 init_db()
-steg_api = SteganographyAPI("http://localhost:8080/api")  # Replace with your actual API URL
+
+# One API client per server process, so reruns share its connection pool, circuit breaker and local backend.
+# Calls fall back to the in-process lsb backend while the server is failing or slow.
+# Decodes upload only the rows holding the mark when the server says it uses the lsb mark format
+@st.cache_resource
+def get_api():
+    return SteganographyAPI("http://localhost:8080/api", local=LocalSteganographyAPI(),  # Replace with your actual API URL
+                            prefix_upload=True)
+
+# One engine per server process: it picks the fastest of the local and remote backends at startup.
+# Decode results are cached by image content so feed reruns don't decode unchanged posts again
+@st.cache_resource
+def get_engine():
+    return SteganographyEngine.create(api=get_api(), cache=DecodeCache(max_entries=2048, db_path="decode_cache.db"))
+
+# Posts are listed from an index instead of scanning the media folders on every rerun.
+# A new index is filled from disk once; rebuild it later with `python post_index.py rebuild`.
+# Posts are ordered by when the media store saved them, since hard links share their file times
+@st.cache_resource
+def get_post_index():
+    index = PostIndex("posts.db", find_created=get_media_store().created)
+    if index.count() == 0:
+        index.rebuild("media")
+    return index
+
+# The feed shows small WebP thumbnails instead of sending full-resolution originals to the browser
+@st.cache_resource
+def get_thumbnails():
+    return ThumbnailCache("thumbnails")
+
+# Media files are stored once per unique content; the files under media/<user>/ are references to them
+@st.cache_resource
+def get_media_store():
+    return MediaStore("media", "media_store.db")
+
+# Uploads are watermarked by background workers, so the Post page returns immediately.
+# HIDE_POST_WORKERS sets the number of workers in this process; with 0, run them separately
+# with `python post_pipeline.py --workers N` to scale encoding independently of the app
+POST_QUEUE_DEPTH = 100
+
+@st.cache_resource
+def get_job_queue():
+    queue = JobQueue("jobs.db", max_depth=POST_QUEUE_DEPTH)
+    workers = int(os.environ.get("HIDE_POST_WORKERS", "2"))
+    if workers > 0:
+        handlers = make_handlers(get_engine(), get_post_index(), get_thumbnails(), get_media_store())
+        WorkerPool(queue, handlers, workers=workers).start()
+    return queue
+
+# Save a profile picture under a temporary name and move it into place, so a picture that
+# is still linked to a stored blob is replaced instead of written through the link
+def save_profile_picture(img, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".profile-", suffix=".png")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            img.save(f, "PNG")
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+# Seconds between status updates while submitted posts are still being processed
+JOB_POLL_INTERVAL = 2
+
+# Show the status of the posts submitted in this session; the list reruns on its own every
+# JOB_POLL_INTERVAL seconds until every post is finished, without rerunning the whole page
+def show_post_jobs():
+    jobs = [get_job_queue().get(job_id) for job_id in st.session_state.post_jobs]
+    polling = any(job is not None and not job.finished for job in jobs)
+    st.fragment(show_post_job_list, run_every=JOB_POLL_INTERVAL if polling else None)(polling)
+
+def show_post_job_list(polling):
+    st.subheader("Submitted Posts")
+    jobs = [get_job_queue().get(job_id) for job_id in st.session_state.post_jobs]
+    for job in jobs:
+        if job is None:
+            continue
+        file_name = job.payload["file_name"]
+        if job.status == JobQueue.DONE and job.result["outcome"] == "owned":
+            st.info(f"{file_name}: This post belongs to {job.result['owner']}.")
+        elif job.status == JobQueue.DONE:
+            st.success(f"{file_name}: Post uploaded successfully with hidden data!")
+        elif job.status == JobQueue.FAILED:
+            st.error(f"{file_name}: Failed to post: {job.error}")
+        elif job.attempts > 1:
+            st.warning(f"{file_name}: Retrying (attempt {job.attempts} of {job.max_attempts})...")
+        else:
+            st.write(f"{file_name}: Processing...")
+
+    if st.button("Clear finished"):
+        st.session_state.post_jobs = [job.id for job in jobs if job is not None and not job.finished]
+        st.rerun()
+    if polling and all(job is None or job.finished for job in jobs):
+        st.rerun()  # Every post is finished: rerun the page to stop polling and show the new posts
+
+# Show an indexed post; images are shown by their thumbnail, with a larger preview on request.
+# A rendition that was evicted is rebuilt in the background while a placeholder is shown
+def show_post_media(col, post):
+    if post.media_type == "video":
+        col.video(post.path)
+        return
+    thumbnails = get_thumbnails()
+    try:
+        thumbnail = thumbnails.get(post.path, post.sha256)
+    except (OSError, ValueError):
+        col.image(post.path, width=200)  # Not a thumbnailable image; let the browser scale it
+        return
+    if thumbnail is None:
+        col.caption("Preparing image...")
+    else:
+        col.image(thumbnail, width=200)
+    with col.expander("Preview"):
+        preview = thumbnails.get(post.path, post.sha256, thumbnails.preview_size)
+        if preview is None:
+            st.caption("Preparing preview...")
+        else:
+            st.image(preview)
 
 # Define the number of columns per row for posts
 NUM_COLUMNS = 3
-
-def generate_unique_key():
-    return str(uuid.uuid4())
+# Posts rendered per page; a multiple of NUM_COLUMNS so every page fills whole rows
+POSTS_PER_PAGE = 12
+
+# Show previous/next buttons for a paged list and return the offset of the current page.
+# The page number lives in the session state under `key`
+def page_offset(key, total):
+    pages = max(1, -(-total // POSTS_PER_PAGE))
+    page = min(st.session_state.get(key, 0), pages - 1)
+    st.session_state[key] = page
+
+    previous_col, label_col, next_col = st.columns([1, 2, 1])
+    previous_col.button("Previous", key=f"{key}_previous", disabled=page == 0, on_click=set_state, args=(key, page - 1))
+    label_col.write(f"Page {page + 1} of {pages}")
+    next_col.button("Next", key=f"{key}_next", disabled=page == pages - 1, on_click=set_state, args=(key, page + 1))
+    return page * POSTS_PER_PAGE
+
+def set_state(key, value):
+    st.session_state[key] = value
+
+# Download button that reads the file only after the user asked for it, instead of
+# holding the bytes of every post on the page in memory on each rerun
+def download_post_button(col, post):
+    ready_key = f"download_ready_{post}"
+    if not st.session_state.get(ready_key):
+        col.button("Download", key=f"prepare_{post}", on_click=set_state, args=(ready_key, True))
+        return
+
+    with open(post, "rb") as f:
+        data = f.read()
+    col.download_button(
+        label="Save file",
+        data=data,
+        key=f"download_{post}",
+        file_name=os.path.basename(post),
+        mime="application/octet-stream",
+        on_click=set_state,
+        args=(ready_key, False)
+    )
 
 # Dark Theme using custom CSS
 def load_css():
     with open("static/dark_theme.css") as f:
         st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
-# Function to save uploaded media (image or video) to the server
-def save_media(uploaded_file, username):
-    media_folder = f"media/{username}"
-    if not os.path.exists(media_folder):
-        os.makedirs(media_folder)  # Create a directory for the user's media if it doesn't exist
-
-    file_path = os.path.join(media_folder, uploaded_file.name)
-
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())  # Save the uploaded file
-
-    return file_path  # Return the path where the file is saved
-
 # Function to handle user posts (image/video with caption)
-def get_user_posts(username):
-    user_posts = []
-    media_folder = f"media/{username}"
-    
-    if os.path.exists(media_folder):
-        for file in os.listdir(media_folder):
-            file_path = os.path.join(media_folder, file)
-            if file.endswith(('jpg', 'png', 'mp4')):
-                user_posts.append(file_path)
-
-    return user_posts
-
-def get_all_user_posts():
-    all_posts = []
-    media_root = "media"
-
-    # Check if media folder exists
-    if os.path.exists(media_root):
-        # Iterate over each user folder
-        for user_folder in os.listdir(media_root):
-            user_path = os.path.join(media_root, user_folder)
-
-            if os.path.isdir(user_path):
-                # Collect all image and video files for each user
-                for file in os.listdir(user_path):
-                    if file.endswith(('jpg', 'png', 'mp4')):
-                        file_path = os.path.join(user_path, file)
-                        # Append file path, creation time, and username (folder name)
-                        all_posts.append((file_path, os.path.getctime(file_path), user_folder))
-
-    # Sort posts by creation time, descending
-    if all_posts:
-        sorted_posts = sorted(all_posts, key=lambda x: x[1], reverse=True)
-        return [(post[0], post[2]) for post in sorted_posts]  # Return file path and username
-    else:
-        return []  # Return empty list if no posts found
+def get_user_posts(username, limit=None, offset=0):
+    return get_post_index().page(limit, offset, owner=username)
+
+# Posts of all users, newest first
+def get_all_user_posts(limit=None, offset=0):
+    return get_post_index().page(limit, offset)
 
 # Function to delete the selected post
 def delete_post(file_path):
-    if os.path.exists(file_path):
-        os.remove(file_path)  # Remove the file from the server
-        return True
-    return False
+    get_post_index().remove(file_path)
+    # Drops the reference; the stored file goes once no other post uses it
+    return get_media_store().remove(file_path)
 
 # Main application function
 def main():
@@ -93,6 +207,8 @@ def main():
     if 'username' not in st.session_state:
         st.session_state.username = None
         st.session_state.page = "Login"  # Default page set to Login
+    if 'post_jobs' not in st.session_state:
+        st.session_state.post_jobs = []  # IDs of the posts submitted to the job queue
 
     # Page access control: Only show Home, Profile, and Check Copyright if logged in
     if st.session_state.username:
@@ -134,38 +250,48 @@ def main():
     elif choice == "Home" and st.session_state.username:
         st.subheader("Feed - Latest Posts from All Users")
 
-        # Fetch all user posts and display in descending order by time
-        all_posts = get_all_user_posts()
+        # Fetch one page of posts, in descending order by time
+        total_posts = get_post_index().count()
 
-        if len(all_posts) == 0:
+        if total_posts == 0:
             st.write("No posts available.")
         else:
+            all_posts = get_all_user_posts(POSTS_PER_PAGE, page_offset("feed_page", total_posts))
+
             # Display posts in a grid
             for i in range(0, len(all_posts), NUM_COLUMNS):
                 cols = st.columns(NUM_COLUMNS)
 
                 for idx, col in enumerate(cols):
                     if i + idx < len(all_posts):
-                        post, username = all_posts[i + idx]
+                        post, username = all_posts[i + idx].path, all_posts[i + idx].owner
 
                         # Display the image or video
-                        if post.endswith(('jpg', 'png')):
-                            col.image(post, width=200)
-                        elif post.endswith('mp4'):
-                            col.video(post)
+                        show_post_media(col, all_posts[i + idx])
 
                         # Add "Posted by {username}" text below the post
                         col.markdown(f'Posted by <span style="color:red;">{username}</span>', unsafe_allow_html=True)
                         
-                        # Use API to decode the image and show copyright info
+                        # The index remembers the owner of each post's mark; unchecked posts are probed once
+                        # for a local mark (reads only the leading rows), falling back to a full decode.
+                        # Videos are marked in their container, so reading their box headers is enough
                         try:
-                            hidden_data = steg_api.decode(post)
-                            if hidden_data and hidden_data.startswith("Copyright_"):
-                                cred_user = hidden_data.split("_")[1]
-                                if cred_user != username:
-                                    col.markdown(f'Cred: <span style="color:red;">{cred_user}</span>', unsafe_allow_html=True)
-                        except NoMessageFoundError:
-                            pass  # No message found, just display the post normally
+                            cred_user = all_posts[i + idx].copyright_owner
+                            if cred_user is None and post.endswith('mp4'):
+                                cred_user = mp4_mark.probe(post).owner or ""
+                                get_post_index().set_copyright_owner(post, cred_user)
+                            elif cred_user is None:
+                                mark = lsb_probe.probe(post)
+                                hidden_data = mark.message if mark.marked else get_engine().decode(post)
+                                cred_user = lsb_probe.parse_owner(hidden_data) or ""
+                                get_post_index().set_copyright_owner(post, cred_user)
+                            if cred_user and cred_user != username:
+                                col.markdown(f'Cred: <span style="color:red;">{cred_user}</span>', unsafe_allow_html=True)
+                        except NoMessageFoundError as e:
+                            # Display the post normally; remember it as unmarked only if every mark format was
+                            # checked, not when the server was unreachable and the local fallback answered
+                            if e.authoritative:
+                                get_post_index().set_copyright_owner(post, "")
                         except VersionCompatibilityError as e:
                             # Optionally show a compatibility warning
                             col.markdown(f'<span style="color:orange;">⚠️ Version incompatible</span>', unsafe_allow_html=True)
@@ -173,13 +299,7 @@ def main():
                             pass  # Silently ignore other errors when displaying the feed
 
                         # Optionally, add a download button
-                        col.download_button(
-                            label="Download",
-                            data=open(post, "rb").read(),
-                            key=generate_unique_key(),
-                            file_name=os.path.basename(post),
-                            mime="application/octet-stream"
-                        )
+                        download_post_button(col, post)
 
     elif choice == "Post" and st.session_state.username:
         st.subheader(f"Post your Moments...")
@@ -195,99 +315,50 @@ def main():
             # Display the "Post" button only if there is a caption
             if caption:
                 if st.button("Post"):
-                    # Save media and process only when Post is clicked
-                    file_path = save_media(uploaded_file, st.session_state.username)
-                    
-                    # Check if the uploaded image already contains hidden data
+                    # Watermarking runs on the job queue's workers; the page only stages the upload
                     try:
-                        hidden_data = steg_api.decode(file_path)
-                        if hidden_data and hidden_data.startswith("Copyright_"):
-                            original_username = hidden_data.split("_")[1]
-                            st.info(f"This post belongs to {original_username}.")
-                        else:
-                            # Proceed with encoding
-                            current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                            secret_data = f"Copyright_{st.session_state.username}_{current_time}"
-
-                            # Encode the secret data into the image using the API
-                            encoded_file_path = f"media/{st.session_state.username}/encoded_{uploaded_file.name}"
-                            
-                            # Use the API to encode the image
-                            result = steg_api.encode(file_path, secret_data)
-                            
-                            if result['status'] == 'success':
-                                # Download the encoded image from the API
-                                steg_api.download_image(result['image_id'], encoded_file_path)
-                                
-                                # Delete the original file after encoding
-                                delete_post(f"media/{st.session_state.username}/{uploaded_file.name}")
-                                
-                                st.success(f"Uploaded {uploaded_file.name} to {encoded_file_path}")
-                                st.success("Post uploaded successfully with hidden data!")
-                                st.rerun()  # Reload or redirect to the Home page after posting
-                            else:
-                                st.error(f"Error encoding image: {result.get('message', 'Unknown error')}")
-                    except VersionCompatibilityError:
-                        # No message found, proceed with encoding
-                        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        secret_data = f"Copyright_{st.session_state.username}_{current_time}"
-
-                        # Encode the secret data into the image using the API
-                        encoded_file_path = f"media/{st.session_state.username}/encoded_{uploaded_file.name}"
-                        
-                        # Use the API to encode the image
-                        result = steg_api.encode(file_path, secret_data)
-                        
-                        if result['status'] == 'success':
-                            # Download the encoded image from the API
-                            steg_api.download_image(result['image_id'], encoded_file_path)
-                            
-                            # Delete the original file after encoding
-                            delete_post(f"media/{st.session_state.username}/{uploaded_file.name}")
-                            
-                            st.success(f"Uploaded {uploaded_file.name} to {encoded_file_path}")
-                            st.success("Post uploaded successfully with hidden data!")
-                            st.rerun()  # Reload or redirect to the Home page after posting
-                        else:
-                            st.error(f"Error encoding image: {result.get('message', 'Unknown error')}")
-                    except Exception as e:  
-                        st.error(f"Error while checking for hidden data: {str(e)}")
+                        job = submit_post(get_job_queue(), get_media_store(), st.session_state.username,
+                                          uploaded_file.name, uploaded_file.getvalue())
+                        if job.id not in st.session_state.post_jobs:
+                            st.session_state.post_jobs.append(job.id)
+                    except QueueFullError:
+                        st.error("Too many posts are being processed right now. Please try again in a moment.")
+                    except Exception as e:
+                        st.error(f"Error while submitting the post: {str(e)}")
+
+        # Status of the posts submitted in this session, refreshed on every rerun
+        if st.session_state.post_jobs:
+            show_post_jobs()
 
         # Display user's own posts after a successful post
         st.subheader("Your Posts")
-        user_posts = get_user_posts(st.session_state.username)
+        total_user_posts = get_post_index().count(st.session_state.username)
 
-        if len(user_posts) == 0:
+        if total_user_posts == 0:
             st.write("Yet to post.")
         else:
+            user_posts = get_user_posts(st.session_state.username, POSTS_PER_PAGE,
+                                        page_offset("own_posts_page", total_user_posts))
+
             # Iterate through the user's posts and display them in a grid
             for i in range(0, len(user_posts), NUM_COLUMNS):
                 cols = st.columns(NUM_COLUMNS)  # Create columns dynamically
 
                 for idx, col in enumerate(cols):
                     if i + idx < len(user_posts):  # Ensure we're not going out of bounds
-                        post = user_posts[i + idx]
+                        post = user_posts[i + idx].path
 
                         # Display image or video
-                        if post.endswith(('jpg', 'png')):
-                            col.image(post, width=200)
-                        elif post.endswith('mp4'):
-                            col.video(post)
+                        show_post_media(col, user_posts[i + idx])
 
                         # Display the download button below the post
                         col.write("")  # Empty line to separate
-                        col.download_button(
-                            label="Download",
-                            data=open(post, "rb").read(),
-                            key=generate_unique_key(),
-                            file_name=os.path.basename(post),
-                            mime="application/octet-stream"
-                        )
+                        download_post_button(col, post)
 
                         # Add a button to reveal hidden data
-                        if col.button(f"Reveal Hidden Data", key=f"reveal_{i+idx}"):
+                        if col.button(f"Reveal Hidden Data", key=f"reveal_{post}"):
                             try:
-                                hidden_data = steg_api.decode(post)
+                                hidden_data = get_engine().decode(post)
                                 if hidden_data:
                                     st.info(f"Hidden data in this post: {hidden_data}")
                             except NoMessageFoundError:
@@ -298,7 +369,7 @@ def main():
                                 st.error(f"Error decoding data: {str(e)}")
 
                         # Add delete button for each post
-                        if col.button(f"Delete Post", key=f"delete_{i+idx}"):
+                        if col.button(f"Delete Post", key=f"delete_{post}"):
                             if delete_post(post):
                                 st.success(f"Post {os.path.basename(post)} deleted successfully.")
                                 st.rerun()  # Reload page to reflect the deleted post
@@ -329,42 +400,45 @@ def main():
         if st.button("Update Profile"):
             if profile_pic:
                 img = Image.open(profile_pic)
-                img.save(f"media/{st.session_state.username}/profile_pic.png")
+                save_profile_picture(img, f"media/{st.session_state.username}/profile_pic.png")
             update_profile(st.session_state.username, name, bio, f"media/{st.session_state.username}/profile_pic.png")
             st.success("Profile Updated Successfully!")
 
     elif choice == "Check Copyright":
         st.subheader("Check for Copyright Data")
         
-        # Allow user to upload an image to check
-        uploaded_file = st.file_uploader("Upload Image", type=["jpg", "png"])
+        # Allow user to upload an image or video to check
+        uploaded_file = st.file_uploader("Upload Image or Video", type=["jpg", "png", "mp4"])
         
         if uploaded_file is not None:
-            img = Image.open(uploaded_file)
-            st.image(img, caption="Uploaded Image", width=300)
-            
-            # Save the uploaded file temporarily
-            temp_path = f"media/temp_{generate_unique_key()}.png"
-            img.save(temp_path)
+            is_video = uploaded_file.name.endswith('mp4')
+            if is_video:
+                st.video(uploaded_file)
+            else:
+                img = Image.open(uploaded_file)
+                st.image(img, caption="Uploaded Image", width=300)
             
-            # Decode and check for hidden data using the API
+            # Decode and check for hidden data using the engine
             if st.button("Check for Hidden Data"):
                 try:
-                    hidden_data = steg_api.decode(temp_path)
+                    if is_video:
+                        # The mark is read from the video's box headers; no frame is decoded
+                        hidden_data = get_engine().decode(uploaded_file.getvalue())
+                    else:
+                        # Convert to PNG in memory instead of writing a temporary file
+                        png_buffer = BytesIO()
+                        img.save(png_buffer, format="PNG")
+                        hidden_data = get_engine().decode(png_buffer.getvalue())
                     if hidden_data:
                         st.success(f"Hidden data found: {hidden_data}")
                 except NoMessageFoundError:
-                    st.warning("No hidden data found in this image. The image has not been encoded with any message.")
+                    st.warning("No hidden data found in this file. It has not been encoded with any message.")
                 except VersionCompatibilityError as e:
                     st.error(f"Version compatibility issue: {str(e)}")
                     if e.version:
                         st.info(f"The image was encoded with format version {e.version} which is incompatible with the current server.")
                 except Exception as e:
                     st.error(f"Error decoding image: {str(e)}")
-                finally:
-                    # Clean up temporary file
-                    if os.path.exists(temp_path):
-                        os.remove(temp_path)
 
     elif choice == "Logout":
         # Handle logout by clearing session state
@@ -378,4 +452,9 @@ def main():
         st.session_state.page = "Login"
 
 if __name__ == '__main__':
-    main()
+    # Attach the API calls made while rendering this page to a page-level trace
+    with get_api().trace() as api_calls:
+        main()
+    if api_calls:
+        st.sidebar.caption(f"{len(api_calls)} API calls, {sum(call.total for call in api_calls) * 1000:.0f} ms, "
+                           f"{sum(call.request_bytes + call.response_bytes for call in api_calls) / 1024:.0f} KB")
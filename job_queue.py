@@ -0,0 +1,264 @@
+# job_queue.py
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set
+
+# Seconds before the first retry of a failed job; doubles with every attempt
+RETRY_DELAY = 2.0
+# Seconds between the heartbeats a worker pool sends for its running jobs
+HEARTBEAT_INTERVAL = 30.0
+# Running jobs without a heartbeat for this long are assumed to belong to a crashed worker and are queued again
+STALE_AFTER = 120.0
+# Finished jobs are deleted this many seconds after they last changed
+PURGE_AFTER = 7 * 24 * 3600.0
+
+class QueueFullError(Exception):
+    """Raised when a job is rejected because the queue already holds `max_depth` unfinished jobs"""
+
+class Job(NamedTuple):
+    id: int
+    key: Optional[str]  # Idempotency key; enqueuing the same key again returns this job while it is unfinished
+    kind: str
+    payload: Dict[str, Any]
+    status: str  # "queued", "running", "done" or "failed"
+    attempts: int
+    max_attempts: int
+    result: Optional[Dict[str, Any]]
+    error: Optional[str]
+    created: float
+    updated: float
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JobQueue.DONE, JobQueue.FAILED)
+
+class JobQueue:
+    """Persistent queue of jobs in SQLite, shared by the app and any number of worker threads or processes
+
+    Jobs carry a kind and a JSON payload. A failed job is retried with exponential backoff until it has been
+    attempted `max_attempts` times. At most `max_depth` jobs may be queued or running at once.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, db_path: str = "jobs.db", max_depth: int = 100):
+        self.db_path = db_path
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        # Transactions are explicit, so a job is claimed by exactly one worker even across processes
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS jobs '
+                           '(id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT UNIQUE, kind TEXT, payload TEXT, '
+                           'status TEXT, attempts INTEGER, max_attempts INTEGER, result TEXT, error TEXT, '
+                           'created REAL, updated REAL, run_after REAL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_status_run_after ON jobs (status, run_after)')
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], key: Optional[str] = None, max_attempts: int = 3) -> Job:
+        """Add a job, or return the queued or running job with the same idempotency key
+
+        A key only lasts for the life of its job: once the job is done or failed, enqueuing the key again
+        starts the job over with the new payload.
+        Raises QueueFullError if `max_depth` jobs are already queued or running.
+        """
+        now = time.time()
+        with self._lock, self._transaction():
+            row = None
+            if key is not None:
+                row = self._conn.execute('SELECT * FROM jobs WHERE key=?', (key,)).fetchone()
+                if row and row[4] in (self.QUEUED, self.RUNNING):
+                    return _job(row)
+            if self._depth() >= self.max_depth:
+                raise QueueFullError(f"The queue already holds {self.max_depth} unfinished jobs")
+            if row:
+                self._conn.execute('UPDATE jobs SET kind=?, payload=?, status=?, attempts=0, max_attempts=?, '
+                                   'result=NULL, error=NULL, updated=?, run_after=? WHERE id=?',
+                                   (kind, json.dumps(payload), self.QUEUED, max_attempts, now, now, row[0]))
+                return _job(self._conn.execute('SELECT * FROM jobs WHERE id=?', (row[0],)).fetchone())
+            cursor = self._conn.execute(
+                'INSERT INTO jobs (key, kind, payload, status, attempts, max_attempts, created, updated, run_after) '
+                'VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?)',
+                (key, kind, json.dumps(payload), self.QUEUED, max_attempts, now, now, now))
+            return _job(self._conn.execute('SELECT * FROM jobs WHERE id=?', (cursor.lastrowid,)).fetchone())
+
+    def claim(self) -> Optional[Job]:
+        """Mark the oldest job that is due as running and return it, or None if no job is due"""
+        now = time.time()
+        with self._lock, self._transaction():
+            row = self._conn.execute('SELECT id FROM jobs WHERE status=? AND run_after<=? ORDER BY id LIMIT 1',
+                                     (self.QUEUED, now)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE jobs SET status=?, attempts=attempts+1, updated=? WHERE id=?',
+                               (self.RUNNING, now, row[0]))
+            return _job(self._conn.execute('SELECT * FROM jobs WHERE id=?', (row[0],)).fetchone())
+
+    def complete(self, job: Job, result: Optional[Dict[str, Any]] = None) -> bool:
+        """Record that a claimed attempt succeeded
+
+        Returns False and records nothing if the attempt no longer owns the job, because its worker stopped
+        sending heartbeats and the job was queued again and claimed by another worker.
+        """
+        with self._lock:
+            cursor = self._conn.execute('UPDATE jobs SET status=?, result=?, error=NULL, updated=? '
+                                        'WHERE id=? AND status=? AND attempts=?',
+                                        (self.DONE, json.dumps(result), time.time(), job.id, self.RUNNING,
+                                         job.attempts))
+            return cursor.rowcount > 0
+
+    def fail(self, job: Job, error: str) -> Optional[Job]:
+        """Record that a claimed attempt failed; the job is queued again unless it has no attempts left
+
+        Returns the updated job, or None if the attempt no longer owns the job (see `complete`).
+        """
+        now = time.time()
+        if job.attempts < job.max_attempts:
+            status, run_after = self.QUEUED, now + RETRY_DELAY * 2 ** (job.attempts - 1)
+        else:
+            status, run_after = self.FAILED, now
+        with self._lock, self._transaction():
+            cursor = self._conn.execute('UPDATE jobs SET status=?, error=?, updated=?, run_after=? '
+                                        'WHERE id=? AND status=? AND attempts=?',
+                                        (status, error, now, run_after, job.id, self.RUNNING, job.attempts))
+            if cursor.rowcount == 0:
+                return None
+            return _job(self._conn.execute('SELECT * FROM jobs WHERE id=?', (job.id,)).fetchone())
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM jobs WHERE id=?', (job_id,)).fetchone()
+        return _job(row) if row else None
+
+    def depth(self) -> int:
+        """Return the number of queued and running jobs"""
+        with self._lock:
+            return self._depth()
+
+    def heartbeat(self, job_ids: List[int]) -> None:
+        """Mark running jobs as still being worked on, so `requeue_stale` leaves them alone"""
+        if not job_ids:
+            return
+        placeholders = ",".join("?" * len(job_ids))
+        with self._lock:
+            self._conn.execute(f'UPDATE jobs SET updated=? WHERE status=? AND id IN ({placeholders})',
+                               (time.time(), self.RUNNING, *job_ids))
+
+    def requeue_stale(self, stale_after: float = STALE_AFTER) -> int:
+        """Queue running jobs again whose worker stopped sending heartbeats; returns how many there were"""
+        with self._lock:
+            cursor = self._conn.execute('UPDATE jobs SET status=?, run_after=? WHERE status=? AND updated<?',
+                                        (self.QUEUED, time.time(), self.RUNNING, time.time() - stale_after))
+            return cursor.rowcount
+
+    def purge(self, older_than: float) -> int:
+        """Delete finished jobs last updated more than `older_than` seconds ago"""
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM jobs WHERE status IN (?, ?) AND updated<?',
+                                        (self.DONE, self.FAILED, time.time() - older_than))
+            return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _depth(self) -> int:
+        return self._conn.execute('SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)',
+                                  (self.QUEUED, self.RUNNING)).fetchone()[0]
+
+    def _transaction(self):
+        return _Transaction(self._conn)
+
+class WorkerPool:
+    """Threads that claim jobs from a queue and run the handler registered for their kind
+
+    A handler takes the payload and returns a JSON-serializable result; any exception it raises fails the attempt.
+    A maintenance thread sends heartbeats for the running jobs every `heartbeat_interval` seconds, queues the
+    jobs of crashed workers again and purges old finished jobs.
+    """
+
+    def __init__(self, queue: JobQueue, handlers: Dict[str, Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]],
+                 workers: int = 2, poll_interval: float = 0.5, heartbeat_interval: float = HEARTBEAT_INTERVAL):
+        self.queue = queue
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._running: Set[int] = set()
+        self._running_lock = threading.Lock()
+
+    def start(self) -> None:
+        self.queue.requeue_stale()
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._maintain, name="job-maintenance", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop claiming jobs and wait for the running ones to finish"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+
+    def run_once(self) -> bool:
+        """Run one due job in the calling thread; returns whether there was one"""
+        job = self.queue.claim()
+        if job is None:
+            return False
+        handler = self.handlers.get(job.kind)
+        with self._running_lock:
+            self._running.add(job.id)
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for jobs of kind {job.kind!r}")
+            result = handler(job.payload)
+        except Exception as e:
+            self.queue.fail(job, f"{type(e).__name__}: {e}")
+        else:
+            self.queue.complete(job, result)  # Dropped if the job was taken over meanwhile
+        finally:
+            with self._running_lock:
+                self._running.discard(job.id)
+        return True
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            if not self.run_once():
+                self._stop.wait(self.poll_interval)
+
+    def _maintain(self) -> None:
+        while not self._stop.wait(self.heartbeat_interval):
+            with self._running_lock:
+                running = list(self._running)
+            try:
+                self.queue.heartbeat(running)
+                self.queue.requeue_stale()
+                self.queue.purge(PURGE_AFTER)
+            except sqlite3.Error:
+                pass  # Another process holds the database; try again at the next interval
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, rolled back on error; IMMEDIATE takes the write lock up front"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __enter__(self) -> None:
+        self._conn.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self._conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+def _job(row: tuple) -> Job:
+    return Job(row[0], row[1], row[2], json.loads(row[3]), row[4], row[5], row[6],
+               json.loads(row[7]) if row[7] else None, row[8], row[9], row[10])
@@ -2,10 +2,64 @@
 This module provides functions to encode and decode data into/from images using the Least Significant Bit (LSB) technique.
 """
 
+import struct
+import zlib
+from io import BytesIO
+from itertools import islice
+from typing import BinaryIO
+
 from PIL import Image
 
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+# Streaming is built on NumPy; errors in png_stream itself are not masked by the guard above
+png_stream = None
+if np is not None:
+    import png_stream
+
+# Every payload byte occupies 9 channel values (the RGB values of 3 pixels):
+# 8 data bits followed by a stop bit that is 1 only for the last byte.
+VALUES_PER_BYTE = 9
+PIXELS_PER_BYTE = 3
+# Number of payload bytes inspected per step while searching for the stop bit.
+DECODE_CHUNK_BYTES = 4096
+
+# Container format: a fixed header followed by the UTF-8 payload, stored one
+# bit per RGB channel value starting at the first pixel. The header holds the
+# magic marker, format version, flags, payload length and CRC-32 of the payload.
+MAGIC = b"HIDE"
+FORMAT_VERSION = 1
+HEADER = struct.Struct(">4sBBII")
+# Version 2 stores the payload more densely, as described by the header flags:
+# the low two bits hold the number of LSBs used per channel minus one, and
+# FLAG_ALPHA marks that the alpha channel carries payload too. The header is
+# still written one bit per RGB value; the payload starts at the next pixel.
+DENSE_FORMAT_VERSION = 2
+FLAG_LSB_MASK = 0b011
+FLAG_ALPHA = 0b100
+HEADER_PIXELS = -(-HEADER.size * 8 // 3)
+MAX_BITS_PER_CHANNEL = 4
+# Largest payload accepted when reading a header, guarding against corrupt lengths.
+MAX_PAYLOAD_BYTES = 1 << 24
+# Name servers give these formats in the `mark_format` field of their /version answer.
+MARK_FORMAT = "lsb"
+# Maximum number of rows held in memory at once by `encode_streaming`.
+STREAM_BAND_ROWS = 64
+# Legacy formats have no header, so a legacy reading is only accepted when it
+# starts with the mark written by both apps, or is a printable string too long
+# to be read from an unmarked image by chance.
+LEGACY_MARK_PREFIX = "Copyright_"
+LEGACY_MIN_LENGTH = 16
+
+# Anything accepted as an image source: a path, raw bytes, a binary file object or an image.
+ImageSource = str | bytes | bytearray | memoryview | BinaryIO | Image.Image
+
 
-def encode(img_path: str, data: str, new_img_name: str) -> None:
+def encode(img_path: str, data: str, new_img_name: str, streaming: bool = False,
+           bits_per_channel: int = 1, use_alpha: bool = False) -> None:
     """
     Encode data into an image and save the new image.
 
@@ -13,6 +67,10 @@ def encode(img_path: str, data: str, new_img_name: str) -> None:
     img_path (str): The path to the image file.
     data (str): The data to be encoded into the image.
     new_img_name (str): The name of the new image file to be saved.
+    streaming (bool): Whether to use the memory-bounded `encode_streaming`,
+        which supports the default density only.
+    bits_per_channel (int): The number of LSBs used per channel value (1-4).
+    use_alpha (bool): Whether to store payload in the alpha channel of RGBA images.
 
     Raises:
     ValueError: If the provided data is empty.
@@ -20,10 +78,611 @@ def encode(img_path: str, data: str, new_img_name: str) -> None:
     if not data:
         raise ValueError("Data is empty")
 
+    if streaming and np is not None and bits_per_channel == 1 and not use_alpha:
+        encode_streaming(img_path, data, new_img_name)
+        return
+
+    with open(new_img_name, "wb") as f:
+        encode_file(img_path, data, f, bits_per_channel, use_alpha)
+
+
+def encode_file(source: ImageSource, data: str, fp: BinaryIO, bits_per_channel: int = 1,
+                use_alpha: bool = False) -> None:
+    """
+    Encode data into an image and write the new image as PNG to a file object.
+
+    Args:
+    source (ImageSource): The image as a path, bytes, binary file object or image.
+    data (str): The data to be encoded into the image.
+    fp (BinaryIO): The file object the PNG data is written to.
+    bits_per_channel (int): The number of LSBs used per channel value (1-4).
+    use_alpha (bool): Whether to store payload in the alpha channel of RGBA images.
+
+    Raises:
+    ValueError: If the provided data is empty.
+    """
+    if not data:
+        raise ValueError("Data is empty")
+
+    new_image = embed_container(open_image(source), data, bits_per_channel, use_alpha)
+    new_image.save(fp, "PNG")
+
+
+def encode_bytes(source: ImageSource, data: str, bits_per_channel: int = 1, use_alpha: bool = False) -> bytes:
+    """
+    Encode data into an image without touching the disk.
+
+    Args:
+    source (ImageSource): The image as a path, bytes, binary file object or image.
+    data (str): The data to be encoded into the image.
+    bits_per_channel (int): The number of LSBs used per channel value (1-4).
+    use_alpha (bool): Whether to store payload in the alpha channel of RGBA images.
+
+    Returns:
+    bytes: The new image as PNG data.
+
+    Raises:
+    ValueError: If the provided data is empty.
+    """
+    buffer = BytesIO()
+    encode_file(source, data, buffer, bits_per_channel, use_alpha)
+    return buffer.getvalue()
+
+
+def open_image(source: ImageSource) -> Image.Image:
+    """
+    Open an image from any supported source.
+
+    Args:
+    source (ImageSource): The image as a path, bytes, binary file object or image.
+
+    Returns:
+    Image.Image: The opened image.
+    """
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = BytesIO(source)
+    return Image.open(source, "r")
+
+
+def encode_streaming(img_path: str, data: str, new_img_name: str, band_rows: int = STREAM_BAND_ROWS) -> None:
+    """
+    Encode data into an image without holding a second copy of it in memory.
+
+    Only the rows holding payload bits are rewritten, at most `band_rows` at a
+    time. 8-bit RGB/RGBA PNG inputs are streamed scanline by scanline, so they
+    are never fully decoded. Other inputs (JPEG, palette, grayscale, 16-bit or
+    interlaced PNG) are not streamed: they are decoded in full once and modified
+    in place, so memory use grows with the size of the image.
+
+    Args:
+    img_path (str): The path to the image file.
+    data (str): The data to be encoded into the image.
+    new_img_name (str): The name of the new image file to be saved.
+    band_rows (int): The maximum number of rows processed at once.
+
+    Raises:
+    ValueError: If the provided data is empty or too large for the image.
+    """
+    if not data:
+        raise ValueError("Data is empty")
+
+    bits = np.unpackbits(np.frombuffer(build_container(data), dtype=np.uint8))
+    pixel_count = -(-len(bits) // 3)
+
+    def rewrite(band: np.ndarray, first_row: int) -> None:
+        embed_bits_array(band, bits, first_row * band.shape[1])
+
+    if png_stream.is_streamable(img_path):
+        width, height = png_stream.read_size(img_path)
+        if pixel_count > width * height:
+            raise ValueError("Data is too large to be encoded into this image")
+        png_stream.rewrite_rows(img_path, new_img_name, -(-pixel_count // width), rewrite, band_rows)
+        return
+
     image = Image.open(img_path, "r")
-    new_image = image.copy()
-    embed_data(new_image, data)
-    new_image.save(new_img_name, "PNG")
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+    width, height = image.size
+    if pixel_count > width * height:
+        raise ValueError("Data is too large to be encoded into this image")
+
+    row_count = -(-pixel_count // width)
+    for top in range(0, row_count, band_rows):
+        box = (0, top, width, min(top + band_rows, row_count))
+        band = np.array(image.crop(box))
+        rewrite(band, top)
+        image.paste(Image.fromarray(band, image.mode), box[:2])
+    image.save(new_img_name, "PNG")
+
+
+def build_container(data: str, flags: int = 0) -> bytes:
+    """
+    Wrap the data in the versioned container format.
+
+    Args:
+    data (str): The data to be wrapped.
+    flags (int): Format flags stored in the header. Any flag selects the
+        dense format version.
+
+    Returns:
+    bytes: The header followed by the UTF-8 encoded data.
+    """
+    payload = data.encode("utf-8")
+    version = DENSE_FORMAT_VERSION if flags else FORMAT_VERSION
+    header = HEADER.pack(MAGIC, version, flags, len(payload), zlib.crc32(payload))
+    return header + payload
+
+
+def density_flags(bits_per_channel: int, use_alpha: bool) -> int:
+    """
+    Build the header flags for a payload density.
+
+    Args:
+    bits_per_channel (int): The number of LSBs used per channel value (1-4).
+    use_alpha (bool): Whether the alpha channel carries payload too.
+
+    Returns:
+    int: The header flags.
+
+    Raises:
+    ValueError: If the number of bits is out of range.
+    """
+    if not 1 <= bits_per_channel <= MAX_BITS_PER_CHANNEL:
+        raise ValueError(f"Bits per channel must be between 1 and {MAX_BITS_PER_CHANNEL}")
+    return (bits_per_channel - 1) | (FLAG_ALPHA if use_alpha else 0)
+
+
+def parse_flags(flags: int) -> tuple[int, bool]:
+    """
+    Read the payload density from the header flags.
+
+    Args:
+    flags (int): The header flags.
+
+    Returns:
+    tuple[int, bool]: The number of LSBs per channel value and whether the
+        alpha channel carries payload.
+    """
+    return (flags & FLAG_LSB_MASK) + 1, bool(flags & FLAG_ALPHA)
+
+
+def parse_header(header: bytes) -> tuple[int, int, int, int] | None:
+    """
+    Parse a container header.
+
+    Args:
+    header (bytes): The leading bytes read from an image.
+
+    Returns:
+    tuple[int, int, int, int] | None: The version, flags, payload length and
+        checksum, or None if the bytes do not start with the magic marker.
+
+    Raises:
+    ValueError: If the header is marked but unsupported or corrupt.
+    """
+    magic, version, flags, length, checksum = HEADER.unpack(header)
+    if magic != MAGIC:
+        return None
+    if version not in (FORMAT_VERSION, DENSE_FORMAT_VERSION):
+        raise ValueError(f"Unsupported message format version: {version}")
+    if length > MAX_PAYLOAD_BYTES:
+        raise ValueError("Corrupt message header")
+    return version, flags, length, checksum
+
+
+def verify_payload(payload: bytes, checksum: int) -> str:
+    """
+    Check a container payload against its checksum and decode it.
+
+    Args:
+    payload (bytes): The payload bytes read from an image.
+    checksum (int): The CRC-32 stored in the header.
+
+    Returns:
+    str: The decoded payload.
+
+    Raises:
+    ValueError: If the checksum does not match.
+    """
+    if zlib.crc32(payload) != checksum:
+        raise ValueError("Message checksum mismatch")
+    return payload.decode("utf-8")
+
+
+def embed_container(image: Image.Image, data: str, bits_per_channel: int = 1,
+                    use_alpha: bool = False, vectorized: bool = True) -> Image.Image:
+    """
+    Encode the provided data in the container format into a copy of the image.
+
+    With the default density the payload follows the header at one bit per
+    RGB value. Higher densities store `bits_per_channel` bits in every
+    channel value, including alpha if `use_alpha` is set and the image has an
+    alpha channel, so fewer pixels are touched per payload byte.
+
+    Args:
+    image (Image.Image): The image in which data is to be encoded.
+    data (str): The data to be encoded into the image.
+    bits_per_channel (int): The number of LSBs used per channel value (1-4).
+    use_alpha (bool): Whether to store payload in the alpha channel of RGBA images.
+    vectorized (bool): Whether to use NumPy when it is installed.
+
+    Returns:
+    Image.Image: A new image containing the encoded data.
+
+    Raises:
+    ValueError: If the density is invalid or the data does not fit.
+    """
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+    use_numpy = vectorized and np is not None
+
+    flags = density_flags(bits_per_channel, use_alpha and image.mode == "RGBA")
+    container = build_container(data, flags)
+    if flags:
+        header, payload = container[:HEADER.size], container[HEADER.size:]
+        if not use_numpy:
+            new_image = image.copy()
+            embed_bytes_pixels(new_image, header)
+            embed_dense_pixels(new_image, payload, flags)
+            return new_image
+
+        array = np.array(image)
+        embed_bytes_array(array, header)
+        embed_dense_array(array, payload, flags)
+        return Image.fromarray(array, image.mode)
+
+    if not use_numpy:
+        new_image = image.copy()
+        embed_bytes_pixels(new_image, container)
+        return new_image
+
+    array = np.array(image)
+    embed_bytes_array(array, container)
+    return Image.fromarray(array, image.mode)
+
+
+def dense_pixel_count(length: int, flags: int) -> int:
+    """
+    Count the pixels holding a dense payload, not including the header pixels.
+
+    Args:
+    length (int): The payload length in bytes.
+    flags (int): The header flags.
+
+    Returns:
+    int: The number of pixels.
+    """
+    bits_per_channel, use_alpha = parse_flags(flags)
+    values = -(-length * 8 // bits_per_channel)
+    return -(-values // (4 if use_alpha else 3))
+
+
+def embed_dense_array(array: "np.ndarray", payload: bytes, flags: int) -> None:
+    """
+    Write a dense payload in place into an image array after the header pixels.
+
+    Args:
+    array (np.ndarray): A uint8 array of shape (height, width, channels)
+        with at least 3 channels, or 4 when the alpha flag is set.
+    payload (bytes): The payload bytes to be written.
+    flags (int): The header flags describing the density.
+
+    Raises:
+    ValueError: If the payload does not fit into the image.
+    """
+    bits_per_channel, use_alpha = parse_flags(flags)
+    channels = 4 if use_alpha else 3
+    pixels = array.reshape(-1, array.shape[-1])
+    pixel_count = dense_pixel_count(len(payload), flags)
+    if HEADER_PIXELS + pixel_count > len(pixels):
+        raise ValueError("Data is too large to be encoded into this image")
+
+    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+    bits = np.concatenate([bits, np.zeros(-len(bits) % bits_per_channel, dtype=np.uint8)])
+    weights = 1 << np.arange(bits_per_channel - 1, -1, -1, dtype=np.uint8)
+    chunks = (bits.reshape(-1, bits_per_channel) * weights).sum(axis=1, dtype=np.uint8)
+
+    region = pixels[HEADER_PIXELS:HEADER_PIXELS + pixel_count, :channels]
+    values = region.reshape(-1)
+    mask = np.uint8(0xFF ^ ((1 << bits_per_channel) - 1))
+    values[:len(chunks)] = (values[:len(chunks)] & mask) | chunks
+    pixels[HEADER_PIXELS:HEADER_PIXELS + pixel_count, :channels] = values.reshape(-1, channels)
+
+
+def read_dense_array(array: "np.ndarray", length: int, flags: int) -> bytes:
+    """
+    Read a dense payload written by `embed_dense_array`.
+
+    Args:
+    array (np.ndarray): A uint8 array of shape (height, width, channels).
+    length (int): The payload length in bytes.
+    flags (int): The header flags describing the density.
+
+    Returns:
+    bytes: The payload bytes.
+
+    Raises:
+    ValueError: If the payload extends beyond the image or needs an alpha
+        channel the image does not have.
+    """
+    bits_per_channel, use_alpha = parse_flags(flags)
+    channels = 4 if use_alpha else 3
+    pixels = array.reshape(-1, array.shape[-1])
+    pixel_count = dense_pixel_count(length, flags)
+    if HEADER_PIXELS + pixel_count > len(pixels) or channels > pixels.shape[1]:
+        raise ValueError("Message extends beyond the image")
+
+    values = pixels[HEADER_PIXELS:HEADER_PIXELS + pixel_count, :channels].reshape(-1)
+    shifts = np.arange(bits_per_channel - 1, -1, -1, dtype=np.uint8)
+    bits = (values[:, None] >> shifts) & 1
+    return np.packbits(bits.reshape(-1)[:length * 8]).tobytes()
+
+
+def embed_dense_pixels(image: Image.Image, payload: bytes, flags: int) -> None:
+    """
+    Write a dense payload in place into an image after the header pixels.
+
+    Pure-Python counterpart of `embed_dense_array`.
+
+    Args:
+    image (Image.Image): The image in which the payload is to be written.
+    payload (bytes): The payload bytes to be written.
+    flags (int): The header flags describing the density.
+
+    Raises:
+    ValueError: If the payload does not fit into the image.
+    """
+    bits_per_channel, use_alpha = parse_flags(flags)
+    channels = 4 if use_alpha else 3
+    width, height = image.size
+    pixel_count = dense_pixel_count(len(payload), flags)
+    if HEADER_PIXELS + pixel_count > width * height:
+        raise ValueError("Data is too large to be encoded into this image")
+
+    bits = "".join(format(byte, "08b") for byte in payload)
+    bits += "0" * (-len(bits) % bits_per_channel)
+    chunks = [int(bits[i:i + bits_per_channel], 2) for i in range(0, len(bits), bits_per_channel)]
+    mask = 0xFF ^ ((1 << bits_per_channel) - 1)
+
+    pixels = islice(image.getdata(), HEADER_PIXELS, HEADER_PIXELS + pixel_count)
+    for index, pixel in enumerate(pixels, HEADER_PIXELS):
+        pixel = list(pixel)
+        offset = (index - HEADER_PIXELS) * channels
+        for channel, chunk in enumerate(chunks[offset:offset + channels]):
+            pixel[channel] = (pixel[channel] & mask) | chunk
+        image.putpixel((index % width, index // width), tuple(pixel))
+
+
+def read_dense_pixels(pixels, length: int, flags: int) -> bytes:
+    """
+    Read a dense payload written by `embed_dense_pixels`.
+
+    Args:
+    pixels (Sequence): The pixel values of the image, e.g. `image.getdata()`.
+    length (int): The payload length in bytes.
+    flags (int): The header flags describing the density.
+
+    Returns:
+    bytes: The payload bytes.
+
+    Raises:
+    ValueError: If the payload extends beyond the image.
+    """
+    bits_per_channel, use_alpha = parse_flags(flags)
+    channels = 4 if use_alpha else 3
+    pixel_count = dense_pixel_count(length, flags)
+
+    bits = []
+    for pixel in islice(pixels, HEADER_PIXELS, HEADER_PIXELS + pixel_count):
+        if len(pixel) < channels:
+            raise ValueError("Message extends beyond the image")
+        for value in pixel[:channels]:
+            bits.append(format(value & ((1 << bits_per_channel) - 1), f"0{bits_per_channel}b"))
+    bits = "".join(bits)[:length * 8]
+    if len(bits) != length * 8:
+        raise ValueError("Message extends beyond the image")
+    return int(bits, 2).to_bytes(length, "big") if length else b""
+
+
+def embed_bytes_array(array: "np.ndarray", payload: bytes) -> None:
+    """
+    Write bytes in place into an image array, one bit per RGB channel value.
+
+    Args:
+    array (np.ndarray): A uint8 array of shape (height, width, channels)
+        with at least 3 channels.
+    payload (bytes): The bytes to be written.
+
+    Raises:
+    ValueError: If the bytes do not fit into the image.
+    """
+    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+    if -(-len(bits) // 3) > array.size // array.shape[-1]:
+        raise ValueError("Data is too large to be encoded into this image")
+
+    embed_bits_array(array, bits, 0)
+
+
+def embed_bits_array(array: "np.ndarray", bits: "np.ndarray", first_pixel: int) -> None:
+    """
+    Write the part of a bit sequence that falls into a region of pixels.
+
+    Args:
+    array (np.ndarray): A uint8 array of shape (..., channels) with at least
+        3 channels, holding consecutive pixels of the image.
+    bits (np.ndarray): The 0/1 bits written from the first pixel of the image.
+    first_pixel (int): The index of the first pixel of `array` in the image.
+    """
+    pixels = array.reshape(-1, array.shape[-1])
+    first_bit = first_pixel * 3
+    count = min(len(pixels) * 3, len(bits) - first_bit)
+    if count <= 0:
+        return
+
+    pixel_count = -(-count // 3)
+    values = pixels[:pixel_count, :3].reshape(-1)
+    values[:count] = set_parity(values[:count], bits[first_bit:first_bit + count])
+    pixels[:pixel_count, :3] = values.reshape(-1, 3)
+
+
+def embed_bytes_pixels(image: Image.Image, payload: bytes) -> None:
+    """
+    Write bytes in place into an image, one bit per RGB channel value.
+
+    Pure-Python counterpart of `embed_bytes_array`.
+
+    Args:
+    image (Image.Image): The image in which the bytes are to be written.
+    payload (bytes): The bytes to be written.
+
+    Raises:
+    ValueError: If the bytes do not fit into the image.
+    """
+    bits = "".join(format(byte, "08b") for byte in payload)
+    width, height = image.size
+    pixel_count = -(-len(bits) // 3)
+    if pixel_count > width * height:
+        raise ValueError("Data is too large to be encoded into this image")
+
+    for index, pixel in enumerate(islice(image.getdata(), pixel_count)):
+        pixel = list(pixel)
+        for channel, bit in enumerate(bits[index * 3:index * 3 + 3]):
+            if pixel[channel] % 2 != int(bit):
+                pixel[channel] += 1 if pixel[channel] == 0 else -1
+        image.putpixel((index % width, index // width), tuple(pixel))
+
+
+def read_bytes_array(array: "np.ndarray", offset: int, count: int) -> bytes:
+    """
+    Read bytes written by `embed_bytes_array`.
+
+    Only the pixels holding the requested bytes are inspected.
+
+    Args:
+    array (np.ndarray): A uint8 array of shape (height, width, channels)
+        with at least 3 channels.
+    offset (int): The index of the first byte to read.
+    count (int): The number of bytes to read.
+
+    Returns:
+    bytes: The bytes read from the array.
+
+    Raises:
+    ValueError: If the requested bytes lie outside the image.
+    """
+    pixels = array.reshape(-1, array.shape[-1])
+    first_bit, end_bit = offset * 8, (offset + count) * 8
+    first_pixel, end_pixel = first_bit // 3, -(-end_bit // 3)
+    if end_pixel > len(pixels):
+        raise ValueError("Message extends beyond the image")
+
+    values = pixels[first_pixel:end_pixel, :3].reshape(-1)
+    start = first_bit - first_pixel * 3
+    return np.packbits(values[start:start + count * 8] & 1).tobytes()
+
+
+def iter_bits(pixels: iter) -> iter:
+    """
+    Yield the least significant bit of every RGB channel value.
+
+    Args:
+    pixels (iter): An iterator of pixel values.
+
+    Yields:
+    int: The bits stored in the pixels.
+    """
+    for pixel in pixels:
+        for value in pixel[:3]:
+            yield value & 1
+
+
+def read_bytes_bits(bits: iter, count: int) -> bytes:
+    """
+    Read bytes from an iterator of bits.
+
+    Args:
+    bits (iter): An iterator of bits, most significant bit first.
+    count (int): The number of bytes to read.
+
+    Returns:
+    bytes: The bytes read.
+
+    Raises:
+    ValueError: If the iterator is exhausted first.
+    """
+    result = bytearray()
+    for _ in range(count):
+        byte = [bit for bit in islice(bits, 8)]
+        if len(byte) != 8:
+            raise ValueError("Message extends beyond the image")
+        result.append(int("".join(map(str, byte)), 2))
+    return bytes(result)
+
+
+def extract_container_array(array: "np.ndarray") -> str | None:
+    """
+    Decode container-format data from an image array.
+
+    Unmarked images are rejected after reading the magic marker, and marked
+    ones are read up to the end of their payload only.
+
+    Args:
+    array (np.ndarray): A uint8 array of shape (height, width, channels)
+        with at least 3 channels.
+
+    Returns:
+    str | None: The decoded data, or None if the image carries no container.
+
+    Raises:
+    ValueError: If the container is unsupported or corrupt.
+    """
+    try:
+        if read_bytes_array(array, 0, len(MAGIC)) != MAGIC:
+            return None
+        header = read_bytes_array(array, 0, HEADER.size)
+    except ValueError:
+        # Too small to hold a header at all.
+        return None
+
+    _, flags, length, checksum = parse_header(header)
+    if flags:
+        return verify_payload(read_dense_array(array, length, flags), checksum)
+    return verify_payload(read_bytes_array(array, HEADER.size, length), checksum)
+
+
+def extract_container_pixels(pixels: iter) -> str | None:
+    """
+    Decode container-format data from an iterator of pixel values.
+
+    Pure-Python counterpart of `extract_container_array`.
+
+    Args:
+    pixels (iter): The pixel values of the image. Dense payloads are read
+        again from the start, so this must be a sequence such as
+        `image.getdata()` when they are to be supported.
+
+    Returns:
+    str | None: The decoded data, or None if the pixels carry no container.
+
+    Raises:
+    ValueError: If the container is unsupported or corrupt.
+    """
+    bits = iter_bits(pixels)
+    try:
+        magic = read_bytes_bits(bits, len(MAGIC))
+        if magic != MAGIC:
+            return None
+        header = magic + read_bytes_bits(bits, HEADER.size - len(MAGIC))
+    except ValueError:
+        # Too small to hold a header at all.
+        return None
+
+    _, flags, length, checksum = parse_header(header)
+    if flags:
+        return verify_payload(read_dense_pixels(pixels, length, flags), checksum)
+    return verify_payload(read_bytes_bits(bits, length), checksum)
 
 
 def embed_data(image: Image.Image, data: str) -> None:
@@ -115,20 +774,256 @@ def generate_binary_data(data: str) -> list[str]:
     return [format(ord(char), "08b") for char in data]
 
 
-def decode(img_path: str) -> str:
+def set_parity(values: "np.ndarray", bits: "np.ndarray") -> "np.ndarray":
+    """
+    Make each value odd for a 1 bit and even for a 0 bit.
+
+    Mirrors `modify_pixels`: values are decremented to change parity, except
+    a 0 that has to become odd, which is incremented.
+
+    Args:
+    values (np.ndarray): The uint8 channel values to modify.
+    bits (np.ndarray): The 0/1 bits to store, one per value.
+
+    Returns:
+    np.ndarray: The modified channel values.
+    """
+    change = (values & 1) != bits
+    return (values - change + 2 * (change & (values == 0))).astype(np.uint8)
+
+
+def extract_array(array: "np.ndarray") -> str:
+    """
+    Decode data from an image array.
+
+    The array is scanned in chunks so that only the pixels up to the stop
+    bit are inspected.
+
+    Args:
+    array (np.ndarray): A uint8 array of shape (height, width, channels)
+        with at least 3 channels.
+
+    Returns:
+    str: The decoded data from the array.
+
+    Raises:
+    ValueError: If no stop bit is found in the array.
+    """
+    pixels = array.reshape(-1, array.shape[-1])
+    total_bytes = len(pixels) // PIXELS_PER_BYTE
+    chunks = []
+
+    for start in range(0, total_bytes, DECODE_CHUNK_BYTES):
+        stop = min(start + DECODE_CHUNK_BYTES, total_bytes)
+        groups = (
+            pixels[start * PIXELS_PER_BYTE:stop * PIXELS_PER_BYTE, :3]
+            .reshape(-1, VALUES_PER_BYTE) & 1
+        )
+        ends = np.flatnonzero(groups[:, 8])
+        if len(ends):
+            chunks.append(np.packbits(groups[:ends[0] + 1, :8], axis=1))
+            return b"".join(chunk.tobytes() for chunk in chunks).decode("latin-1")
+        chunks.append(np.packbits(groups[:, :8], axis=1))
+
+    raise ValueError("No message found in the image")
+
+
+def extract_null_terminated_array(array: "np.ndarray") -> str:
+    """
+    Decode data written by the legacy `app.encode` from an image array.
+
+    That format stores the bits of every character contiguously, one per RGB
+    channel value, followed by a zero byte.
+
+    Args:
+    array (np.ndarray): A uint8 array of shape (height, width, channels)
+        with at least 3 channels.
+
+    Returns:
+    str: The decoded data from the array.
+
+    Raises:
+    ValueError: If no terminator is found in the array.
+    """
+    total_bytes = array.size // array.shape[-1] * 3 // 8
+    chunks = []
+
+    for start in range(0, total_bytes, DECODE_CHUNK_BYTES):
+        data = read_bytes_array(array, start, min(DECODE_CHUNK_BYTES, total_bytes - start))
+        end = data.find(b"\x00")
+        if end >= 0:
+            chunks.append(data[:end])
+            return b"".join(chunks).decode("latin-1")
+        chunks.append(data)
+
+    raise ValueError("No message found in the image")
+
+
+def extract_null_terminated_pixels(pixels: iter) -> str:
+    """
+    Decode data written by the legacy `app.encode` from an iterator of pixel values.
+
+    Pure-Python counterpart of `extract_null_terminated_array`. Reading stops at
+    the first byte that is not printable ASCII, as such a reading is rejected anyway.
+
+    Args:
+    pixels (iter): An iterator of pixel values.
+
+    Returns:
+    str: The decoded data from the pixels.
+
+    Raises:
+    ValueError: If a non-printable byte or the end of the image comes before the terminator.
+    """
+    bits = iter_bits(pixels)
+    data = bytearray()
+    while True:
+        byte = read_bytes_bits(bits, 1)[0]
+        if byte == 0:
+            return data.decode("ascii")
+        if not 0x20 <= byte < 0x7F:
+            raise ValueError("No message found in the image")
+        data.append(byte)
+
+
+def is_legacy_mark(candidate: str) -> bool:
+    """
+    Check whether a legacy reading is plausibly a message rather than noise.
+
+    Unmarked images often yield a few printable characters in either legacy
+    format, so a reading must start with `LEGACY_MARK_PREFIX` or be at least
+    `LEGACY_MIN_LENGTH` printable ASCII characters long.
+
+    Args:
+    candidate (str): The legacy reading.
+
+    Returns:
+    bool: Whether the reading is accepted as a message.
+    """
+    if not (candidate.isascii() and candidate.isprintable()):
+        return False
+    return candidate.startswith(LEGACY_MARK_PREFIX) or len(candidate) >= LEGACY_MIN_LENGTH
+
+
+def decode(img_path: str, legacy: bool = True) -> str:
     """
     Decode data from an image provided by the user.
 
     Args:
     img_path (str): The path to the image file.
+    legacy (bool): Whether to fall back to the legacy formats when the image
+        carries no container header.
 
     Returns:
     str: The decoded data from the image.
+
+    Raises:
+    ValueError: If no message is found in the image.
     """
-    image = Image.open(img_path, "r")
+    return decode_file(img_path, legacy)
+
+
+def decode_file(source: ImageSource, legacy: bool = True) -> str:
+    """
+    Decode data from an image given as a path, file object, bytes or image.
+
+    Args:
+    source (ImageSource): The image as a path, bytes, binary file object or image.
+    legacy (bool): Whether to fall back to the legacy formats when the image
+        carries no container header.
+
+    Returns:
+    str: The decoded data from the image.
+
+    Raises:
+    ValueError: If no message is found in the image.
+    """
+    return decode_image(open_image(source), legacy)
+
+
+def decode_bytes(data: bytes, legacy: bool = True) -> str:
+    """
+    Decode data from an encoded image held in memory.
+
+    Args:
+    data (bytes): The encoded image file contents.
+    legacy (bool): Whether to fall back to the legacy formats when the image
+        carries no container header.
+
+    Returns:
+    str: The decoded data from the image.
+
+    Raises:
+    ValueError: If no message is found in the image.
+    """
+    return decode_file(data, legacy)
+
+
+def decode_image(image: Image.Image, legacy: bool = True, vectorized: bool = True) -> str:
+    """
+    Decode data from an image, detecting the format automatically.
 
+    The container format is tried first. Without a header, the legacy
+    stop-bit format of `lsb.encode` and the null-terminated format of
+    `app.encode` are both read. Readings rejected by `is_legacy_mark` are
+    dropped; of the rest, a `Copyright_` mark wins over the longest reading.
+
+    Args:
+    image (Image.Image): The image containing the encoded data.
+    legacy (bool): Whether to fall back to the legacy formats when the image
+        carries no container header.
+    vectorized (bool): Whether to use NumPy when it is installed.
+
+    Returns:
+    str: The decoded data from the image.
+
+    Raises:
+    ValueError: If no message is found in the image.
+    """
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+
+    if not vectorized or np is None:
+        source = image.getdata()
+        message = extract_container_pixels(source)
+        extractors = [decode_pixels, extract_null_terminated_pixels]
+    else:
+        source = np.asarray(image)
+        message = extract_container_array(source)
+        extractors = [extract_array, extract_null_terminated_array]
+
+    if message is not None:
+        return message
+
+    if legacy:
+        candidates = []
+        for extract in extractors:
+            try:
+                candidate = extract(source)
+            except (ValueError, RuntimeError, StopIteration):
+                continue
+            if is_legacy_mark(candidate):
+                candidates.append(candidate)
+        # Reading an image in the wrong legacy format usually stops after a
+        # few characters, so the longest accepted reading is the real one.
+        if candidates:
+            return max(candidates, key=lambda candidate: (candidate.startswith(LEGACY_MARK_PREFIX), len(candidate)))
+
+    raise ValueError("No message found in the image")
+
+
+def decode_pixels(pixels: iter) -> str:
+    """
+    Decode data from an iterator of pixel values.
+
+    Args:
+    pixels (iter): An iterator of pixel values.
+
+    Returns:
+    str: The decoded data from the pixels.
+    """
     decoded_data = ""
-    pixel_iterator = iter(image.getdata())
+    pixel_iterator = iter(pixels)
 
     while True:
         pixels = [
@@ -0,0 +1,208 @@
+"""
+This module runs the container encoding and decoding of `lsb` over tiles of a single image on a process pool.
+
+The pixel buffer is placed in shared memory, so worker processes modify or read their tile in place
+instead of receiving pickled copies of the pixels. The result is identical to the serial functions in `lsb`.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+import lsb
+
+# Pixels per tile. Tiles start on multiples of 8 pixels (24 bits), so every
+# tile covers a whole number of payload bytes.
+DEFAULT_TILE_PIXELS = 1 << 20
+
+
+def encode(img_path: str, data: str, new_img_name: str, workers: int | None = None,
+           tile_pixels: int = DEFAULT_TILE_PIXELS) -> None:
+    """
+    Encode data into an image on a process pool and save the new image.
+
+    Args:
+    img_path (str): The path to the image file.
+    data (str): The data to be encoded into the image.
+    new_img_name (str): The name of the new image file to be saved.
+    workers (int | None): The number of worker processes, defaulting to the CPU count.
+    tile_pixels (int): The number of pixels processed by one task.
+
+    Raises:
+    ValueError: If the provided data is empty or too large for the image.
+    """
+    if not data:
+        raise ValueError("Data is empty")
+
+    image = Image.open(img_path, "r")
+    new_image = embed_container(image, data, workers, tile_pixels)
+    new_image.save(new_img_name, "PNG")
+
+
+def decode(img_path: str, workers: int | None = None, tile_pixels: int = DEFAULT_TILE_PIXELS) -> str:
+    """
+    Decode data from an image, reading the payload on a process pool.
+
+    Images without a container header are handed to `lsb.decode_image`.
+
+    Args:
+    img_path (str): The path to the image file.
+    workers (int | None): The number of worker processes, defaulting to the CPU count.
+    tile_pixels (int): The number of pixels processed by one task.
+
+    Returns:
+    str: The decoded data from the image.
+
+    Raises:
+    ValueError: If no message is found in the image.
+    """
+    image = Image.open(img_path, "r")
+    message = extract_container(image, workers, tile_pixels)
+    if message is not None:
+        return message
+    return lsb.decode_image(image)
+
+
+def embed_container(image: Image.Image, data: str, workers: int | None = None,
+                    tile_pixels: int = DEFAULT_TILE_PIXELS) -> Image.Image:
+    """
+    Parallel counterpart of `lsb.embed_container`.
+
+    Args:
+    image (Image.Image): The image in which data is to be encoded.
+    data (str): The data to be encoded into the image.
+    workers (int | None): The number of worker processes, defaulting to the CPU count.
+    tile_pixels (int): The number of pixels processed by one task.
+
+    Returns:
+    Image.Image: A new image containing the encoded data.
+
+    Raises:
+    ValueError: If the data does not fit into the image.
+    """
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+
+    container = lsb.build_container(data)
+    pixel_count = -(-len(container) * 8 // 3)
+    if pixel_count > image.width * image.height:
+        raise ValueError("Data is too large to be encoded into this image")
+
+    with _SharedArray(np.asarray(image)) as pixels, _SharedArray(np.frombuffer(container, dtype=np.uint8)) as payload:
+        tasks = [
+            (pixels.name, pixels.array.shape, payload.name, len(container), first, last)
+            for first, last in _tiles(pixel_count, tile_pixels)
+        ]
+        _run(_embed_tile, tasks, workers)
+        # frombytes copies the pixels out before the shared memory is released.
+        return Image.frombytes(image.mode, image.size, pixels.array)
+
+
+def extract_container(image: Image.Image, workers: int | None = None,
+                      tile_pixels: int = DEFAULT_TILE_PIXELS) -> str | None:
+    """
+    Parallel counterpart of `lsb.extract_container_array`.
+
+    The header is read in the calling process; the payload is read in tiles.
+
+    Args:
+    image (Image.Image): The image containing the encoded data.
+    workers (int | None): The number of worker processes, defaulting to the CPU count.
+    tile_pixels (int): The number of pixels processed by one task.
+
+    Returns:
+    str | None: The decoded data, or None if the image carries no container.
+
+    Raises:
+    ValueError: If the container is unsupported or corrupt.
+    """
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+
+    array = np.asarray(image)
+    try:
+        if lsb.read_bytes_array(array, 0, len(lsb.MAGIC)) != lsb.MAGIC:
+            return None
+        header = lsb.read_bytes_array(array, 0, lsb.HEADER.size)
+    except ValueError:
+        return None
+
+    _, flags, length, checksum = lsb.parse_header(header)
+    if flags:
+        # Dense payloads are small relative to the image; read them serially.
+        return lsb.extract_container_array(array)
+
+    byte_count = lsb.HEADER.size + length
+    pixel_count = -(-byte_count * 8 // 3)
+    if pixel_count > image.width * image.height:
+        raise ValueError("Message extends beyond the image")
+
+    with _SharedArray(array) as pixels:
+        tasks = [(pixels.name, pixels.array.shape, first, last) for first, last in _tiles(pixel_count, tile_pixels)]
+        container = b"".join(_run(_read_tile, tasks, workers))
+
+    return lsb.verify_payload(container[lsb.HEADER.size:byte_count], checksum)
+
+
+def _tiles(pixel_count: int, tile_pixels: int) -> list[tuple[int, int]]:
+    """Split the first `pixel_count` pixels into tiles starting on multiples of 8 pixels."""
+    tile_pixels = max(8, tile_pixels - tile_pixels % 8)
+    return [(first, min(first + tile_pixels, pixel_count)) for first in range(0, pixel_count, tile_pixels)]
+
+
+def _run(function, tasks: list[tuple], workers: int | None) -> list:
+    """Run the tasks in order, on a process pool when there is more than one."""
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        return [function(*task) for task in tasks]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, *zip(*tasks)))
+
+
+def _embed_tile(pixels_name: str, shape: tuple, payload_name: str, payload_size: int, first: int, last: int) -> None:
+    """Write the payload bits falling into pixels [first, last) of the shared image."""
+    with _SharedArray.attach(pixels_name, shape) as pixels, _SharedArray.attach(payload_name, (payload_size,)) as payload:
+        first_byte = first * 3 // 8
+        bits = np.unpackbits(payload.array[first_byte:-(-last * 3 // 8)])
+        tile = pixels.array.reshape(-1, shape[-1])[first:last]
+        lsb.embed_bits_array(tile, bits[:(last - first) * 3], 0)
+
+
+def _read_tile(pixels_name: str, shape: tuple, first: int, last: int) -> bytes:
+    """Read the payload bytes held by pixels [first, last) of the shared image."""
+    with _SharedArray.attach(pixels_name, shape) as pixels:
+        tile = pixels.array.reshape(-1, shape[-1])[first:last]
+        return lsb.read_bytes_array(tile, 0, (last - first) * 3 // 8)
+
+
+class _SharedArray:
+    """A uint8 array backed by shared memory, unlinked by its creator on exit."""
+
+    def __init__(self, source: np.ndarray | None = None, memory: shared_memory.SharedMemory | None = None,
+                 shape: tuple | None = None):
+        self.owner = memory is None
+        self.memory = memory or shared_memory.SharedMemory(create=True, size=max(1, source.nbytes))
+        self.array = np.ndarray(shape or source.shape, dtype=np.uint8, buffer=self.memory.buf)
+        if source is not None:
+            self.array[...] = source
+
+    @classmethod
+    def attach(cls, name: str, shape: tuple) -> "_SharedArray":
+        return cls(memory=shared_memory.SharedMemory(name=name), shape=shape)
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def __enter__(self) -> "_SharedArray":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        del self.array
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
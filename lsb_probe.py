@@ -0,0 +1,217 @@
+"""
+This module checks whether an image carries a `Copyright_` mark by decoding only the leading scanlines of the image.
+
+For 8-bit, non-interlaced RGB and RGBA PNG files only the rows holding the container header and a short payload
+are decompressed, by `png_stream.read_rows`, so the cost of a probe does not depend on the size of the image.
+Other images are decoded in full.
+"""
+
+from contextlib import contextmanager
+from io import BytesIO
+from typing import BinaryIO, Iterator, NamedTuple
+
+from PIL import Image
+
+import lsb
+
+try:
+    import png_stream
+except ImportError:  # pragma: no cover - numpy is optional
+    png_stream = None
+
+COPYRIGHT_PREFIX = "Copyright_"
+# Payload bytes covered by the first read; longer payloads trigger a second, exact read.
+PROBE_PAYLOAD_BYTES = 256
+# Payload bytes covered by a prefix strip of an image without a readable container header.
+STRIP_PAYLOAD_BYTES = 1024
+
+
+class ProbeResult(NamedTuple):
+    """The outcome of a probe."""
+
+    marked: bool
+    owner: str | None = None
+    format_version: int | None = None  # 0 for the legacy formats without a header
+    message: str | None = None
+
+
+def probe(source: lsb.ImageSource) -> ProbeResult:
+    """
+    Check whether an image carries a copyright mark and read its owner.
+
+    Args:
+    source (ImageSource): The image as a path, bytes or binary file object.
+
+    Returns:
+    ProbeResult: Whether the image is marked, and the owner, format version
+        and message if it is. Unreadable images are reported as unmarked.
+    """
+    try:
+        width = _open(source).width
+        image = load_prefix(source, _pixel_rows(width, PROBE_PAYLOAD_BYTES))
+        header = _read_header(image)
+        if header is not None:
+            version, flags, length, _ = header
+            if length > PROBE_PAYLOAD_BYTES or flags:
+                image = load_prefix(source, _pixel_rows(width, length, flags))
+            message = lsb.decode_image(image, legacy=False)
+        else:
+            version = 0
+            message = lsb.decode_image(image)
+    except (OSError, ValueError):
+        return ProbeResult(marked=False)
+
+    owner = parse_owner(message)
+    if owner is None:
+        return ProbeResult(marked=False)
+    return ProbeResult(marked=True, owner=owner, format_version=version, message=message)
+
+
+def parse_owner(message: str) -> str | None:
+    """
+    Extract the owner from a `Copyright_<owner>_<time>` message.
+
+    Args:
+    message (str): The decoded message.
+
+    Returns:
+    str | None: The owner, or None if the message is not a copyright mark.
+    """
+    if not message.startswith(COPYRIGHT_PREFIX):
+        return None
+    # Owners may contain underscores; the timestamp never does.
+    return message[len(COPYRIGHT_PREFIX):].rsplit("_", 1)[0]
+
+
+def load_prefix(source: lsb.ImageSource, rows: int) -> Image.Image:
+    """
+    Open an image and decode only its first rows where the format allows it.
+
+    Args:
+    source (ImageSource): The image as a path, bytes or binary file object.
+    rows (int): The number of leading rows needed.
+
+    Returns:
+    Image.Image: An image holding at least the first `rows` rows.
+    """
+    image = _open(source)
+    rows = min(rows, image.height)
+
+    if png_stream is not None and image.format == "PNG" and not isinstance(source, Image.Image):
+        try:
+            with _binary(source) as f:
+                return Image.fromarray(png_stream.read_rows(f, rows))
+        except ValueError:
+            pass  # Not a PNG that can be read row by row
+
+    image.load()
+    return image
+
+
+def prefix_png(source: lsb.ImageSource, payload_bytes: int = STRIP_PAYLOAD_BYTES) -> bytes | None:
+    """
+    Crop an image to the leading rows that hold its mark and encode them as a lossless PNG.
+
+    With a container header the strip ends exactly after the payload; without
+    one it covers `payload_bytes` of payload in any format. Legacy messages
+    longer than that are not covered.
+
+    Args:
+    source (ImageSource): The image as a path, bytes or binary file object.
+    payload_bytes (int): The payload size covered when the image has no header.
+
+    Returns:
+    bytes | None: The strip as PNG data, or None if it would cover the whole image.
+    """
+    width, height = _open(source).size
+    rows = _pixel_rows(width, payload_bytes)
+    if rows >= height:
+        return None
+
+    image = load_prefix(source, rows)
+    try:
+        header = _read_header(image)
+    except ValueError:
+        header = None  # An unsupported version; the strip still carries the header for the server to reject
+    if header is not None:
+        _, flags, length, _ = header
+        rows = _pixel_rows(width, length, flags)
+        if rows >= height:
+            return None
+        if rows > image.height:
+            image = load_prefix(source, rows)
+
+    buffer = BytesIO()
+    image.crop((0, 0, width, rows)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def covers_message(strip: bytes) -> bool:
+    """
+    Tell whether a strip from `prefix_png` covers any message its image can hold,
+    so that finding no message in the strip means the image holds none.
+
+    That is the case when the strip holds a container header, or when both
+    legacy formats find their terminator inside the strip.
+
+    Args:
+    strip (bytes): The strip as PNG data.
+
+    Returns:
+    bool: Whether a decode of the strip is as conclusive as one of the full image.
+    """
+    image = lsb.open_image(strip)
+    try:
+        if _read_header(image) is not None:
+            return True
+    except ValueError:
+        return True  # An unsupported version is reported the same way for the full image
+    if lsb.np is None:
+        return False
+
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+    array = lsb.np.asarray(image)
+    pixels = array.reshape(-1, array.shape[-1])
+    groups = pixels[:len(pixels) // lsb.PIXELS_PER_BYTE * lsb.PIXELS_PER_BYTE, :3].reshape(-1, lsb.VALUES_PER_BYTE)
+    stop_bit_found = bool((groups[:, 8] & 1).any())
+    terminator_found = b"\x00" in lsb.read_bytes_array(array, 0, len(pixels) * 3 // 8)
+    return stop_bit_found and terminator_found
+
+
+def _open(source: lsb.ImageSource) -> Image.Image:
+    """Open the image lazily, rewinding file objects that were read before."""
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return lsb.open_image(source)
+
+
+@contextmanager
+def _binary(source: lsb.ImageSource) -> Iterator[BinaryIO]:
+    """Open a path or bytes as a binary file, or rewind a file object."""
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            yield f
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        yield BytesIO(source)
+    else:
+        source.seek(0)
+        yield source
+
+
+def _pixel_rows(width: int, length: int, flags: int = 0) -> int:
+    """Return the number of rows holding the header and a payload of `length` bytes."""
+    if flags:
+        pixels = lsb.HEADER_PIXELS + lsb.dense_pixel_count(length, flags)
+    else:
+        # Also covers legacy stop-bit payloads of up to `length` bytes.
+        pixels = max(-(-(lsb.HEADER.size + length) * 8 // 3), length * lsb.PIXELS_PER_BYTE)
+    return -(-pixels // width)
+
+
+def _read_header(image: Image.Image) -> tuple[int, int, int, int] | None:
+    """Parse the container header of a loaded image, or return None if it has none."""
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+    pixels = list(image.crop((0, 0, image.width, -(-lsb.HEADER_PIXELS // image.width))).getdata())
+    return lsb.parse_header(lsb.read_bytes_bits(lsb.iter_bits(pixels[:lsb.HEADER_PIXELS]), lsb.HEADER.size))
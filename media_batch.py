@@ -0,0 +1,271 @@
+"""
+This module watermarks or verifies every image below a directory such as `media/` on a process pool.
+
+Results are appended to a JSON Lines manifest as files finish, so an interrupted run resumes where it stopped:
+files recorded with the same size and modification time are skipped, failed ones are tried again. Run from the
+repository root:
+
+    python media_batch.py encode media/ --dry-run
+    python media_batch.py encode media/ --workers 8
+    python media_batch.py verify media/ --manifest audit.jsonl
+
+Encoding follows the app: an image in `media/<user>/` is marked `Copyright_<user>_<time>` and written next to it
+as `encoded_<name>.png`. Images that already carry a mark are recorded as `marked` and left alone.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from PIL import Image
+
+import lsb
+import lsb_probe
+
+DEFAULT_MANIFEST = "hide_manifest.jsonl"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+ENCODED_PREFIX = "encoded_"
+MESSAGE_TEMPLATE = "Copyright_{owner}_{time}"
+# Tasks queued per worker; bounds memory when a tree holds millions of files.
+TASKS_PER_WORKER = 4
+# Seconds between progress updates
+PROGRESS_INTERVAL = 0.2
+
+
+def find_images(root: str, command: str) -> list[str]:
+    """
+    List the images below a directory in a stable order.
+
+    Args:
+    root (str): The directory to walk.
+    command (str): "encode" or "verify"; encoding skips the images written by earlier encodes.
+
+    Returns:
+    list[str]: The paths of the images.
+    """
+    paths = []
+    for directory, subdirectories, files in os.walk(root):
+        # Hidden folders, such as the staged uploads of the post pipeline, are not content
+        subdirectories[:] = sorted(name for name in subdirectories if not name.startswith("."))
+        for name in sorted(files):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            if command == "encode" and name.startswith(ENCODED_PREFIX):
+                continue
+            paths.append(os.path.join(directory, name))
+    return paths
+
+
+def encoded_path(path: str) -> str:
+    """Return the path the encoded copy of an image is written to."""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, ENCODED_PREFIX + os.path.splitext(name)[0] + ".png")
+
+
+def owner_of(root: str, path: str) -> str:
+    """Return the user owning an image: the first directory below the root, as in `media/<user>/`."""
+    parts = os.path.relpath(path, root).split(os.sep)
+    return parts[0] if len(parts) > 1 else os.path.basename(os.path.abspath(root))
+
+
+def load_manifest(manifest_path: str) -> dict[tuple[str, str], dict]:
+    """
+    Read the latest record of every file from a manifest.
+
+    Args:
+    manifest_path (str): The path of the JSON Lines manifest; it need not exist.
+
+    Returns:
+    dict[tuple[str, str], dict]: The last record per command and path. A line
+        cut short by an interrupted run is ignored.
+    """
+    records = {}
+    if not os.path.exists(manifest_path):
+        return records
+    with open(manifest_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[(record["command"], record["path"])] = record
+    return records
+
+
+def is_finished(record: dict | None, path: str) -> bool:
+    """Return whether a manifest record covers the current contents of a file."""
+    if record is None or record["status"] == "error":
+        return False
+    stat = os.stat(path)
+    return record["size"] == stat.st_size and record["mtime_ns"] == stat.st_mtime_ns
+
+
+def process_image(command: str, path: str, message: str | None, dry_run: bool, overwrite: bool) -> dict:
+    """
+    Encode or verify one image; runs in a worker process.
+
+    Args:
+    command (str): "encode" or "verify".
+    path (str): The path of the image.
+    message (str | None): The message to encode.
+    dry_run (bool): Whether to only check that the message fits into the image.
+    overwrite (bool): Whether to replace an existing encoded copy.
+
+    Returns:
+    dict: The manifest record of the image. Its status is one of "encoded",
+        "fits", "too_large", "marked", "exists", "verified", "unmarked" or "error".
+    """
+    start = time.perf_counter()
+    stat = os.stat(path)
+    record = {"command": command, "path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    try:
+        if command == "verify":
+            record.update(_verify(path))
+        else:
+            record.update(_encode(path, message, dry_run, overwrite))
+    except (OSError, ValueError) as e:
+        record.update(status="error", error=str(e))
+    record["seconds"] = round(time.perf_counter() - start, 4)
+    return record
+
+
+def _verify(path: str) -> dict:
+    try:
+        message = lsb.decode(path)
+    except ValueError as e:
+        if str(e).startswith("No message"):
+            return {"status": "unmarked"}
+        raise
+    owner = lsb_probe.parse_owner(message)
+    # Legacy messages that are not copyright marks count as unmarked
+    return {"status": "verified" if owner else "unmarked", "message": message, "owner": owner}
+
+
+def _encode(path: str, message: str, dry_run: bool, overwrite: bool) -> dict:
+    result = lsb_probe.probe(path)
+    if result.marked:
+        return {"status": "marked", "owner": result.owner, "message": result.message}
+
+    output_path = encoded_path(path)
+    if os.path.exists(output_path) and not overwrite:
+        return {"status": "exists", "output": output_path}
+
+    with Image.open(path) as image:
+        capacity = image.width * image.height
+    needed = -(-len(lsb.build_container(message)) * 8 // 3)
+    if needed > capacity:
+        return {"status": "too_large", "needed_pixels": needed, "pixels": capacity}
+    if dry_run:
+        return {"status": "fits", "needed_pixels": needed, "pixels": capacity}
+
+    # Write to a temporary name first, so an interrupted run never leaves a truncated image behind
+    temp_path = output_path + ".part"
+    lsb.encode(path, message, temp_path, streaming=True)
+    os.replace(temp_path, output_path)
+    return {"status": "encoded", "output": output_path, "message": message}
+
+
+def run(command: str, root: str, manifest_path: str = DEFAULT_MANIFEST, workers: int | None = None,
+        dry_run: bool = False, overwrite: bool = False, template: str = MESSAGE_TEMPLATE,
+        progress=sys.stderr) -> dict[str, int]:
+    """
+    Encode or verify all images below a directory, skipping those finished in earlier runs.
+
+    Args:
+    command (str): "encode" or "verify".
+    root (str): The directory to walk.
+    manifest_path (str): The JSON Lines manifest results are appended to.
+    workers (int | None): The number of worker processes, defaulting to the CPU count.
+    dry_run (bool): Whether encoding only checks capacity. Dry runs are not recorded.
+    overwrite (bool): Whether to replace existing encoded copies.
+    template (str): The message format, with the `{owner}` and `{time}` fields.
+    progress: The text stream progress is written to, or None.
+
+    Returns:
+    dict[str, int]: The number of images per status, including "skipped" for
+        images finished in earlier runs. Dry runs report images that do not
+        fit or cannot be read on `progress`.
+    """
+    records = load_manifest(manifest_path)
+    counts = {}
+    problems = []
+    pending = []
+    for path in find_images(root, command):
+        if not dry_run and is_finished(records.get((command, path)), path):
+            counts["skipped"] = counts.get("skipped", 0) + 1
+        else:
+            pending.append(path)
+
+    current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    workers = workers or os.cpu_count() or 1
+    manifest = None if dry_run else open(manifest_path, "a", buffering=1)
+    start = time.perf_counter()
+    shown_at = 0.0
+    done = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            paths = iter(pending)
+            running = set()
+            while True:
+                for path in paths:
+                    message = template.format(owner=owner_of(root, path), time=current_time)
+                    running.add(executor.submit(process_image, command, path, message, dry_run, overwrite))
+                    if len(running) >= workers * TASKS_PER_WORKER:
+                        break
+                if not running:
+                    break
+
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record = future.result()
+                    counts[record["status"]] = counts.get(record["status"], 0) + 1
+                    if manifest is not None:
+                        manifest.write(json.dumps(record) + "\n")
+                    elif record["status"] in ("too_large", "error"):
+                        problems.append(f"{record['status']}: {record['path']}")
+                done += len(finished)
+                now = time.perf_counter()
+                if progress is not None and (now - shown_at >= PROGRESS_INTERVAL or done == len(pending)):
+                    shown_at = now
+                    elapsed = now - start
+                    progress.write(f"\r{done}/{len(pending)} images, {done / elapsed:.1f} images/s")
+                    progress.flush()
+    finally:
+        if manifest is not None:
+            manifest.close()
+        if progress is not None and pending:
+            progress.write("\n")
+    for problem in problems:
+        print(problem, file=progress or sys.stderr)
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Watermark or verify every image below a directory")
+    parser.add_argument("command", choices=["encode", "verify"])
+    parser.add_argument("root", help="The directory to walk, e.g. media/")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST, help="JSON Lines file results are appended to")
+    parser.add_argument("--workers", type=int, help="Worker processes, defaulting to the CPU count")
+    parser.add_argument("--dry-run", action="store_true", help="Only check that the marks fit into the images")
+    parser.add_argument("--overwrite", action="store_true", help="Replace existing encoded copies")
+    parser.add_argument("--template", default=MESSAGE_TEMPLATE,
+                        help="Message format with the {owner} and {time} fields")
+    parser.add_argument("--quiet", action="store_true", help="Do not show progress")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = run(args.command, args.root, args.manifest, args.workers, args.dry_run, args.overwrite,
+                 args.template, progress=None if args.quiet else sys.stderr)
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(f"{total} images in {elapsed:.1f} s: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+    if counts.get("error") or counts.get("too_large"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+# media_store.py
+import argparse
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import BinaryIO, Dict, List, Optional, Union
+
+# Read size used when copying and hashing uploads
+CHUNK_SIZE = 1 << 20
+# Files rewritten in place by the app; they must never share an inode with other references
+MUTABLE_NAMES = ('profile_pic.png',)
+POST_EXTENSIONS = ('jpg', 'png', 'mp4')
+
+class MediaStore:
+    """Content-addressed store of media files with per-user references
+
+    Every unique file is kept once as a blob named after its SHA-256. The files users see under
+    `media/<user>/` are references: hard links to the blob (copies where the filesystem has none), recorded
+    in SQLite. A blob is deleted together with its last reference. Files are never modified in place; a
+    changed file is a new blob.
+    """
+
+    def __init__(self, media_root: str = "media", db_path: str = "media_store.db"):
+        self.media_root = media_root
+        self.blob_root = os.path.join(media_root, ".store")
+        self._lock = threading.Lock()
+        os.makedirs(self.blob_root, exist_ok=True)
+        # Transactions are explicit, so reference counting stays exact with several processes
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS refs '
+                           '(path TEXT PRIMARY KEY, digest TEXT, username TEXT, created REAL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS refs_digest ON refs (digest)')
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_root, digest[:2], digest)
+
+    def add(self, source: Union[bytes, BinaryIO, str], username: str, file_name: str) -> str:
+        """Store a file for a user and return the path of the new reference under `media/<username>/`
+
+        The source (bytes, a binary file object or a path) is hashed while it is written, so it is read once.
+        Storing content the user already has under that name returns the existing reference; a different
+        file with the same name gets a name with a digest suffix instead of overwriting it.
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self.blob_root, prefix=".upload-")
+        sha256 = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in _chunks(source):
+                    sha256.update(chunk)
+                    f.write(chunk)
+            digest = sha256.hexdigest()
+
+            with self._lock, self._transaction():
+                blob = self.blob_path(digest)
+                if not os.path.exists(blob):
+                    os.makedirs(os.path.dirname(blob), exist_ok=True)
+                    os.replace(temp_path, blob)
+                path = self._free_path(username, file_name, digest)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    _link(blob, path)
+                    self._conn.execute('INSERT OR REPLACE INTO refs VALUES (?, ?, ?, ?)',
+                                       (path, digest, username, time.time()))
+                return path
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def remove(self, path: str) -> bool:
+        """Delete a reference, and its blob if no other reference uses it
+
+        Files that are not references of the store are simply deleted. Returns whether a file was removed.
+        """
+        with self._lock, self._transaction():
+            row = self._conn.execute('SELECT digest FROM refs WHERE path=?', (path,)).fetchone()
+            removed = _remove(path)
+            if row is None:
+                return removed
+            self._conn.execute('DELETE FROM refs WHERE path=?', (path,))
+            if not self._conn.execute('SELECT 1 FROM refs WHERE digest=? LIMIT 1', row).fetchone():
+                _remove(self.blob_path(row[0]))
+            return True
+
+    def adopt(self, path: str, username: str) -> Optional[str]:
+        """Turn an existing file under `media/<username>/` into a reference, deduplicating it
+
+        Returns the digest, or None for files the app rewrites in place, which are left alone.
+        """
+        if os.path.basename(path) in MUTABLE_NAMES:
+            return None
+        digest = _hash_file(path)
+        # Linking changes the ctime of the file, and replacing it gives it the blob's mtime
+        created = os.path.getmtime(path)
+        with self._lock, self._transaction():
+            blob = self.blob_path(digest)
+            if not os.path.exists(blob):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                _link(path, blob)
+            elif not os.path.samefile(blob, path):
+                # Replace the duplicate with a link to the existing blob, atomically
+                temp_path = path + ".link"
+                _link(blob, temp_path)
+                os.replace(temp_path, path)
+            self._conn.execute('INSERT OR REPLACE INTO refs VALUES (?, ?, ?, ?)',
+                               (path, digest, username, created))
+        return digest
+
+    def digest_of(self, path: str) -> Optional[str]:
+        """Return the digest a reference points to, or None if the path is not a reference"""
+        with self._lock:
+            row = self._conn.execute('SELECT digest FROM refs WHERE path=?', (path,)).fetchone()
+        return row[0] if row else None
+
+    def created(self, path: str) -> Optional[float]:
+        """Return when a reference was stored, or None if the path is not a reference
+
+        Links share the times of their inode, so this is the only record of when each post was made.
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT created FROM refs WHERE path=?', (path,)).fetchone()
+        return row[0] if row else None
+
+    def references(self, digest: str) -> List[str]:
+        """Return the paths referencing a blob"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute('SELECT path FROM refs WHERE digest=? ORDER BY created',
+                                                         (digest,))]
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of blobs and references, and the bytes stored versus the bytes referenced"""
+        with self._lock:
+            rows = self._conn.execute('SELECT digest, COUNT(*) FROM refs GROUP BY digest').fetchall()
+        stored = referenced = 0
+        for digest, count in rows:
+            try:
+                size = os.path.getsize(self.blob_path(digest))
+            except FileNotFoundError:
+                continue
+            stored += size
+            referenced += size * count
+        return {'blobs': len(rows), 'references': sum(count for _, count in rows),
+                'stored_bytes': stored, 'referenced_bytes': referenced}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _free_path(self, username: str, file_name: str, digest: str) -> str:
+        """Pick the reference path for a file: its own name unless that is taken by different content
+
+        Names the app rewrites in place are never used for references, so a rewrite cannot change the blob.
+        """
+        directory = os.path.join(self.media_root, username)
+        stem, extension = os.path.splitext(os.path.basename(file_name))
+        candidates = [] if os.path.basename(file_name) in MUTABLE_NAMES else [file_name]
+        candidates.append(f"{stem}_{digest[:8]}{extension}")
+        candidates += (f"{stem}_{digest[:8]}_{number}{extension}" for number in range(2, 1000))
+        for name in candidates:
+            path = os.path.join(directory, os.path.basename(name))
+            if not os.path.exists(path):
+                return path
+            known = self._conn.execute('SELECT digest FROM refs WHERE path=?', (path,)).fetchone()
+            if known and known[0] == digest:
+                return path
+        raise FileExistsError(f"No free name for {file_name} in {directory}")
+
+    def _transaction(self):
+        return _Transaction(self._conn)
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, rolled back on error"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __enter__(self) -> None:
+        self._conn.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self._conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+def _chunks(source: Union[bytes, BinaryIO, str]):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield bytes(source)
+        return
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            yield from iter(lambda: f.read(CHUNK_SIZE), b'')
+        return
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    yield from iter(lambda: source.read(CHUNK_SIZE), b'')
+
+def _hash_file(path: str) -> str:
+    sha256 = hashlib.sha256()
+    for chunk in _chunks(path):
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+def _link(source: str, target: str) -> None:
+    """Hard-link a file, copying it where the filesystem does not support links"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the content-addressed media store")
+    parser.add_argument("command", choices=["migrate", "stats"])
+    parser.add_argument("--db", default="media_store.db", help="Path of the reference database")
+    parser.add_argument("--media-root", default="media", help="Folder holding one folder per user")
+    args = parser.parse_args()
+
+    store = MediaStore(args.media_root, args.db)
+    if args.command == "migrate":
+        # Existing posts become references, so duplicates across users are stored once
+        adopted = 0
+        for user_folder in sorted(os.listdir(args.media_root)):
+            user_path = os.path.join(args.media_root, user_folder)
+            if user_folder.startswith('.') or not os.path.isdir(user_path):
+                continue
+            for file in sorted(os.listdir(user_path)):
+                path = os.path.join(user_path, file)
+                if file.endswith(POST_EXTENSIONS) and store.digest_of(path) is None:
+                    adopted += store.adopt(path, user_folder) is not None
+        print(f"Adopted {adopted} files")
+    stats = store.stats()
+    print(f"{stats['references']} references to {stats['blobs']} blobs: "
+          f"{stats['stored_bytes'] / 1e6:.1f} MB stored for {stats['referenced_bytes'] / 1e6:.1f} MB referenced")
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+This module marks MP4 videos with a message stored in a `uuid` box of the ISO-BMFF container.
+
+The message uses the container format of `lsb` and is written as a top-level box after all
+existing boxes, so no media data moves and no sample offsets need rewriting. Writing streams the
+file through unchanged and reading seeks from box header to box header, so neither decodes a
+frame and the cost does not depend on the length of the video.
+"""
+
+import os
+import struct
+import uuid
+from io import BytesIO
+from typing import BinaryIO, Iterator, NamedTuple, Union
+
+import lsb
+import lsb_probe
+
+# Extended type of the box holding the message.
+MARK_UUID = uuid.UUID("38296915ffb05d14b4af3303d2721ae5").bytes
+BOX_HEADER = struct.Struct(">I4s")
+LARGE_SIZE = struct.Struct(">Q")
+# Size of the pieces copied from the input to the output.
+COPY_CHUNK_SIZE = 1 << 20
+
+MediaSource = Union[str, bytes, bytearray, memoryview, BinaryIO]
+
+
+class Box(NamedTuple):
+    """A top-level box: its type, the offset of its header and its total size."""
+
+    type: bytes
+    offset: int
+    size: int
+    header_size: int
+
+
+def is_mp4(source: MediaSource) -> bool:
+    """
+    Check whether a file starts with the `ftyp` box of an ISO-BMFF container.
+
+    Args:
+    source (MediaSource): The file as a path, bytes or binary file object.
+
+    Returns:
+    bool: Whether the file is an MP4 (or another ISO-BMFF) file.
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            head = f.read(BOX_HEADER.size)
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        head = bytes(source[:BOX_HEADER.size])
+    elif hasattr(source, "read") and hasattr(source, "seek"):
+        position = source.tell()
+        head = source.read(BOX_HEADER.size)
+        source.seek(position)
+    else:
+        return False
+    return len(head) == BOX_HEADER.size and head[4:8] == b"ftyp"
+
+
+def iter_boxes(f: BinaryIO) -> Iterator[Box]:
+    """
+    List the top-level boxes of a file by reading their headers only.
+
+    Args:
+    f (BinaryIO): The file, positioned at its start.
+
+    Returns:
+    Iterator[Box]: The boxes in file order.
+
+    Raises:
+    ValueError: If a box header is truncated or a box extends beyond the file.
+    """
+    file_size = f.seek(0, os.SEEK_END)
+    offset = 0
+    while offset < file_size:
+        f.seek(offset)
+        header = f.read(BOX_HEADER.size)
+        if len(header) < BOX_HEADER.size:
+            raise ValueError("Truncated box header")
+        size, box_type = BOX_HEADER.unpack(header)
+        header_size = BOX_HEADER.size
+        if size == 1:
+            size = LARGE_SIZE.unpack(f.read(LARGE_SIZE.size))[0]
+            header_size += LARGE_SIZE.size
+        elif size == 0:
+            size = file_size - offset  # The last box extends to the end of the file
+        if size < header_size or offset + size > file_size:
+            raise ValueError(f"Invalid size of box {box_type!r}")
+        yield Box(box_type, offset, size, header_size)
+        offset += size
+
+
+def encode(source: MediaSource, data: str, output_path: str) -> None:
+    """
+    Write a copy of a video carrying the data in a `uuid` box.
+
+    Args:
+    source (MediaSource): The video as a path, bytes or binary file object.
+    data (str): The data to be stored.
+    output_path (str): The path of the new video.
+
+    Raises:
+    ValueError: If the data is empty or the source is not an ISO-BMFF file.
+    """
+    with open(output_path, "wb") as out:
+        encode_file(source, data, out)
+
+
+def encode_file(source: MediaSource, data: str, fp: BinaryIO) -> None:
+    """
+    Copy a video to a file object, replacing any earlier mark with one carrying the data.
+
+    All other boxes are copied byte for byte. A last box of unspecified size
+    is given its actual size, so the appended box does not become part of it.
+
+    Args:
+    source (MediaSource): The video as a path, bytes or binary file object.
+    data (str): The data to be stored.
+    fp (BinaryIO): The file object the new video is written to.
+
+    Raises:
+    ValueError: If the data is empty or the source is not an ISO-BMFF file.
+    """
+    if not data:
+        raise ValueError("Data is empty")
+
+    with _open(source) as f:
+        boxes = list(iter_boxes(f))
+        if not boxes or boxes[0].type != b"ftyp":
+            raise ValueError("Not an MP4 file")
+
+        for box in boxes:
+            if _is_mark(f, box):
+                continue
+            remaining = box.size
+            if box.header_size == BOX_HEADER.size and _read_at(f, box.offset, 4) == b"\0\0\0\0":
+                if box.size > 0xFFFFFFFF:
+                    raise ValueError("Unsized last box is too large to be closed")
+                fp.write(BOX_HEADER.pack(box.size, box.type))
+                remaining -= BOX_HEADER.size
+            f.seek(box.offset + box.size - remaining)
+            while remaining:
+                chunk = f.read(min(COPY_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise ValueError("Unexpected end of file")
+                fp.write(chunk)
+                remaining -= len(chunk)
+
+    payload = MARK_UUID + lsb.build_container(data)
+    fp.write(BOX_HEADER.pack(BOX_HEADER.size + len(payload), b"uuid") + payload)
+
+
+def decode(source: MediaSource) -> str:
+    """
+    Read the data stored in a video by `encode`.
+
+    Args:
+    source (MediaSource): The video as a path, bytes or binary file object.
+
+    Returns:
+    str: The decoded data.
+
+    Raises:
+    ValueError: If no message is found in the video, or it is unsupported or corrupt.
+    """
+    with _open(source) as f:
+        try:
+            boxes = list(iter_boxes(f))
+        except ValueError:
+            raise ValueError("No message found in the video")
+        for box in reversed(boxes):  # The mark is appended, so it is usually the last box
+            if not _is_mark(f, box):
+                continue
+            f.seek(box.offset + box.header_size + len(MARK_UUID))
+            parsed = lsb.parse_header(f.read(lsb.HEADER.size))
+            if parsed is None:
+                continue
+            _, _, length, checksum = parsed
+            return lsb.verify_payload(f.read(length), checksum)
+    raise ValueError("No message found in the video")
+
+
+def probe(source: MediaSource) -> lsb_probe.ProbeResult:
+    """
+    Check whether a video carries a copyright mark and read its owner.
+
+    Args:
+    source (MediaSource): The video as a path, bytes or binary file object.
+
+    Returns:
+    ProbeResult: Whether the video is marked, and the owner, format version and
+        message if it is. Unreadable videos are reported as unmarked.
+    """
+    try:
+        message = decode(source)
+    except (OSError, ValueError):
+        return lsb_probe.ProbeResult(marked=False)
+
+    owner = lsb_probe.parse_owner(message)
+    if owner is None:
+        return lsb_probe.ProbeResult(marked=False)
+    return lsb_probe.ProbeResult(marked=True, owner=owner, format_version=lsb.FORMAT_VERSION, message=message)
+
+
+def _is_mark(f: BinaryIO, box: Box) -> bool:
+    """Check whether a box is a `uuid` box with the extended type of a mark."""
+    return box.type == b"uuid" and _read_at(f, box.offset + box.header_size, len(MARK_UUID)) == MARK_UUID
+
+
+def _read_at(f: BinaryIO, offset: int, count: int) -> bytes:
+    f.seek(offset)
+    return f.read(count)
+
+
+class _open:
+    """Open a source for reading; file objects are rewound and left open."""
+
+    def __init__(self, source: MediaSource):
+        self.source = source
+        self.owned = isinstance(source, str)
+
+    def __enter__(self) -> BinaryIO:
+        if self.owned:
+            self.file = open(self.source, "rb")
+        elif isinstance(self.source, (bytes, bytearray, memoryview)):
+            self.file = BytesIO(self.source)
+        else:
+            self.file = self.source
+            self.file.seek(0)
+        return self.file
+
+    def __exit__(self, *exc_info) -> None:
+        if self.owned:
+            self.file.close()
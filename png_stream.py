@@ -0,0 +1,333 @@
+"""
+This module rewrites the leading rows of a PNG file while streaming the rest of it through unchanged.
+
+Only the rows being rewritten are unfiltered and held in memory; all other scanlines are copied as
+filtered bytes from the decompressed input into the recompressed output, so memory use depends on
+the number of rewritten rows rather than on the size of the image. `read_rows` decodes leading rows
+the same way without writing anything.
+"""
+
+import struct
+import zlib
+from typing import BinaryIO, Callable
+
+import numpy as np
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Channels per pixel for the 8-bit, non-interlaced colour types that can be streamed.
+STREAMABLE_COLOR_TYPES = {2: 3, 6: 4}
+# Size of the pieces read from the input and of the IDAT chunks written to the output.
+IO_CHUNK_SIZE = 1 << 16
+
+
+def is_streamable(path: str) -> bool:
+    """
+    Check whether a file is a PNG that `rewrite_rows` can process.
+
+    Args:
+    path (str): The path to the image file.
+
+    Returns:
+    bool: True for 8-bit, non-interlaced RGB and RGBA PNG files.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+            return False
+        length, chunk_type = struct.unpack(">I4s", f.read(8))
+        if chunk_type != b"IHDR":
+            return False
+        _, _, bit_depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", f.read(length))
+
+    return bit_depth == 8 and color_type in STREAMABLE_COLOR_TYPES and interlace == 0
+
+
+def read_size(path: str) -> tuple[int, int]:
+    """
+    Read the width and height from the IHDR chunk of a PNG file.
+
+    Args:
+    path (str): The path to the PNG file.
+
+    Returns:
+    tuple[int, int]: The width and height of the image.
+    """
+    with open(path, "rb") as f:
+        f.seek(len(PNG_SIGNATURE) + 8)
+        return struct.unpack(">II", f.read(8))
+
+
+def rewrite_rows(
+    src_path: str,
+    dst_path: str,
+    row_count: int,
+    rewrite: Callable[[np.ndarray, int], None],
+    band_rows: int,
+) -> None:
+    """
+    Copy a PNG file, letting a callback modify its first rows.
+
+    The rows are handed to the callback in bands of at most `band_rows` rows as a uint8 array of
+    shape (rows, width, channels) together with the index of the band's first row, and are
+    modified in place. All chunks other than IDAT are copied unchanged.
+
+    Args:
+    src_path (str): The path to the source PNG file.
+    dst_path (str): The path of the PNG file to be written.
+    row_count (int): The number of leading rows to rewrite.
+    rewrite (Callable[[np.ndarray, int], None]): The callback modifying a band of rows.
+    band_rows (int): The maximum number of rows handed to the callback at once.
+
+    Raises:
+    ValueError: If the source is not a streamable PNG file.
+    """
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        if src.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+            raise ValueError("Not a PNG file")
+        dst.write(PNG_SIGNATURE)
+
+        width = channels = None
+        idat_done = False
+
+        while True:
+            header = src.read(8)
+            if len(header) < 8:
+                raise ValueError("Truncated PNG file")
+            length, chunk_type = struct.unpack(">I4s", header)
+
+            if chunk_type == b"IDAT":
+                if idat_done:
+                    raise ValueError("Non-consecutive IDAT chunks")
+                transcoder = _RowTranscoder(dst, width, channels, row_count, rewrite, band_rows)
+                while chunk_type == b"IDAT":
+                    for piece in _read_chunk_data(src, length):
+                        transcoder.feed(piece)
+                    src.read(4)  # CRC
+                    header = src.read(8)
+                    length, chunk_type = struct.unpack(">I4s", header)
+                transcoder.finish()
+                idat_done = True
+
+            data = src.read(length)
+            crc = src.read(4)
+            if chunk_type == b"IHDR":
+                width, _, bit_depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", data)
+                if bit_depth != 8 or color_type not in STREAMABLE_COLOR_TYPES or interlace != 0:
+                    raise ValueError("Only 8-bit, non-interlaced RGB and RGBA PNG files can be streamed")
+                channels = STREAMABLE_COLOR_TYPES[color_type]
+            dst.write(header)
+            dst.write(data)
+            dst.write(crc)
+            if chunk_type == b"IEND":
+                break
+
+
+def read_rows(f: BinaryIO, row_count: int) -> np.ndarray:
+    """
+    Decode the first rows of a PNG file, decompressing no more of it than they need.
+
+    Args:
+    f (BinaryIO): The PNG file, positioned at its start.
+    row_count (int): The number of leading rows to decode.
+
+    Returns:
+    np.ndarray: A uint8 array of shape (row_count, width, channels).
+
+    Raises:
+    ValueError: If the file is not a streamable PNG file or has fewer rows.
+    """
+    if f.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+        raise ValueError("Not a PNG file")
+
+    width = channels = None
+    rows = []
+    while len(rows) < row_count:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError("Truncated PNG file")
+        length, chunk_type = struct.unpack(">I4s", header)
+
+        if chunk_type == b"IHDR":
+            width, _, bit_depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", f.read(length))
+            if bit_depth != 8 or color_type not in STREAMABLE_COLOR_TYPES or interlace != 0:
+                raise ValueError("Only 8-bit, non-interlaced RGB and RGBA PNG files can be streamed")
+            channels = STREAMABLE_COLOR_TYPES[color_type]
+            line_size = width * channels + 1
+            decompressor = zlib.decompressobj()
+            pending = bytearray()
+            previous = bytes(width * channels)
+            f.read(4)  # CRC
+        elif chunk_type == b"IDAT" and width is not None:
+            for piece in _read_chunk_data(f, length):
+                while piece and len(rows) < row_count:
+                    pending += decompressor.decompress(piece, IO_CHUNK_SIZE)
+                    piece = decompressor.unconsumed_tail
+                    offset = 0
+                    while len(pending) - offset >= line_size and len(rows) < row_count:
+                        line = pending[offset:offset + line_size]
+                        previous = unfilter_row(line[0], line[1:], previous, channels)
+                        rows.append(bytes(previous))
+                        offset += line_size
+                    del pending[:offset]
+                if len(rows) == row_count:
+                    break
+            else:
+                f.read(4)  # CRC
+        elif chunk_type in (b"IDAT", b"IEND"):
+            raise ValueError("Truncated PNG file")
+        else:
+            f.seek(length + 4, 1)
+
+    return np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(len(rows), width or 0, channels or 0)
+
+
+def write_chunk(f: BinaryIO, chunk_type: bytes, data: bytes) -> None:
+    """
+    Write a single PNG chunk.
+
+    Args:
+    f (BinaryIO): The file to write to.
+    chunk_type (bytes): The four-letter chunk type.
+    data (bytes): The chunk data.
+    """
+    f.write(struct.pack(">I", len(data)))
+    f.write(chunk_type)
+    f.write(data)
+    f.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+
+def unfilter_row(filter_type: int, line: bytes, previous: bytes, bpp: int) -> bytearray:
+    """
+    Reverse the PNG filter applied to one scanline.
+
+    Args:
+    filter_type (int): The filter type byte of the scanline.
+    line (bytes): The filtered scanline without its filter type byte.
+    previous (bytes): The unfiltered previous scanline (zeros for the first row).
+    bpp (int): The number of bytes per pixel.
+
+    Returns:
+    bytearray: The unfiltered scanline.
+
+    Raises:
+    ValueError: If the filter type is unknown.
+    """
+    if filter_type == 0:
+        return bytearray(line)
+    if filter_type == 1:
+        values = np.frombuffer(line, dtype=np.uint8).reshape(-1, bpp)
+        return bytearray(np.cumsum(values, axis=0, dtype=np.uint8).tobytes())
+    if filter_type == 2:
+        values = np.frombuffer(line, dtype=np.uint8) + np.frombuffer(previous, dtype=np.uint8)
+        return bytearray(values.tobytes())
+
+    raw = bytearray(line)
+    if filter_type == 3:
+        for i in range(len(raw)):
+            left = raw[i - bpp] if i >= bpp else 0
+            raw[i] = (raw[i] + ((left + previous[i]) >> 1)) & 0xFF
+    elif filter_type == 4:
+        for i in range(len(raw)):
+            left = raw[i - bpp] if i >= bpp else 0
+            up = previous[i]
+            up_left = previous[i - bpp] if i >= bpp else 0
+            estimate = left + up - up_left
+            distance_left = abs(estimate - left)
+            distance_up = abs(estimate - up)
+            distance_up_left = abs(estimate - up_left)
+            if distance_left <= distance_up and distance_left <= distance_up_left:
+                predictor = left
+            elif distance_up <= distance_up_left:
+                predictor = up
+            else:
+                predictor = up_left
+            raw[i] = (raw[i] + predictor) & 0xFF
+    else:
+        raise ValueError(f"Unknown PNG filter type: {filter_type}")
+    return raw
+
+
+def _read_chunk_data(f: BinaryIO, length: int) -> iter:
+    """Yield the data of a chunk in pieces of at most IO_CHUNK_SIZE bytes."""
+    while length > 0:
+        piece = f.read(min(length, IO_CHUNK_SIZE))
+        if not piece:
+            raise ValueError("Truncated PNG file")
+        length -= len(piece)
+        yield piece
+
+
+class _RowTranscoder:
+    """Decompresses IDAT data row by row, rewrites the leading rows and recompresses the result."""
+
+    def __init__(self, dst, width, channels, row_count, rewrite, band_rows):
+        self.dst = dst
+        self.width = width
+        self.bpp = channels
+        self.stride = width * channels
+        self.row_count = row_count
+        self.rewrite = rewrite
+        self.band_rows = max(1, band_rows)
+        self.decompressor = zlib.decompressobj()
+        self.compressor = zlib.compressobj(6)
+        self.pending = bytearray()
+        self.output = bytearray()
+        self.band = []
+        self.band_start = 0
+        self.row_index = 0
+        self.previous = bytes(self.stride)
+
+    def feed(self, data: bytes) -> None:
+        while data:
+            self._push(self.decompressor.decompress(data, IO_CHUNK_SIZE))
+            data = self.decompressor.unconsumed_tail
+
+    def finish(self) -> None:
+        self._push(self.decompressor.flush())
+        self._flush_band()
+        self.output += self.compressor.flush()
+        self._write_output(final=True)
+
+    def _push(self, data: bytes) -> None:
+        self.pending += data
+        line_size = self.stride + 1
+        offset = 0
+        while len(self.pending) - offset >= line_size:
+            self._handle_line(self.pending[offset:offset + line_size])
+            offset += line_size
+        del self.pending[:offset]
+
+    def _handle_line(self, line: bytearray) -> None:
+        if self.row_index < self.row_count:
+            raw = unfilter_row(line[0], line[1:], self.previous, self.bpp)
+            if not self.band:
+                self.band_start = self.row_index
+            self.band.append(bytes(raw))
+            self.previous = raw
+            if len(self.band) == self.band_rows or self.row_index == self.row_count - 1:
+                self._flush_band()
+        elif self.row_index == self.row_count:
+            # This row may be filtered against the previous row, which has been rewritten,
+            # so it is stored unfiltered instead.
+            raw = unfilter_row(line[0], line[1:], self.previous, self.bpp)
+            self._emit(b"\x00" + bytes(raw))
+        else:
+            self._emit(line)
+        self.row_index += 1
+
+    def _flush_band(self) -> None:
+        if not self.band:
+            return
+        band = np.frombuffer(b"".join(self.band), dtype=np.uint8).reshape(len(self.band), self.width, self.bpp).copy()
+        self.rewrite(band, self.band_start)
+        for row in band:
+            self._emit(b"\x00" + row.tobytes())
+        self.band = []
+
+    def _emit(self, line: bytes) -> None:
+        self.output += self.compressor.compress(bytes(line))
+        self._write_output()
+
+    def _write_output(self, final: bool = False) -> None:
+        while len(self.output) >= IO_CHUNK_SIZE or (final and self.output):
+            write_chunk(self.dst, b"IDAT", bytes(self.output[:IO_CHUNK_SIZE]))
+            del self.output[:IO_CHUNK_SIZE]
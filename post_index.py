@@ -0,0 +1,170 @@
+# post_index.py
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Callable, List, NamedTuple, Optional
+
+import lsb_probe
+import mp4_mark
+from media_store import MediaStore
+
+# Read size used when hashing files
+HASH_CHUNK_SIZE = 1 << 20
+# Extensions listed as posts, as in the feed
+POST_EXTENSIONS = ('jpg', 'png', 'mp4')
+
+class Post(NamedTuple):
+    """One row of the post index"""
+    path: str
+    owner: str  # The user whose folder holds the post
+    created: float
+    media_type: str  # "image" or "video"
+    size: int
+    sha256: str
+    # Owner named by the post's copyright mark; "" if it has none, None if not checked yet
+    copyright_owner: Optional[str]
+
+class PostIndex:
+    """SQLite index of the posts under the media folder, ordered by creation time
+
+    The feed pages through the index instead of listing and stat-ing every user folder on each rerun.
+    `add` and `remove` keep it current as posts are saved and deleted; `rebuild` recreates it from disk.
+    Creation times come from `find_created` (e.g. `MediaStore.created`) where it knows the file, and
+    from the file's modification time otherwise.
+    """
+
+    def __init__(self, db_path: str = "posts.db", find_created: Optional[Callable[[str], Optional[float]]] = None):
+        self.db_path = db_path
+        self.find_created = find_created
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS posts '
+                           '(path TEXT PRIMARY KEY, owner TEXT, created REAL, media_type TEXT, size INTEGER, '
+                           'sha256 TEXT, copyright_owner TEXT)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS posts_created ON posts (created DESC)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS posts_owner_created ON posts (owner, created DESC)')
+        self._conn.commit()
+
+    def add(self, path: str, owner: str, copyright_owner: Optional[str] = None) -> Post:
+        """Index a post file, replacing any previous row for its path"""
+        post = _describe(path, owner, copyright_owner, self._created(path))
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO posts VALUES (?, ?, ?, ?, ?, ?, ?)', post)
+            self._conn.commit()
+        return post
+
+    def remove(self, path: str) -> bool:
+        """Drop a post; returns whether it was indexed"""
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM posts WHERE path=?', (path,))
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def set_copyright_owner(self, path: str, copyright_owner: Optional[str]) -> None:
+        """Record the owner found in a post's mark, "" if it has none, or None to check it again"""
+        with self._lock:
+            self._conn.execute('UPDATE posts SET copyright_owner=? WHERE path=?', (copyright_owner, path))
+            self._conn.commit()
+
+    def get(self, path: str) -> Optional[Post]:
+        """Return the row of a post, or None if it is not indexed"""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM posts WHERE path=?', (path,)).fetchone()
+        return Post(*row) if row else None
+
+    def page(self, limit: Optional[int] = None, offset: int = 0, owner: Optional[str] = None) -> List[Post]:
+        """Return posts newest first, optionally of one owner only; no limit returns all of them"""
+        query = 'SELECT * FROM posts'
+        params: list = []
+        if owner is not None:
+            query += ' WHERE owner=?'
+            params.append(owner)
+        query += ' ORDER BY created DESC LIMIT ? OFFSET ?'
+        params += [-1 if limit is None else limit, offset]
+        with self._lock:
+            return [Post(*row) for row in self._conn.execute(query, params)]
+
+    def count(self, owner: Optional[str] = None) -> int:
+        """Return the number of posts, optionally of one owner only"""
+        with self._lock:
+            if owner is None:
+                return self._conn.execute('SELECT COUNT(*) FROM posts').fetchone()[0]
+            return self._conn.execute('SELECT COUNT(*) FROM posts WHERE owner=?', (owner,)).fetchone()[0]
+
+    def rebuild(self, media_root: str = "media",
+                find_copyright_owner: Optional[Callable[[str], Optional[str]]] = None) -> int:
+        """Replace the index with the posts found in the user folders under `media_root`
+
+        Copyright owners are read with `find_copyright_owner`, by default a probe of the image's leading rows
+        or of the video's box headers. Images without an lsb mark may carry one in the server's format,
+        so they are left unchecked (None) for a full decode instead of being recorded as unmarked.
+        Returns the number of posts indexed.
+        """
+        find_copyright_owner = find_copyright_owner or _probe_copyright_owner
+        posts = []
+        if os.path.isdir(media_root):
+            for user_folder in sorted(os.listdir(media_root)):
+                user_path = os.path.join(media_root, user_folder)
+                if user_folder.startswith('.') or not os.path.isdir(user_path):
+                    continue  # Hidden folders hold uploads still being processed
+                for file in sorted(os.listdir(user_path)):
+                    if file.endswith(POST_EXTENSIONS):
+                        file_path = os.path.join(user_path, file)
+                        posts.append(_describe(file_path, user_folder, find_copyright_owner(file_path),
+                                               self._created(file_path)))
+
+        with self._lock:
+            with self._conn:
+                self._conn.execute('DELETE FROM posts')
+                self._conn.executemany('INSERT INTO posts VALUES (?, ?, ?, ?, ?, ?, ?)', posts)
+        return len(posts)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _created(self, path: str) -> Optional[float]:
+        return self.find_created(path) if self.find_created is not None else None
+
+def _describe(path: str, owner: str, copyright_owner: Optional[str], created: Optional[float] = None) -> Post:
+    """Build the row of a post file"""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    media_type = 'video' if path.endswith('mp4') else 'image'
+    if created is None:
+        created = os.path.getmtime(path)  # Not the ctime, which changes whenever the file is linked
+    return Post(path, owner, created, media_type, os.path.getsize(path), sha256.hexdigest(), copyright_owner)
+
+def _probe_copyright_owner(path: str) -> Optional[str]:
+    """Return the owner of a post's mark, "" if it certainly has none, or None if the probe is inconclusive"""
+    if path.endswith('mp4'):
+        return mp4_mark.probe(path).owner or ""  # Videos are only ever marked in their container
+    result = lsb_probe.probe(path)
+    return result.owner if result.marked else None
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the SQLite index of posts")
+    parser.add_argument("command", choices=["rebuild", "stats"])
+    parser.add_argument("--db", default="posts.db", help="Path of the index database")
+    parser.add_argument("--media-root", default="media", help="Folder holding one folder per user")
+    parser.add_argument("--store-db", default="media_store.db",
+                        help="Reference database of the media store, whose creation times are used if it exists")
+    args = parser.parse_args()
+
+    store = MediaStore(args.media_root, args.store_db) if os.path.exists(args.store_db) else None
+    index = PostIndex(args.db, find_created=store.created if store is not None else None)
+    if args.command == "rebuild":
+        print(f"Indexed {index.rebuild(args.media_root)} posts from {args.media_root}")
+    else:
+        marked = sum(1 for post in index.page() if post.copyright_owner)
+        print(f"{index.count()} posts, {marked} with a copyright mark")
+    index.close()
+    if store is not None:
+        store.close()
+
+if __name__ == "__main__":
+    main()
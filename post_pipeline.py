@@ -0,0 +1,120 @@
+# post_pipeline.py
+import argparse
+import datetime
+import hashlib
+import os
+import signal
+import tempfile
+import threading
+from typing import Any, Callable, Dict
+
+import lsb_probe
+import mp4_mark
+from decode_cache import DecodeCache
+from job_queue import Job, JobQueue, QueueFullError, WorkerPool
+from media_store import MediaStore
+from post_index import PostIndex
+from steganography_api import (LocalSteganographyAPI, NoMessageFoundError, SteganographyAPI,
+                               VersionCompatibilityError)
+from stego_engine import SteganographyEngine
+from thumbnails import ThumbnailCache
+
+WATERMARK_JOB = "watermark_post"
+# Store folder holding uploads until a worker has watermarked them
+INCOMING_FOLDER = ".incoming"
+
+def submit_post(queue: JobQueue, store: MediaStore, username: str, file_name: str, data: bytes) -> Job:
+    """Stage an upload and queue it for watermarking; the same upload by the same user is queued only once at a time
+
+    Identical uploads by several users are staged as references to one blob.
+    Raises QueueFullError if the queue is at its depth limit; the upload is then not staged.
+    """
+    key = hashlib.sha256(username.encode() + b"\0" + data).hexdigest()
+    upload_path = store.add(data, INCOMING_FOLDER, key + os.path.splitext(file_name)[1])
+    try:
+        job = queue.enqueue(WATERMARK_JOB, {'username': username, 'file_name': file_name, 'upload_path': upload_path},
+                            key=key)
+    except QueueFullError:
+        store.remove(upload_path)
+        raise
+    return job
+
+def watermark_post(payload: Dict[str, Any], engine: SteganographyEngine, index: PostIndex,
+                   thumbnails: ThumbnailCache, store: MediaStore) -> Dict[str, Any]:
+    """Publish a staged upload, watermarking it unless it already carries a copyright mark
+
+    Uploads already marked by someone are published as they are, credited to the owner of the mark.
+    Returns {"outcome": "owned", "owner": ..., "path": ...} for those,
+    or {"outcome": "posted", "path": ...} with the path of the watermarked post.
+    """
+    username, upload_path = payload['username'], payload['upload_path']
+    with open(upload_path, 'rb') as f:
+        data = f.read()
+
+    # Probe for a local mark first (reads only the leading rows, or the box headers of a video), then fall back to
+    # a full decode. The engine's decode cache is keyed by content, so a reposted image is decoded once
+    try:
+        mark = mp4_mark.probe(data) if mp4_mark.is_mp4(data) else lsb_probe.probe(data)
+        hidden_data = mark.message if mark.marked else engine.decode(data)
+    except (NoMessageFoundError, VersionCompatibilityError):
+        hidden_data = None  # Nothing we can read; the upload is watermarked
+    if hidden_data and hidden_data.startswith("Copyright_"):
+        # Keep the repost with its original mark; the feed credits the owner
+        owner = lsb_probe.parse_owner(hidden_data)
+        post_path = store.add(upload_path, username, payload['file_name'])
+        _publish(index, thumbnails, post_path, username, owner)
+        store.remove(upload_path)
+        return {'outcome': 'owned', 'owner': owner, 'path': post_path}
+
+    current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with tempfile.TemporaryDirectory(dir=store.blob_root) as workdir:
+        # Videos keep their container; images are written as PNG
+        encoded_temp_path = os.path.join(workdir, "encoded.mp4" if mp4_mark.is_mp4(data) else "encoded.png")
+        engine.encode(data, f"Copyright_{username}_{current_time}", encoded_temp_path)
+        encoded_file_path = store.add(encoded_temp_path, username, f"encoded_{payload['file_name']}")
+
+    _publish(index, thumbnails, encoded_file_path, username, username)
+    store.remove(upload_path)
+    return {'outcome': 'posted', 'path': encoded_file_path}
+
+def _publish(index: PostIndex, thumbnails: ThumbnailCache, path: str, username: str, copyright_owner: str) -> None:
+    """Index a stored post and start building its thumbnail and preview"""
+    post = index.add(path, username, copyright_owner=copyright_owner)
+    if post.media_type == 'image':
+        thumbnails.submit(post.path, post.sha256)
+        thumbnails.submit(post.path, post.sha256, thumbnails.preview_size)
+
+def make_handlers(engine: SteganographyEngine, index: PostIndex, thumbnails: ThumbnailCache,
+                  store: MediaStore) -> Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]]:
+    """Return the job handlers of the post pipeline for a WorkerPool"""
+    return {WATERMARK_JOB: lambda payload: watermark_post(payload, engine, index, thumbnails, store)}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run post pipeline workers outside the Streamlit app")
+    parser.add_argument("--workers", type=int, default=2, help="Number of jobs processed at once")
+    parser.add_argument("--api-url", default="http://localhost:8080/api", help="Base URL of the Hide-rs server")
+    parser.add_argument("--jobs-db", default="jobs.db")
+    parser.add_argument("--posts-db", default="posts.db")
+    parser.add_argument("--store-db", default="media_store.db")
+    args = parser.parse_args()
+
+    api = SteganographyAPI(args.api_url, local=LocalSteganographyAPI(), prefix_upload=True)
+    engine = SteganographyEngine.create(api=api, cache=DecodeCache(max_entries=2048, db_path="decode_cache.db"))
+    thumbnails = ThumbnailCache("thumbnails")
+    store = MediaStore("media", args.store_db)
+    handlers = make_handlers(engine, PostIndex(args.posts_db, find_created=store.created), thumbnails, store)
+    pool = WorkerPool(JobQueue(args.jobs_db), handlers, workers=args.workers)
+    pool.start()
+    print(f"{args.workers} workers processing {args.jobs_db} with the {engine.backend_name} backend")
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+    pool.stop()
+    thumbnails.shutdown()
+
+if __name__ == "__main__":
+    main()
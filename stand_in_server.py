@@ -0,0 +1,250 @@
+"""
+This module provides a stand-in for the Hide-rs server, built on `lsb`, for offline testing and load tests.
+
+It serves the endpoints used by `SteganographyAPI` under `/api`: `/health`, `/encode`, `/decode`,
+`/images/<id>` (with HTTP Range support), `/version` (which names the `lsb` mark format) and the
+`/encode/batch` and `/decode/batch` endpoints.
+Failed decodes answer 400 with the messages the client parses. Latency and 503 errors can be injected:
+
+    python stand_in_server.py --port 8080 --latency 0.05 --jitter 0.02 --error-rate 0.01
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import lsb
+
+API_PREFIX = "/api"
+# Encoded images kept for download; the oldest are dropped first.
+MAX_STORED_IMAGES = 1000
+
+
+class ServerConfig:
+    """Behaviour of the stand-in server, adjustable while it runs."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, batch: bool = True,
+                 mark_format: str | None = lsb.MARK_FORMAT, batch_cutoff: int | None = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.batch = batch
+        # Drop the connection after this many lines of a batch response, like a server that fails mid-stream
+        self.batch_cutoff = batch_cutoff
+        # Advertised by /version; None acts like a server that does not name its mark format
+        self.mark_format = mark_format
+
+
+class StandInServer(ThreadingHTTPServer):
+    """A threaded HTTP server holding the configuration and the encoded images."""
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], config: ServerConfig | None = None):
+        super().__init__(address, _Handler)
+        self.config = config or ServerConfig()
+        self.images: OrderedDict[str, bytes] = OrderedDict()
+        self.images_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def store_image(self, data: bytes) -> str:
+        image_id = uuid.uuid4().hex
+        with self.images_lock:
+            self.images[image_id] = data
+            while len(self.images) > MAX_STORED_IMAGES:
+                self.images.popitem(last=False)
+        return image_id
+
+    def start(self) -> threading.Thread:
+        """Serve on a daemon thread and return it."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def parse_multipart(content_type: str, body: bytes) -> list[tuple[str, str | None, bytes]]:
+    """
+    Split a multipart/form-data body into its parts.
+
+    Args:
+    content_type (str): The Content-Type header, including the boundary.
+    body (bytes): The request body.
+
+    Returns:
+    list[tuple[str, str | None, bytes]]: The field name, file name and contents of every part, in order.
+    """
+    message = BytesParser().parsebytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+    if not message.is_multipart():
+        return []
+    return [
+        (part.get_param("name", header="content-disposition"), part.get_filename(), part.get_payload(decode=True))
+        for part in message.get_payload()
+    ]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: StandInServer
+
+    def log_message(self, format: str, *args) -> None:
+        pass  # Keep load tests quiet
+
+    def do_GET(self) -> None:
+        if not self._begin():
+            return
+        path = self.path[len(API_PREFIX):]
+        if path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif path == "/version":
+            version = {
+                "status": "success",
+                "version": lsb.DENSE_FORMAT_VERSION,
+                "supported_versions": [lsb.FORMAT_VERSION, lsb.DENSE_FORMAT_VERSION],
+            }
+            if self.server.config.mark_format is not None:
+                version["mark_format"] = self.server.config.mark_format
+            self._send_json(200, version)
+        elif path.startswith("/images/"):
+            self._send_image(path[len("/images/"):])
+        else:
+            self._send_json(404, {"status": "error", "message": "Not found"})
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self._begin():
+            return
+        path = self.path[len(API_PREFIX):]
+        parts = parse_multipart(self.headers.get("Content-Type", ""), body)
+        fields = {name: data for name, _, data in parts}
+
+        if path == "/encode":
+            status, result = self._encode(fields.get("cover_image"), fields.get("message", b"").decode())
+            self._send_json(status, result)
+        elif path == "/decode":
+            status, result = self._decode(fields.get("stego_image"))
+            self._send_json(status, result)
+        elif path in ("/encode/batch", "/decode/batch") and self.server.config.batch:
+            self._send_batch(path, parts)
+        else:
+            self._send_json(404, {"status": "error", "message": "Not found"})
+
+    def _begin(self) -> bool:
+        """Apply the injected latency; answer 503 and return False for an injected error."""
+        config = self.server.config
+        delay = config.latency + random.uniform(-config.jitter, config.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if config.error_rate and random.random() < config.error_rate:
+            self._send_json(503, {"status": "error", "message": "Injected failure"})
+            return False
+        return True
+
+    def _encode(self, image: bytes | None, message: str) -> tuple[int, dict]:
+        if not image or not message:
+            return 400, {"status": "error", "message": "Missing cover_image or message"}
+        try:
+            encoded = lsb.encode_bytes(image, message)
+        except (ValueError, OSError) as e:
+            return 400, {"status": "error", "message": f"Failed to encode: {e}"}
+        return 200, {"status": "success", "image_id": self.server.store_image(encoded), "message": "Encoded"}
+
+    def _decode(self, image: bytes | None) -> tuple[int, dict]:
+        if not image:
+            return 400, {"status": "error", "message": "Missing stego_image"}
+        try:
+            return 200, {"status": "success", "message": lsb.decode_bytes(image)}
+        except ValueError as e:
+            # Carries "No message found ..." or "Unsupported message format version: N"
+            return 400, {"status": "error", "message": str(e)}
+        except OSError as e:
+            return 400, {"status": "error", "message": f"Failed to decode: {e}"}
+
+    def _send_batch(self, path: str, parts: list[tuple[str, str | None, bytes]]) -> None:
+        """Answer a batch with one JSON line per image, written as each image is processed."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        if path == "/decode/batch":
+            images = [data for name, _, data in parts if name == "stego_images"]
+            results = (self._decode(image)[1] for image in images)
+        else:
+            images = [data for name, _, data in parts if name == "cover_images"]
+            messages = [data.decode() for name, _, data in parts if name == "messages"]
+            if len(messages) == 1:
+                messages *= len(images)
+            results = (self._encode(image, message)[1] for image, message in zip(images, messages))
+
+        for index, result in enumerate(results):
+            if index == self.server.config.batch_cutoff:
+                self.close_connection = True
+                return
+            line = json.dumps({"index": index, **result}).encode() + b"\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send_image(self, image_id: str) -> None:
+        with self.server.images_lock:
+            data = self.server.images.get(image_id)
+        if data is None:
+            self._send_json(404, {"status": "error", "message": "Image not found"})
+            return
+
+        start = 0
+        range_match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if range_match and int(range_match.group(1)) < len(data):
+            start = int(range_match.group(1))
+        self.send_response(206 if start else 200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Accept-Ranges", "bytes")
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        self.send_header("Content-Length", str(len(data) - start))
+        self.end_headers()
+        self.wfile.write(data[start:])
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stand-in Hide-rs server built on lsb")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- variation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--no-batch", action="store_true", help="Answer the batch endpoints with 404")
+    args = parser.parse_args()
+
+    config = ServerConfig(args.latency, args.jitter, args.error_rate, batch=not args.no_batch)
+    server = StandInServer((args.host, args.port), config)
+    print(f"Serving the stand-in Hide-rs API at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
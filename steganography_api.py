@@ -2,7 +2,41 @@
 import requests
 import os
 import json
-from typing import Optional, Dict, Any, Tuple
+import random
+import time
+import asyncio
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from io import BytesIO
+from typing import (Optional, Dict, Any, Tuple, Union, BinaryIO, Iterable, Iterator, AsyncIterator, NamedTuple,
+                    Callable, List)
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse
+import lsb
+import lsb_probe
+from api_metrics import CallRecord, outcome_class
+from circuit_breaker import CircuitBreaker, LatencyStats
+from decode_cache import DecodeCache
+
+# (connect, read) timeouts in seconds applied to every request
+DEFAULT_TIMEOUT = (3.05, 30)
+# Retries of idempotent calls after connection errors, timeouts and these gateway statuses
+DEFAULT_RETRIES = 3
+RETRY_STATUSES = (502, 503, 504)
+# Base and cap of the exponential backoff; each delay is drawn uniformly from [0, base * 2**attempt]
+BACKOFF_BASE = 0.2
+BACKOFF_MAX = 5.0
+# Chunk size used when streaming encoded images from the server
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+# Statuses meaning the server has no batch endpoint, so batches fall back to single requests
+BATCH_UNSUPPORTED_STATUSES = (404, 405, 501)
+# Seconds before a failed lookup of the server's mark format is tried again
+MARK_FORMAT_RETRY = 30.0
 
 class SteganographyError(Exception):
     """Base exception for steganography errors"""
@@ -15,101 +49,862 @@ class VersionCompatibilityError(SteganographyError):
         super().__init__(message)
 
 class NoMessageFoundError(SteganographyError):
-    """Exception raised when no hidden message is found in the image"""
-    pass
+    """Exception raised when no hidden message is found in the image
+
+    `authoritative` is False when the answer came from a backend that may not read every mark format,
+    so the image may still carry a mark and the result must not be cached.
+    """
+    def __init__(self, message: str, authoritative: bool = True):
+        self.authoritative = authoritative
+        super().__init__(message)
+
+class DecodeResult(NamedTuple):
+    """The outcome of decoding one image in a batch: the message, or the exception raised for it"""
+    path: str
+    message: Optional[str] = None
+    error: Optional[Exception] = None
+
+class EncodeResult(NamedTuple):
+    """The outcome of encoding one image in a batch: the API result with the image ID, or the exception raised for it"""
+    path: str
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[Exception] = None
+
+# A batch item: an image path, or a (name, image data) pair
+BatchImage = Union[str, Tuple[str, bytes]]
 
 class SteganographyAPI:
     """Client for the Hide-rs Steganography API"""
     
-    def __init__(self, base_url: str = "http://localhost:8080/api"):
+    def __init__(self, base_url: str = "http://localhost:8080/api", cache: Optional[DecodeCache] = None,
+                 pool_size: int = 10, timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES, local: Optional["LocalSteganographyAPI"] = None,
+                 breaker: Optional[CircuitBreaker] = None, offline: bool = False, prefix_upload: bool = False):
         self.base_url = base_url
-        
+        self.cache = cache  # Optional cache of decode results keyed by image content
+        self.timeout = timeout
+        self.retries = retries
+        self.pool_size = pool_size
+        self.batch_supported = True  # Cleared once the server turns out to lack the batch endpoints
+        # Decodes upload only the leading rows holding the mark, retrying with the full image if inconclusive.
+        # Strips are cut by the lsb format, so they are only sent to servers whose /version names it
+        self.prefix_upload = prefix_upload
+        self._mark_format: Optional[str] = None  # The server's mark format, looked up on first use
+        self._mark_format_retry_at = 0.0  # Until then a failed lookup is not repeated
+
+        # Calls fall back to the in-process backend while the circuit is open, or always when offline
+        self.offline = offline
+        self.local = local if local is not None or not offline else LocalSteganographyAPI()
+        self.breaker = breaker or CircuitBreaker()
+        self._stats = {'remote': LatencyStats(), 'local': LatencyStats()}
+
+        # Instrumentation: sinks receive a CallRecord per HTTP attempt; traces collect them per thread
+        self._sinks: List[Callable[[CallRecord], None]] = []
+        self._traces = threading.local()
+
+        # Keep-alive connections are reused across calls instead of opening one per request
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self) -> None:
+        """Close the pooled connections"""
+        self.session.close()
+
+    def __enter__(self) -> "SteganographyAPI":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def active_backend(self) -> str:
+        """The backend that serves calls right now: 'remote' or 'local'"""
+        if self.local is not None and (self.offline or self.breaker.state == CircuitBreaker.OPEN):
+            return 'local'
+        return 'remote'
+
+    def latency_stats(self) -> Dict[str, Dict[str, float]]:
+        """Return call counts and latency percentiles per backend, and the circuit state"""
+        stats = {name: backend_stats.snapshot() for name, backend_stats in self._stats.items()}
+        stats['circuit'] = {'state': self.breaker.state, 'active_backend': self.active_backend}
+        return stats
+
+    def add_sink(self, sink: Callable[[CallRecord], None]) -> None:
+        """Send a CallRecord for every HTTP attempt to `sink` (see api_metrics for ready-made sinks)"""
+        self._sinks = self._sinks + [sink]
+
+    def remove_sink(self, sink: Callable[[CallRecord], None]) -> None:
+        self._sinks = [s for s in self._sinks if s is not sink]
+
+    @contextmanager
+    def trace(self) -> Iterator[List[CallRecord]]:
+        """Collect the records of the calls made by the current thread, e.g. while rendering one page"""
+        stack = getattr(self._traces, 'stack', None)
+        if stack is None:
+            stack = self._traces.stack = []
+        records: List[CallRecord] = []
+        stack.append(records)
+        try:
+            yield records
+        finally:
+            stack.remove(records)
+
     def health_check(self) -> Dict[str, Any]:
         """Check if the API server is running"""
-        response = requests.get(f"{self.base_url}/health")
-        response.raise_for_status()
-        return response.json()
+        return self._route(lambda: self._get_json("/health"), lambda: self.local.health_check())
     
     def encode(self, image_path: str, message: str, output_format: str = "png") -> Dict[str, Any]:
         """Encode a message into an image using the API"""
         with open(image_path, 'rb') as img_file:
-            files = {'cover_image': (os.path.basename(image_path), img_file, 'image/png')}
-            data = {
-                'message': message,
-                'output_format': output_format
-            }
-            
-            response = requests.post(f"{self.base_url}/encode", files=files, data=data)
-            response.raise_for_status()
-            return response.json()
+            return self.encode_bytes(img_file, message, os.path.basename(image_path), output_format)
+
+    def encode_bytes(self, image_data: Union[bytes, BinaryIO], message: str, filename: str = "image.png",
+                     output_format: str = "png") -> Dict[str, Any]:
+        """Encode a message into an in-memory image (bytes or binary file object) using the API"""
+        rewind = _rewinder(image_data)
+
+        def encode_locally() -> Dict[str, Any]:
+            rewind()
+            return self.local.encode_bytes(image_data, message, output_format)
+
+        return self._route(lambda: self._remote_encode(image_data, message, filename, output_format), encode_locally)
+
+    def _remote_encode(self, image_data: Union[bytes, BinaryIO], message: str, filename: str,
+                       output_format: str) -> Dict[str, Any]:
+        files = {'cover_image': (filename, image_data, 'image/png')}
+        data = {
+            'message': message,
+            'output_format': output_format
+        }
+
+        response = self._request("POST", "/encode", files=files, data=data)
+        response.raise_for_status()
+        return response.json()
+
+    def encode_to_file(self, image: Union[str, bytes, BinaryIO], message: str, output_path: str,
+                       output_format: str = "png", chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> Dict[str, Any]:
+        """Encode a message into an image (path, bytes or binary file object) and download the result to a file"""
+        result = self._encode_checked(image, message, output_format)
+        self.download_image(result['image_id'], output_path, chunk_size)
+        return result
+
+    def encode_to_bytes(self, image: Union[str, bytes, BinaryIO], message: str, output_format: str = "png",
+                        chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> bytes:
+        """Encode a message into an image (path, bytes or binary file object) and return the encoded image"""
+        result = self._encode_checked(image, message, output_format)
+        buffer = BytesIO()
+        self._download(result['image_id'], buffer, chunk_size)
+        return buffer.getvalue()
+
+    def _encode_checked(self, image: Union[str, bytes, BinaryIO], message: str, output_format: str) -> Dict[str, Any]:
+        if isinstance(image, str):
+            result = self.encode(image, message, output_format)
+        else:
+            result = self.encode_bytes(image, message, output_format=output_format)
+        if result.get('status') != 'success':
+            raise SteganographyError(f"API Error: {result.get('message', 'Unknown error')}")
+        return result
     
     def decode(self, image_path: str) -> str:
         """Decode a message from an image using the API"""
+        if self.cache is not None:
+            digest = self.cache.digest_for_path(image_path)
+            return self._decode_cached(digest, lambda: self._read_file(image_path), os.path.basename(image_path))
+
         with open(image_path, 'rb') as img_file:
-            files = {'stego_image': (os.path.basename(image_path), img_file, 'image/png')}
-            
-            response = requests.post(f"{self.base_url}/decode", files=files)
-            
-            # Handle HTTP errors
+            return self.decode_bytes(img_file, os.path.basename(image_path))
+
+    def decode_bytes(self, image_data: Union[bytes, BinaryIO], filename: str = "image.png") -> str:
+        """Decode a message from an in-memory image (bytes or binary file object) using the API"""
+        if self.cache is not None:
+            if not isinstance(image_data, (bytes, bytearray)):
+                image_data = image_data.read()
+            return self._decode_cached(DecodeCache.digest(image_data), lambda: image_data, filename)
+
+        return self._decode_uncached(image_data, filename)[0]
+
+    def invalidate_cache(self, key: str) -> bool:
+        """Drop the cached decode result for a file path or content digest"""
+        return self.cache.invalidate(key) if self.cache is not None else False
+
+    def _decode_cached(self, digest: str, read_data, filename: str) -> str:
+        """Serve a decode from the cache, calling the API on a miss; 'no message' results are cached too
+
+        Results of the local fallback are not cached: it cannot read the server's marks, so a later call may
+        find a message the fallback missed.
+        """
+        found, message = self.cache.get(digest)
+        if not found:
+            try:
+                message, cacheable = self._decode_uncached(read_data(), filename)
+            except NoMessageFoundError as e:
+                if not e.authoritative:
+                    raise
+                message, cacheable = None, True
+            if cacheable:
+                self.cache.put(digest, message)
+
+        if message is None:
+            raise NoMessageFoundError("No hidden message was found in this image")
+        return message
+
+    @staticmethod
+    def _read_file(path: str) -> bytes:
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _decode_uncached(self, image_data: Union[bytes, BinaryIO], filename: str) -> Tuple[str, bool]:
+        """Decode an image; returns the message and whether it may be cached"""
+        if self.prefix_upload and self._server_reads_strips():
+            strip = self._prefix_strip(image_data)
+            if strip is not None:
+                try:
+                    return self._decode_uploaded(strip, os.path.splitext(filename)[0] + ".png")
+                except VersionCompatibilityError:
+                    raise
+                except NoMessageFoundError:
+                    if lsb_probe.covers_message(strip):
+                        raise
+                except SteganographyError:
+                    pass  # Inconclusive; the message may extend past the strip
+
+        return self._decode_uploaded(image_data, filename)
+
+    def _server_reads_strips(self) -> bool:
+        """Whether the server serves calls and marks images in the lsb format, so a prefix strip decodes like the image"""
+        if self.active_backend == 'local':
+            return False
+        if self._mark_format is None:
+            # While the server is down or failed the last lookup, upload the full image without asking again
+            if self.breaker.state == CircuitBreaker.OPEN or time.monotonic() < self._mark_format_retry_at:
+                return False
             try:
+                response = self._request("GET", "/version")
                 response.raise_for_status()
-            except requests.exceptions.HTTPError as e:
-                if response.status_code == 400:
-                    # Try to parse the error message
-                    try:
-                        error_data = response.json()
-                        error_msg = error_data.get('message', '')
-                        
-                        # Check for version compatibility error
-                        if "Unsupported message format version" in error_msg:
-                            import re
-                            version_match = re.search(r'version: (\d+)', error_msg)
-                            version = int(version_match.group(1)) if version_match else None
-                            raise VersionCompatibilityError(
-                                f"The image uses an unsupported message format version: {version}",
-                                version
-                            )
-                        # Check for no message found error
-                        elif "No message found" in error_msg or "not contain" in error_msg:
-                            raise NoMessageFoundError("No hidden message was found in this image")
-                    except (ValueError, AttributeError, json.JSONDecodeError):
-                        pass
-                raise
-            
-            # Process successful response
-            result = response.json()
+                self._mark_format = response.json().get('mark_format', '')
+            except (requests.exceptions.RequestException, ValueError):
+                self._mark_format_retry_at = time.monotonic() + MARK_FORMAT_RETRY
+                return False
+        return self._mark_format == lsb.MARK_FORMAT
+
+    @staticmethod
+    def _prefix_strip(image_data: Union[bytes, BinaryIO]) -> Optional[bytes]:
+        """Return the leading rows of the image as PNG, or None if the full image must be uploaded"""
+        rewind = _rewinder(image_data)
+        try:
+            return lsb_probe.prefix_png(image_data)
+        except (OSError, ValueError):
+            return None  # Not an image Pillow can read; let the server decide
+        finally:
+            rewind()
+
+    def _decode_uploaded(self, image_data: Union[bytes, BinaryIO], filename: str) -> Tuple[str, bool]:
+        rewind = _rewinder(image_data)
+        fallback = False
+
+        def decode_locally() -> str:
+            nonlocal fallback
+            fallback = not self.offline
+            rewind()
+            try:
+                return self.local.decode_bytes(image_data)
+            except NoMessageFoundError as e:
+                if not fallback:
+                    raise
+                # The image may carry a mark in the server's format
+                raise NoMessageFoundError(str(e), authoritative=False) from e
+
+        message = self._route(lambda: self._remote_decode(image_data, filename), decode_locally)
+        return message, not fallback
+
+    def _remote_decode(self, image_data: Union[bytes, BinaryIO], filename: str) -> str:
+        files = {'stego_image': (filename, image_data, 'image/png')}
+        
+        # Decoding has no side effects on the server, so it is retried like a GET
+        response = self._request("POST", "/decode", idempotent=True, files=files)
+        
+        # Handle HTTP errors
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            if response.status_code == 400:
+                # The message says whether the image holds no message or an unsupported format version
+                try:
+                    error = _error_from_message(response.json().get('message', ''))
+                except (ValueError, AttributeError):
+                    error = None
+                if isinstance(error, (VersionCompatibilityError, NoMessageFoundError)):
+                    raise error from e
+            raise
+        
+        # Process successful response
+        result = response.json()
+        
+        if result['status'] == 'success':
+            return result.get('message', '')
+        else:
+            # Check for specific error types in API response
+            error_msg = result.get('message', '')
             
-            if result['status'] == 'success':
-                return result.get('message', '')
+            raise _error_from_message(error_msg)
+
+    def decode_batch(self, images: Iterable[BatchImage]) -> Iterator[DecodeResult]:
+        """Decode many images, yielding a DecodeResult per image as results arrive
+
+        All images are sent in one multipart request to /decode/batch (repeated `stego_images` parts), and the
+        server streams back one JSON line per image: {"index", "status", "message"}. Without a batch endpoint,
+        or while the local backend serves calls, the images are decoded with concurrent single requests instead;
+        so are the images left unanswered when a batch response breaks off.
+        A failing image never ends the batch; its exception is reported in its result.
+        """
+        pending = []
+        for image in images:
+            name, data = _batch_item(image)
+            digest = None
+            if self.cache is not None:
+                digest = self.cache.digest_for_path(image) if isinstance(image, str) else DecodeCache.digest(data)
+                found, message = self.cache.get(digest)
+                if found:
+                    yield _decode_result(name, message)
+                    continue
+            pending.append((name, data, digest))
+
+        for index, message, error, cacheable in self._decode_pending(pending):
+            name, _, digest = pending[index]
+            if digest is not None and cacheable and (error is None or isinstance(error, NoMessageFoundError)):
+                self.cache.put(digest, message)
+            yield DecodeResult(name, message, error)
+
+    def _decode_pending(self, pending: List[Tuple[str, Any, Optional[str]]]) -> Iterator[Tuple[int, Optional[str], Optional[Exception], bool]]:
+        """Decode the images missing from the cache, yielding (index, message, error, cacheable) as results arrive"""
+        if not pending:
+            return
+
+        def decode_one(index: int) -> Tuple[int, Optional[str], Optional[Exception], bool]:
+            name, data, _ = pending[index]
+            try:
+                message, cacheable = self._decode_uncached(_read_data(data), os.path.basename(name))
+            except NoMessageFoundError as e:
+                return index, None, e, e.authoritative
+            except Exception as e:
+                return index, None, e, False
+            return index, message, None, cacheable
+
+        unanswered = set(range(len(pending)))
+        files = [('stego_images', (os.path.basename(name), _read_data(data), 'image/png')) for name, data, _ in pending]
+        lines = self._batch_request("/decode/batch", files)
+        for index, item in lines or ():
+            if index not in unanswered:
+                continue
+            unanswered.discard(index)
+            if item.get('status') == 'success':
+                yield index, item.get('message', ''), None, True
+            else:
+                yield index, None, _error_from_message(item.get('message', '')), True
+        yield from self._pipelined(decode_one, sorted(unanswered))
+
+    def encode_batch(self, images: Iterable[BatchImage], messages: Union[str, Iterable[str]],
+                     output_format: str = "png") -> Iterator[EncodeResult]:
+        """Encode a message into each of many images, yielding an EncodeResult per image as results arrive
+
+        `messages` is one message for all images or one per image. The batch is sent as one multipart request
+        to /encode/batch (repeated `cover_images` and `messages` parts), answered with one JSON line per image:
+        {"index", "status", "image_id", "message"}. Without a batch endpoint, or while the local backend
+        serves calls, the images are encoded with concurrent single requests instead; so are the images left
+        unanswered when a batch response breaks off.
+        """
+        items = [_batch_item(image) for image in images]
+        messages = [messages] * len(items) if isinstance(messages, str) else list(messages)
+        if len(messages) != len(items):
+            raise ValueError("Provide one message, or one message per image")
+        if not items:
+            return
+
+        def encode_one(index: int) -> EncodeResult:
+            name, data = items[index]
+            try:
+                result = self.encode_bytes(_read_data(data), messages[index], os.path.basename(name), output_format)
+            except Exception as e:
+                return EncodeResult(name, error=e)
+            if result.get('status') != 'success':
+                return EncodeResult(name, error=SteganographyError(f"API Error: {result.get('message', 'Unknown error')}"))
+            return EncodeResult(name, result=result)
+
+        unanswered = set(range(len(items)))
+        files = [('cover_images', (os.path.basename(name), _read_data(data), 'image/png')) for name, data in items]
+        lines = self._batch_request("/encode/batch", files,
+                                    data={'messages': messages, 'output_format': output_format})
+        for index, item in lines or ():
+            if index not in unanswered:
+                continue
+            unanswered.discard(index)
+            if item.get('status') == 'success':
+                yield EncodeResult(items[index][0], result=item)
             else:
-                # Check for specific error types in API response
-                error_msg = result.get('message', '')
-                
-                if "Unsupported message format version" in error_msg:
-                    import re
-                    version_match = re.search(r'version: (\d+)', error_msg)
-                    version = int(version_match.group(1)) if version_match else None
-                    raise VersionCompatibilityError(
-                        f"The image uses an unsupported message format version: {version}",
-                        version
-                    )
-                elif "No message found" in error_msg or "not contain" in error_msg or "Failed to decode" in error_msg:
-                    raise NoMessageFoundError("No hidden message was found in this image")
-                
-                # Generic error
-                raise SteganographyError(f"API Error: {error_msg}")
+                yield EncodeResult(items[index][0], error=SteganographyError(f"API Error: {item.get('message', '')}"))
+        yield from self._pipelined(encode_one, sorted(unanswered))
+
+    def _batch_request(self, path: str, files: list, data: Optional[Dict[str, Any]] = None) -> Optional[Iterator[Tuple[int, Dict[str, Any]]]]:
+        """Send a batch request; returns its (index, result) lines, or None if the batch must be sent as single requests"""
+        if not self.batch_supported or (self.local is not None and (self.offline or not self.breaker.allow_request())):
+            return None
+        # Every exit settles the call, so a half-open circuit never waits on a trial that was not reported
+        healthy, latency = False, 0.0
+        try:
+            try:
+                response, attempt, start = self._send("POST", path, files=files, data=data, stream=True)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                return None
+            latency = response.elapsed.total_seconds()
+            if response.status_code in BATCH_UNSUPPORTED_STATUSES or response.status_code == 413:
+                # The server answered: it has no batch endpoint, or the batch is too large for one request.
+                # Single requests still work
+                healthy = True
+                if response.status_code != 413:
+                    self.batch_supported = False
+                response.close()
+                return None
+            if response.status_code >= 400:
+                # A 5xx is a failing server; any other rejection of the batch is an answer, and the images
+                # are sent as single requests, which report their own errors
+                healthy = response.status_code < 500
+                response.close()
+                return None
+            healthy = True
+            return self._batch_lines(response, attempt, start)
+        finally:
+            if healthy:
+                self.breaker.record_success(latency)
+            else:
+                self.breaker.record_failure()
+
+    def _batch_lines(self, response: requests.Response, attempt: int, start: float) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Yield the (index, result) lines of a batch response; stops early if the response breaks off"""
+        received = 0
+        error = None
+        with response:
+            try:
+                for line in response.iter_lines():
+                    received += len(line) + 1
+                    if line.strip():
+                        item = json.loads(line)
+                        yield int(item['index']), item
+            except (ValueError, KeyError, TypeError, requests.exceptions.RequestException) as e:
+                # The callers send the images without a result as single requests
+                error = e
+                if _is_server_failure(e):
+                    self.breaker.record_failure()
+        self._record(response.request, attempt, start, response, received, error=error)
+
+    def _pipelined(self, function, indices: Iterable[int]) -> Iterator:
+        """Run single requests concurrently on the connection pool, yielding results as they complete"""
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            for future in as_completed([executor.submit(function, index) for index in indices]):
+                yield future.result()
     
-    def download_image(self, image_id: str, output_path: str) -> None:
-        """Download an encoded image by its ID"""
-        response = requests.get(f"{self.base_url}/images/{image_id}", stream=True)
-        response.raise_for_status()
-        
-        with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-                
+    def download_image(self, image_id: str, output_path: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> None:
+        """Download an encoded image by its ID
+
+        The image is written to a temporary file next to `output_path` and renamed into place once complete,
+        so readers never see a partial file.
+        """
+        directory = os.path.dirname(os.path.abspath(output_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".download-", suffix=".part")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                self._download(image_id, f, chunk_size)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, output_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _download(self, image_id: str, f: BinaryIO, chunk_size: int) -> None:
+        """Stream an image into a file object, resuming with a Range request after an interrupted transfer"""
+        if self.local is not None and self.local.has_image(image_id):
+            self.local.download_image(image_id, f)
+            return
+
+        written = 0
+        for resume in range(self.retries + 1):
+            headers = {'Range': f'bytes={written}-'} if written else {}
+            try:
+                response, attempt, start = self._send("GET", f"/images/{image_id}", idempotent=True, stream=True,
+                                                      headers=headers)
+                response.raise_for_status()
+                received = 0
+                with response:
+                    if written and response.status_code != 206:
+                        # The server ignored the range and sent the whole image again
+                        f.seek(0)
+                        f.truncate()
+                        written = 0
+                    try:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            f.write(chunk)
+                            written += len(chunk)
+                            received += len(chunk)
+                    except requests.exceptions.RequestException as e:
+                        self._record(response.request, attempt, start, response, received, error=e)
+                        raise
+                self._record(response.request, attempt, start, response, received)
+                return
+            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.Timeout):
+                if resume == self.retries:
+                    raise
+                time.sleep(_backoff(resume))
+
     def check_version_compatibility(self) -> Dict[str, Any]:
         """Check version compatibility with the server"""
-        response = requests.get(f"{self.base_url}/version")
+        return self._route(lambda: self._get_json("/version"), lambda: self.local.check_version_compatibility())
+
+    def _get_json(self, path: str) -> Dict[str, Any]:
+        response = self._request("GET", path, idempotent=True)
         response.raise_for_status()
-        return response.json()
\ No newline at end of file
+        return response.json()
+
+    def _route(self, remote_call, local_call):
+        """Run a call on the server, or on the local backend when offline or while the circuit is open"""
+        if self.local is not None and (self.offline or not self.breaker.allow_request()):
+            return self._timed('local', local_call)
+
+        start = time.perf_counter()
+        try:
+            result = remote_call()
+        except Exception as e:
+            latency = time.perf_counter() - start
+            if not _is_server_failure(e):
+                # The server answered; errors such as "no message found" say nothing about its health
+                self.breaker.record_success(latency)
+                self._stats['remote'].record(latency)
+                raise
+            self.breaker.record_failure()
+            self._stats['remote'].record(latency, failed=True)
+            if self.local is None:
+                raise
+            return self._timed('local', local_call)
+
+        latency = time.perf_counter() - start
+        self.breaker.record_success(latency)
+        self._stats['remote'].record(latency)
+        return result
+
+    def _timed(self, backend: str, call):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = call()
+            failed = False
+            return result
+        except SteganographyError:
+            failed = False
+            raise
+        finally:
+            self._stats[backend].record(time.perf_counter() - start, failed)
+
+    def _request(self, method: str, path: str, idempotent: bool = False, **kwargs) -> requests.Response:
+        """Send a request on the pooled session; idempotent calls are retried with jittered backoff"""
+        return self._send(method, path, idempotent, **kwargs)[0]
+
+    def _send(self, method: str, path: str, idempotent: bool = False,
+              **kwargs) -> Tuple[requests.Response, int, float]:
+        """Send a request like `_request`; also returns the attempt number and start time of the response
+
+        Streamed bodies are recorded by the caller once they have been read, which needs both values.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        attempts = self.retries + 1 if idempotent else 1
+        # Uploaded file objects are rewound before every retry
+        files = kwargs.get('files') or {}
+        parts = files.values() if isinstance(files, dict) else [part for _, part in files]
+        uploads = [(part[1], part[1].tell()) for part in parts if hasattr(part[1], 'seek')]
+
+        for attempt in range(attempts):
+            for upload, position in uploads:
+                upload.seek(position)
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._record(e.request, attempt, start, error=e, method=method, path=path)
+                if attempt == attempts - 1:
+                    raise
+            else:
+                retry = response.status_code in RETRY_STATUSES and attempt < attempts - 1
+                if not kwargs.get('stream'):
+                    self._record(response.request, attempt, start, response, len(response.content))
+                elif retry or not response.ok:
+                    self._record(response.request, attempt, start, response)
+                if not retry:
+                    return response, attempt, start
+                response.close()
+            time.sleep(_backoff(attempt))
+
+    def _record(self, request: Optional[requests.PreparedRequest], attempt: int, start: float,
+                response: Optional[requests.Response] = None, response_bytes: int = 0,
+                error: Optional[Exception] = None, method: str = "", path: str = "") -> None:
+        """Build a CallRecord and hand it to the sinks and active traces; free when nothing listens"""
+        traces = getattr(self._traces, 'stack', None)
+        if not self._sinks and not traces:
+            return
+
+        total = time.perf_counter() - start
+        if request is not None:
+            method = request.method
+            path = urlparse(request.url).path[len(urlparse(self.base_url).path):]
+        body = request.body if request is not None else None
+        status = response.status_code if response is not None else None
+        record = CallRecord(
+            # Image IDs are dropped so downloads share one series
+            endpoint="/images" if path.startswith("/images/") else path,
+            method=method,
+            outcome=outcome_class(status, error),
+            status=status,
+            request_bytes=len(body) if isinstance(body, (bytes, str)) else 0,
+            response_bytes=response_bytes,
+            ttfb=response.elapsed.total_seconds() if response is not None else total,
+            total=total,
+            attempt=attempt,
+            timestamp=time.time(),
+        )
+        for sink in self._sinks:
+            try:
+                sink(record)
+            except Exception:
+                pass  # A failing sink must not fail the call
+        for records in traces or ():
+            records.append(record)
+
+
+class LocalSteganographyAPI:
+    """In-process stand-in for the Hide-rs API built on `lsb`
+
+    Encoded images are kept in `image_dir` until they are downloaded; their IDs start with 'local-'.
+    """
+
+    def __init__(self, image_dir: Optional[str] = None):
+        self.image_dir = image_dir or tempfile.mkdtemp(prefix="hide-local-")
+        os.makedirs(self.image_dir, exist_ok=True)
+
+    def health_check(self) -> Dict[str, Any]:
+        return {'status': 'ok', 'backend': 'local'}
+
+    def encode_bytes(self, image_data: Union[bytes, BinaryIO], message: str,
+                     output_format: str = "png") -> Dict[str, Any]:
+        if output_format.lower() != "png":
+            raise SteganographyError(f"The local backend cannot write {output_format} images")
+        try:
+            encoded = lsb.encode_bytes(image_data, message)
+        except ValueError as e:
+            raise error_from_lsb(e) from e
+        except OSError as e:
+            raise SteganographyError(f"Invalid image: {e}") from e
+
+        image_id = f"local-{uuid.uuid4().hex}"
+        with open(self._image_path(image_id), 'wb') as f:
+            f.write(encoded)
+        return {'status': 'success', 'image_id': image_id, 'message': 'Message encoded locally'}
+
+    def decode_bytes(self, image_data: Union[bytes, BinaryIO]) -> str:
+        try:
+            return lsb.decode_file(image_data)
+        except ValueError as e:
+            raise error_from_lsb(e) from e
+        except OSError as e:
+            raise SteganographyError(f"Invalid image: {e}") from e
+
+    def has_image(self, image_id: str) -> bool:
+        return image_id.startswith("local-") and os.path.exists(self._image_path(image_id))
+
+    def download_image(self, image_id: str, f: BinaryIO) -> None:
+        """Copy an encoded image into a file object and drop it from the store"""
+        path = self._image_path(image_id)
+        with open(path, 'rb') as image_file:
+            shutil.copyfileobj(image_file, f, DOWNLOAD_CHUNK_SIZE)
+        os.remove(path)
+
+    def check_version_compatibility(self) -> Dict[str, Any]:
+        return {
+            'status': 'success',
+            'backend': 'local',
+            'version': lsb.DENSE_FORMAT_VERSION,
+            'supported_versions': [lsb.FORMAT_VERSION, lsb.DENSE_FORMAT_VERSION],
+            'mark_format': lsb.MARK_FORMAT,
+        }
+
+    def _image_path(self, image_id: str) -> str:
+        return os.path.join(self.image_dir, f"{os.path.basename(image_id)}.png")
+
+def error_from_lsb(error: ValueError) -> SteganographyError:
+    """Map an `lsb` error to the matching steganography exception"""
+    message = str(error)
+    if "No message found" in message:
+        return NoMessageFoundError("No hidden message was found in this image")
+    if "Unsupported message format version" in message:
+        version_match = re.search(r'version: (\d+)', message)
+        version = int(version_match.group(1)) if version_match else None
+        return VersionCompatibilityError(f"The image uses an unsupported message format version: {version}", version)
+    return SteganographyError(message)
+
+def _error_from_message(error_msg: str) -> SteganographyError:
+    """Map the error message of a failed decode to the matching exception"""
+    if "Unsupported message format version" in error_msg:
+        version_match = re.search(r'version: (\d+)', error_msg)
+        version = int(version_match.group(1)) if version_match else None
+        return VersionCompatibilityError(
+            f"The image uses an unsupported message format version: {version}",
+            version
+        )
+    elif "No message found" in error_msg or "not contain" in error_msg or "Failed to decode" in error_msg:
+        return NoMessageFoundError("No hidden message was found in this image")
+
+    # Generic error
+    return SteganographyError(f"API Error: {error_msg}")
+
+def _decode_result(name: str, message: Optional[str]) -> DecodeResult:
+    if message is None:
+        return DecodeResult(name, error=NoMessageFoundError("No hidden message was found in this image"))
+    return DecodeResult(name, message)
+
+def _batch_item(image: BatchImage) -> Tuple[str, Union[str, bytes]]:
+    """Return the name of a batch image and its data, left as a path until it is read"""
+    if isinstance(image, str):
+        return image, image
+    return image
+
+def _read_data(data: Union[str, bytes]) -> bytes:
+    if isinstance(data, str):
+        with open(data, 'rb') as f:
+            return f.read()
+    return data
+
+def _rewinder(image_data: Union[bytes, BinaryIO]):
+    """Return a function that moves a file object back to its current position, so it can be read again"""
+    if not hasattr(image_data, 'seek'):
+        return lambda: None
+    position = image_data.tell()
+    return lambda: image_data.seek(position)
+
+def _is_server_failure(error: Exception) -> bool:
+    """Whether an error means the server is unreachable or unhealthy, as opposed to rejecting the request"""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                          requests.exceptions.ChunkedEncodingError)):
+        return True
+    return (isinstance(error, requests.exceptions.HTTPError) and error.response is not None
+            and error.response.status_code >= 500)
+
+def _backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff delay before retry number `attempt` + 1"""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+class AsyncSteganographyAPI:
+    """Asyncio client for the Hide-rs Steganography API
+
+    Calls run on a thread pool over the pooled session of a SteganographyAPI, so timeouts, retries,
+    caching and exceptions are the same as in the synchronous client.
+    """
+
+    def __init__(self, base_url: str = "http://localhost:8080/api", cache: Optional[DecodeCache] = None,
+                 pool_size: int = 10, timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES, local: Optional[LocalSteganographyAPI] = None,
+                 breaker: Optional[CircuitBreaker] = None, offline: bool = False, prefix_upload: bool = False):
+        self.api = SteganographyAPI(base_url, cache, pool_size, timeout, retries, local, breaker, offline,
+                                    prefix_upload)
+        # One thread per pooled connection; this bounds the number of requests in flight
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="steganography-api")
+
+    async def close(self) -> None:
+        """Close the pooled connections and stop the worker threads"""
+        self._executor.shutdown(wait=False)
+        self.api.close()
+
+    async def __aenter__(self) -> "AsyncSteganographyAPI":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def health_check(self) -> Dict[str, Any]:
+        """Check if the API server is running"""
+        return await self._call(self.api.health_check)
+
+    async def encode(self, image_path: str, message: str, output_format: str = "png") -> Dict[str, Any]:
+        """Encode a message into an image using the API"""
+        return await self._call(self.api.encode, image_path, message, output_format)
+
+    async def encode_bytes(self, image_data: Union[bytes, BinaryIO], message: str, filename: str = "image.png",
+                           output_format: str = "png") -> Dict[str, Any]:
+        """Encode a message into an in-memory image (bytes or binary file object) using the API"""
+        return await self._call(self.api.encode_bytes, image_data, message, filename, output_format)
+
+    async def encode_to_file(self, image: Union[str, bytes, BinaryIO], message: str, output_path: str,
+                             output_format: str = "png", chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> Dict[str, Any]:
+        """Encode a message into an image (path, bytes or binary file object) and download the result to a file"""
+        return await self._call(self.api.encode_to_file, image, message, output_path, output_format, chunk_size)
+
+    async def encode_to_bytes(self, image: Union[str, bytes, BinaryIO], message: str, output_format: str = "png",
+                              chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> bytes:
+        """Encode a message into an image (path, bytes or binary file object) and return the encoded image"""
+        return await self._call(self.api.encode_to_bytes, image, message, output_format, chunk_size)
+
+    async def decode(self, image_path: str) -> str:
+        """Decode a message from an image using the API"""
+        return await self._call(self.api.decode, image_path)
+
+    async def decode_bytes(self, image_data: Union[bytes, BinaryIO], filename: str = "image.png") -> str:
+        """Decode a message from an in-memory image (bytes or binary file object) using the API"""
+        return await self._call(self.api.decode_bytes, image_data, filename)
+
+    async def decode_many(self, image_paths: Iterable[str], concurrency: int = 8) -> AsyncIterator[DecodeResult]:
+        """Decode many images concurrently, yielding results in completion order
+
+        At most `concurrency` requests (and no more than the pool size) are in flight at once. A failing
+        image does not stop the batch; its exception is reported in the result instead.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def decode_one(image_path: str) -> DecodeResult:
+            async with semaphore:
+                try:
+                    return DecodeResult(image_path, message=await self.decode(image_path))
+                except Exception as e:
+                    return DecodeResult(image_path, error=e)
+
+        tasks = [asyncio.ensure_future(decode_one(image_path)) for image_path in image_paths]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            # Stop pending decodes if the caller leaves the loop early
+            for task in tasks:
+                task.cancel()
+
+    async def download_image(self, image_id: str, output_path: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> None:
+        """Download an encoded image by its ID"""
+        await self._call(self.api.download_image, image_id, output_path, chunk_size)
+
+    async def check_version_compatibility(self) -> Dict[str, Any]:
+        """Check version compatibility with the server"""
+        return await self._call(self.api.check_version_compatibility)
+
+    def invalidate_cache(self, key: str) -> bool:
+        """Drop the cached decode result for a file path or content digest"""
+        return self.api.invalidate_cache(key)
+
+    def latency_stats(self) -> Dict[str, Dict[str, float]]:
+        """Return call counts and latency percentiles per backend, and the circuit state"""
+        return self.api.latency_stats()
+
+    def add_sink(self, sink: Callable[[CallRecord], None]) -> None:
+        """Send a CallRecord for every HTTP attempt to `sink`"""
+        self.api.add_sink(sink)
+
+    def remove_sink(self, sink: Callable[[CallRecord], None]) -> None:
+        self.api.remove_sink(sink)
+
+    async def _call(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
@@ -0,0 +1,296 @@
+"""
+This module provides a single steganography engine over interchangeable backends.
+
+The backends are the pure-Python and NumPy implementations of `lsb` and the remote Hide-rs API. At startup the
+engine checks which backends are available, times a short encode/decode round trip on each, and routes all calls
+to the fastest one. `lsb` and Hide-rs write different mark formats, so an image the selected backend finds no
+message in is also decoded by a backend of every other format. MP4 videos bypass the backends and are marked in
+their container by `mp4_mark`. Every backend reports failures with the exceptions of `steganography_api`.
+"""
+
+import os
+import random
+import tempfile
+import time
+from io import BytesIO
+
+import requests
+from PIL import Image
+
+import lsb
+import mp4_mark
+from decode_cache import DecodeCache
+from steganography_api import (NoMessageFoundError, SteganographyAPI, SteganographyError, VersionCompatibilityError,
+                               error_from_lsb)
+
+# Side length of the random RGB image used for calibration, and the message encoded into it.
+CALIBRATION_SIZE = 256
+CALIBRATION_MESSAGE = "Copyright_calibration_0000-00-00 00:00:00"
+CALIBRATION_ROUNDS = 3
+# Relative speedup a less preferred backend needs to be selected
+CALIBRATION_MARGIN = 0.1
+
+
+class Backend:
+    """An implementation of encoding and decoding behind the engine."""
+
+    name = ""
+    # Backends of the same mark format read each other's marks
+    mark_format = lsb.MARK_FORMAT
+
+    def available(self) -> bool:
+        """Return whether the backend can be used in this environment."""
+        return True
+
+    def encode(self, source: lsb.ImageSource, message: str, output_path: str) -> None:
+        """Encode a message into an image and write the new image as PNG to `output_path`."""
+        raise NotImplementedError
+
+    def decode(self, source: lsb.ImageSource) -> str:
+        """Decode the message of an image."""
+        raise NotImplementedError
+
+
+class LocalBackend(Backend):
+    """The `lsb` implementation, running in this process."""
+
+    def __init__(self, vectorized: bool):
+        self.vectorized = vectorized
+        self.name = "vectorized" if vectorized else "pure-python"
+
+    def available(self) -> bool:
+        return not self.vectorized or lsb.np is not None
+
+    def encode(self, source: lsb.ImageSource, message: str, output_path: str) -> None:
+        if not message:
+            raise SteganographyError("Message is empty")
+        try:
+            if self.vectorized and isinstance(source, str):
+                # Streaming bounds memory for large PNG files
+                lsb.encode(source, message, output_path, streaming=True)
+                return
+            new_image = lsb.embed_container(lsb.open_image(source), message, vectorized=self.vectorized)
+        except ValueError as e:
+            raise error_from_lsb(e) from e
+        new_image.save(output_path, "PNG")
+
+    def decode(self, source: lsb.ImageSource) -> str:
+        try:
+            return lsb.decode_image(lsb.open_image(source), vectorized=self.vectorized)
+        except ValueError as e:
+            raise error_from_lsb(e) from e
+
+
+class RemoteBackend(Backend):
+    """The Hide-rs API, reached through `SteganographyAPI`."""
+
+    name = "remote"
+    mark_format = "hide-rs"
+
+    def __init__(self, api: SteganographyAPI):
+        self.api = api
+
+    def available(self) -> bool:
+        try:
+            self.api.health_check()
+        except (requests.exceptions.RequestException, ValueError):
+            return False
+        return True
+
+    def encode(self, source: lsb.ImageSource, message: str, output_path: str) -> None:
+        if isinstance(source, Image.Image):
+            buffer = BytesIO()
+            source.save(buffer, "PNG")
+            source = buffer.getvalue()
+        self.api.encode_to_file(bytes(source) if isinstance(source, memoryview) else source, message, output_path)
+
+    def decode(self, source: lsb.ImageSource) -> str:
+        if isinstance(source, str):
+            return self.api.decode(source)
+        if isinstance(source, Image.Image):
+            buffer = BytesIO()
+            source.save(buffer, "PNG")
+            source = buffer.getvalue()
+        return self.api.decode_bytes(bytes(source) if isinstance(source, memoryview) else source)
+
+
+class SteganographyEngine:
+    """Routes encode and decode calls to the fastest available backend."""
+
+    def __init__(self, backends: list[Backend], cache: DecodeCache | None = None, calibrate: bool = True):
+        """
+        Args:
+        backends (list[Backend]): The candidate backends, in order of preference. Backends that are
+            unavailable at startup are not selected, but still read marks of their format on decode.
+        cache (DecodeCache | None): Optional cache of decode results keyed by image content.
+        calibrate (bool): Whether to time the backends; otherwise the first available one is used.
+
+        Raises:
+        SteganographyError: If no backend is available.
+        """
+        self.configured = list(backends)
+        self.backends = [backend for backend in backends if backend.available()]
+        if not self.backends:
+            raise SteganographyError("No steganography backend is available")
+
+        self.cache = cache
+        self.timings: dict[str, float] = {}
+        self.backend = self.backends[0]
+        if calibrate and len(self.backends) > 1:
+            self.timings = calibrate_backends(self.backends)
+            # A backend must beat the preferred ones by a clear margin, so timing noise does not flip the choice
+            timed = [backend for backend in self.backends if backend.name in self.timings]
+            if timed:
+                self.backend = timed[0]
+                for backend in timed[1:]:
+                    if self.timings[backend.name] < self.timings[self.backend.name] * (1 - CALIBRATION_MARGIN):
+                        self.backend = backend
+
+    @classmethod
+    def create(cls, api: SteganographyAPI | None = None, cache: DecodeCache | None = None,
+               calibrate: bool = True) -> "SteganographyEngine":
+        """
+        Build an engine over the vectorized, pure-Python and (if an API client is given) remote backends.
+
+        Args:
+        api (SteganographyAPI | None): The client of a Hide-rs server to consider.
+        cache (DecodeCache | None): Optional cache of decode results keyed by image content.
+        calibrate (bool): Whether to pick the backend by timing it.
+
+        Returns:
+        SteganographyEngine: The engine.
+        """
+        backends = [LocalBackend(vectorized=True), LocalBackend(vectorized=False)]
+        if api is not None:
+            backends.append(RemoteBackend(api))
+        return cls(backends, cache, calibrate)
+
+    @property
+    def backend_name(self) -> str:
+        return self.backend.name
+
+    def encode(self, source: lsb.ImageSource, message: str, output_path: str) -> None:
+        """
+        Encode a message into an image and write the new image as PNG.
+
+        MP4 videos are copied with the message in a metadata box instead; their frames are not decoded.
+
+        Args:
+        source (ImageSource): The image or video as a path, bytes, binary file object or image.
+        message (str): The message to be encoded.
+        output_path (str): The path of the new image or video.
+
+        Raises:
+        SteganographyError: If the message is empty or does not fit into the image.
+        """
+        if not isinstance(source, Image.Image) and mp4_mark.is_mp4(source):
+            try:
+                mp4_mark.encode(source, message, output_path)
+            except ValueError as e:
+                raise error_from_lsb(e) from e
+            return
+        self.backend.encode(source, message, output_path)
+
+    def decode(self, source: lsb.ImageSource) -> str:
+        """
+        Decode the message of an image or MP4 video.
+
+        Args:
+        source (ImageSource): The image or video as a path, bytes, binary file object or image.
+
+        Returns:
+        str: The decoded message.
+
+        Raises:
+        NoMessageFoundError: If the image holds no message; not authoritative if a backend of
+            another mark format could not be asked.
+        VersionCompatibilityError: If the message uses an unsupported format version.
+        """
+        if not isinstance(source, Image.Image) and mp4_mark.is_mp4(source):
+            # Reading the mark only parses box headers, so it is not worth caching
+            try:
+                return mp4_mark.decode(source)
+            except ValueError as e:
+                raise error_from_lsb(e) from e
+
+        if not isinstance(source, (str, bytes, bytearray, memoryview, Image.Image)):
+            source = source.read()  # The image may be read by more than one backend
+        if self.cache is None or isinstance(source, Image.Image):
+            return self._decode_any_format(source)
+
+        digest = self.cache.digest_for_path(source) if isinstance(source, str) else DecodeCache.digest(source)
+        found, message = self.cache.get(digest)
+        if not found:
+            try:
+                message = self._decode_any_format(source)
+            except NoMessageFoundError as e:
+                if not e.authoritative:
+                    raise
+                message = None
+            self.cache.put(digest, message)
+
+        if message is None:
+            raise NoMessageFoundError("No hidden message was found in this image")
+        return message
+
+    def _decode_any_format(self, source: lsb.ImageSource) -> str:
+        """Decode with the selected backend, then with the preferred backend of every other mark format."""
+        try:
+            return self.backend.decode(source)
+        except NoMessageFoundError as e:
+            authoritative = e.authoritative
+
+        formats = {self.backend.mark_format}
+        for backend in self.configured:
+            if backend.mark_format in formats:
+                continue
+            formats.add(backend.mark_format)
+            try:
+                return backend.decode(source)
+            except VersionCompatibilityError:
+                raise
+            except NoMessageFoundError as e:
+                authoritative = authoritative and e.authoritative
+            except (SteganographyError, requests.exceptions.RequestException, OSError):
+                authoritative = False  # The image may carry a mark only this backend reads
+        raise NoMessageFoundError("No hidden message was found in this image", authoritative=authoritative)
+
+    def invalidate_cache(self, key: str) -> bool:
+        """Drop the cached decode result for a file path or content digest."""
+        return self.cache.invalidate(key) if self.cache is not None else False
+
+
+def calibrate_backends(backends: list[Backend], rounds: int = CALIBRATION_ROUNDS) -> dict[str, float]:
+    """
+    Time an encode/decode round trip on a small image with every backend.
+
+    Args:
+    backends (list[Backend]): The backends to time.
+    rounds (int): The number of round trips per backend; the fastest one counts.
+
+    Returns:
+    dict[str, float]: The best round-trip time in seconds by backend name. Backends
+        that fail the round trip are left out.
+    """
+    pixels = random.Random(0).randbytes(CALIBRATION_SIZE * CALIBRATION_SIZE * 3)
+    buffer = BytesIO()
+    Image.frombytes("RGB", (CALIBRATION_SIZE, CALIBRATION_SIZE), pixels).save(buffer, "PNG", compress_level=1)
+    image_data = buffer.getvalue()
+
+    timings = {}
+    with tempfile.TemporaryDirectory(prefix="hide-calibration-") as workdir:
+        output_path = os.path.join(workdir, "calibration.png")
+        for backend in backends:
+            best = float("inf")
+            try:
+                for _ in range(rounds):
+                    start = time.perf_counter()
+                    backend.encode(image_data, CALIBRATION_MESSAGE, output_path)
+                    decoded = backend.decode(output_path)
+                    best = min(best, time.perf_counter() - start)
+            except (SteganographyError, requests.exceptions.RequestException, OSError):
+                continue
+            if decoded == CALIBRATION_MESSAGE:
+                timings[backend.name] = best
+    return timings
+
@@ -0,0 +1,77 @@
+"""`AsyncSteganographyAPI.decode_many` against the stand-in server with added latency."""
+
+import asyncio
+import time
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import lsb
+from stand_in_server import ServerConfig, StandInServer
+from steganography_api import AsyncSteganographyAPI, NoMessageFoundError
+
+# Seconds the server waits before answering each request.
+LATENCY = 0.2
+IMAGE_COUNT = 8
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = StandInServer(("127.0.0.1", 0), ServerConfig(latency=LATENCY))
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="module")
+def marked_images(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("async")
+    images = {}
+    for index in range(IMAGE_COUNT):
+        buffer = BytesIO()
+        Image.new("RGB", (64, 64), (index, 2 * index, 3 * index)).save(buffer, "PNG")
+        message = f"Copyright_user{index}_2024-01-01 10:00:00"
+        path = directory / f"marked{index}.png"
+        path.write_bytes(lsb.encode_bytes(buffer.getvalue(), message))
+        images[str(path)] = message
+    return images
+
+
+def decode_all(base_url, paths, concurrency):
+    async def run():
+        async with AsyncSteganographyAPI(base_url, retries=0) as api:
+            return [result async for result in api.decode_many(paths, concurrency=concurrency)]
+
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    return results, time.perf_counter() - start
+
+
+def test_decode_many_overlaps_requests(server, marked_images):
+    results, elapsed = decode_all(server.base_url, list(marked_images), concurrency=IMAGE_COUNT)
+
+    assert {result.path: result.message for result in results} == marked_images
+    assert all(result.error is None for result in results)
+    # Sequential decodes would take IMAGE_COUNT * LATENCY
+    assert elapsed < IMAGE_COUNT * LATENCY / 2, f"{elapsed:.2f} s"
+
+
+def test_decode_many_bounds_requests_in_flight(server, marked_images):
+    results, elapsed = decode_all(server.base_url, list(marked_images), concurrency=2)
+
+    assert len(results) == IMAGE_COUNT
+    assert elapsed >= IMAGE_COUNT / 2 * LATENCY, f"{elapsed:.2f} s"
+
+
+def test_decode_many_reports_failures_per_image(server, marked_images, tmp_path):
+    unmarked = tmp_path / "unmarked.png"
+    Image.new("RGB", (64, 64), (255, 255, 255)).save(unmarked, "PNG")
+    paths = [*marked_images, str(unmarked)]
+
+    results, _ = decode_all(server.base_url, paths, concurrency=4)
+
+    errors = {result.path: result.error for result in results if result.error is not None}
+    assert list(errors) == [str(unmarked)]
+    assert isinstance(errors[str(unmarked)], NoMessageFoundError)
@@ -0,0 +1,82 @@
+"""Batches must answer every image, whether the server streams the batch, lacks the endpoint or breaks off."""
+
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import lsb
+import stand_in_server
+from stand_in_server import ServerConfig, StandInServer
+from steganography_api import NoMessageFoundError, SteganographyAPI
+
+MESSAGE = "Copyright_alice_2024-01-01 10:00:00"
+
+
+def png(color):
+    buffer = BytesIO()
+    Image.new("RGB", (64, 64), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(config):
+        server = StandInServer(("127.0.0.1", 0), config)
+        server.start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+CONFIGS = {
+    "batch": ServerConfig(),
+    "no batch endpoint": ServerConfig(batch=False),
+    "batch breaks off": ServerConfig(batch_cutoff=2),
+}
+
+
+@pytest.mark.parametrize("config", CONFIGS, ids=list(CONFIGS))
+def test_decode_batch(serve, config):
+    server = serve(CONFIGS[config])
+    images = [(f"{i}.png", lsb.encode_bytes(png((i, 0, 0)), f"{MESSAGE} {i}")) for i in range(4)]
+    images.append(("unmarked.png", png((9, 9, 9))))
+    with SteganographyAPI(server.base_url, retries=0) as api:
+        results = {result.path: result for result in api.decode_batch(images)}
+        assert api.batch_supported == (config != "no batch endpoint")
+    assert {path: result.message for path, result in results.items() if result.error is None} == {
+        f"{i}.png": f"{MESSAGE} {i}" for i in range(4)
+    }
+    assert isinstance(results["unmarked.png"].error, NoMessageFoundError)
+
+
+@pytest.mark.parametrize("config", CONFIGS, ids=list(CONFIGS))
+def test_encode_batch(serve, config):
+    server = serve(CONFIGS[config])
+    images = [(f"{i}.png", png((i, 0, 0))) for i in range(4)]
+    messages = [f"{MESSAGE} {i}" for i in range(4)]
+    with SteganographyAPI(server.base_url, retries=0) as api:
+        results = {result.path: result for result in api.encode_batch(images, messages)}
+        assert api.batch_supported == (config != "no batch endpoint")
+        for i in range(4):
+            result = results[f"{i}.png"]
+            assert result.error is None
+            assert lsb.decode_bytes(server.images[result.result["image_id"]]) == messages[i]
+
+
+def test_rejected_batch_falls_back_without_tripping_the_breaker(serve, monkeypatch):
+    monkeypatch.setattr(stand_in_server._Handler, "_send_batch",
+                        lambda handler, path, parts: handler._send_json(400, {"status": "error", "message": "Bad batch"}))
+    server = serve(ServerConfig())
+    images = [(f"{i}.png", lsb.encode_bytes(png((i, 0, 0)), MESSAGE)) for i in range(3)]
+    with SteganographyAPI(server.base_url, retries=0) as api:
+        results = list(api.decode_batch(images))
+        assert [result.message for result in results] == [MESSAGE] * 3
+        assert api.batch_supported
+        assert api.breaker.state == api.breaker.CLOSED
@@ -0,0 +1,79 @@
+"""The job queue retries with backoff, deduplicates by idempotency key, bounds its depth and drops stale results."""
+
+import pytest
+
+import job_queue
+from job_queue import JobQueue, QueueFullError, WorkerPool
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), max_depth=3)
+    yield queue
+    queue.close()
+
+
+def due_now(queue, job_id):
+    """Skip the backoff delay of a queued retry."""
+    queue._conn.execute("UPDATE jobs SET run_after=0 WHERE id=?", (job_id,))
+
+
+def test_failed_attempts_are_retried_with_backoff_until_max_attempts(queue, monkeypatch):
+    monkeypatch.setattr(job_queue.time, "time", lambda: 1000.0)
+    job = queue.enqueue("work", {"n": 1}, max_attempts=2)
+
+    first = queue.fail(queue.claim(), "boom")
+    assert (first.status, first.attempts, first.error) == (JobQueue.QUEUED, 1, "boom")
+    assert queue.claim() is None  # Not due until the retry delay has passed
+    assert queue._conn.execute("SELECT run_after FROM jobs").fetchone()[0] == 1000.0 + job_queue.RETRY_DELAY
+
+    due_now(queue, job.id)
+    second = queue.fail(queue.claim(), "boom again")
+    assert (second.status, second.attempts) == (JobQueue.FAILED, 2)
+    assert queue.claim() is None
+
+
+def test_idempotency_key_deduplicates_unfinished_jobs_and_restarts_finished_ones(queue):
+    job = queue.enqueue("work", {"n": 1}, key="upload-1")
+    assert queue.enqueue("work", {"n": 2}, key="upload-1") == job
+    queue.complete(queue.claim(), {"ok": True})
+    assert queue.get(job.id).result == {"ok": True}
+
+    restarted = queue.enqueue("work", {"n": 3}, key="upload-1")
+    assert (restarted.id, restarted.status, restarted.attempts) == (job.id, JobQueue.QUEUED, 0)
+    assert restarted.payload == {"n": 3} and restarted.result is None
+
+
+def test_depth_admission(queue):
+    jobs = [queue.enqueue("work", {"n": n}) for n in range(3)]
+    with pytest.raises(QueueFullError):
+        queue.enqueue("work", {"n": 3})
+    queue.complete(queue.claim(), None)
+    assert queue.depth() == 2
+    assert queue.enqueue("work", {"n": 3}).id > jobs[-1].id
+
+
+def test_stale_attempt_cannot_finish_a_job_claimed_again(queue):
+    job = queue.enqueue("work", {"n": 1})
+    stale = queue.claim()
+    assert queue.requeue_stale(stale_after=-1) == 1
+    current = queue.claim()
+
+    assert not queue.complete(stale, {"worker": "stale"})
+    assert queue.fail(stale, "late failure") is None
+    assert queue.get(job.id).status == JobQueue.RUNNING
+
+    assert queue.complete(current, {"worker": "current"})
+    assert queue.get(job.id).result == {"worker": "current"}
+
+
+def test_worker_pool_records_handler_results_and_failures(queue):
+    pool = WorkerPool(queue, {"double": lambda payload: {"value": payload["n"] * 2}})
+    done = queue.enqueue("double", {"n": 21})
+    unknown = queue.enqueue("unknown", {}, max_attempts=1)
+
+    assert pool.run_once() and pool.run_once()
+    assert not pool.run_once()
+    assert queue.get(done.id).result == {"value": 42}
+    assert queue.get(unknown.id).status == JobQueue.FAILED
+    assert queue.get(unknown.id).error.startswith("LookupError")
@@ -0,0 +1,42 @@
+"""Peak memory of `lsb.encode_streaming` on a 50 MP PNG."""
+
+import tracemalloc
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import lsb
+import lsb_probe
+
+# About 50 MP at 3:2; decoded, the image takes 143 MB.
+WIDTH, HEIGHT = 8660, 5774
+# Streaming keeps at most one band of rows and the payload bits in memory.
+PEAK_LIMIT_MB = 32
+
+
+@pytest.fixture(scope="module")
+def large_png(tmp_path_factory):
+    path = tmp_path_factory.mktemp("streaming") / "50mp.png"
+    # Random rows repeated down the image: realistic filtering, quick to compress.
+    rows = np.random.default_rng(0).integers(0, 256, (16, WIDTH, 3), dtype=np.uint8)
+    Image.fromarray(np.tile(rows, (-(-HEIGHT // 16), 1, 1))[:HEIGHT]).save(path, "PNG", compress_level=1)
+    return str(path)
+
+
+@pytest.mark.parametrize("payload_bytes", [64, 64 * 1024])
+def test_streaming_encode_peak_memory(large_png, tmp_path, payload_bytes):
+    message = "Copyright_alice_2024-01-01 10:00:00".ljust(payload_bytes, "x")
+    output = str(tmp_path / "encoded.png")
+
+    tracemalloc.start()
+    try:
+        lsb.encode_streaming(large_png, message, output)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert peak < PEAK_LIMIT_MB * 2 ** 20, f"peak {peak / 2 ** 20:.1f} MB"
+    result = lsb_probe.probe(output)
+    assert result.message == message
+    assert Image.open(output).size == (WIDTH, HEIGHT)
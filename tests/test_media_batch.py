@@ -0,0 +1,56 @@
+"""Batch runs resume from the manifest and dry runs report capacity without writing anything."""
+
+import io
+import json
+import os
+
+from PIL import Image
+
+import lsb
+import media_batch
+
+
+def write_image(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new("RGB", size, (120, 80, 40)).save(path)
+
+
+def run(command, root, manifest, **kwargs):
+    return media_batch.run(command, str(root), str(manifest), workers=1, progress=io.StringIO(), **kwargs)
+
+
+def test_resume_skips_recorded_files_and_retries_errors(tmp_path):
+    root = tmp_path / "media"
+    manifest = tmp_path / "manifest.jsonl"
+    write_image(str(root / "alice" / "a.png"), (64, 64))
+    write_image(str(root / "alice" / "b.png"), (64, 64))
+    broken = root / "bob" / "c.png"
+    broken.parent.mkdir()
+    broken.write_bytes(b"not an image")
+
+    assert run("encode", root, manifest) == {"encoded": 2, "error": 1}
+    assert lsb.decode(str(root / "alice" / "encoded_a.png")).startswith("Copyright_alice_")
+
+    # The recorded images are skipped; the broken one is tried again and succeeds once replaced
+    write_image(str(broken), (64, 64))
+    assert run("encode", root, manifest) == {"skipped": 2, "encoded": 1}
+    assert lsb.decode(str(root / "bob" / "encoded_c.png")).startswith("Copyright_bob_")
+    assert run("encode", root, manifest) == {"skipped": 3}
+
+    records = [json.loads(line) for line in manifest.read_text().splitlines()]
+    assert [record["status"] for record in records if record["path"].endswith("c.png")] == ["error", "encoded"]
+
+
+def test_dry_run_reports_capacity_without_writing(tmp_path):
+    root = tmp_path / "media"
+    manifest = tmp_path / "manifest.jsonl"
+    write_image(str(root / "alice" / "large.png"), (64, 64))
+    write_image(str(root / "alice" / "tiny.png"), (4, 4))
+    progress = io.StringIO()
+
+    counts = media_batch.run("encode", str(root), str(manifest), workers=1, dry_run=True, progress=progress)
+
+    assert counts == {"fits": 1, "too_large": 1}
+    assert "too_large: " + str(root / "alice" / "tiny.png") in progress.getvalue()
+    assert not manifest.exists()
+    assert sorted(os.listdir(root / "alice")) == ["large.png", "tiny.png"]
@@ -0,0 +1,32 @@
+"""References share blobs, so files the app rewrites in place must never be references."""
+
+import os
+
+from PIL import Image
+
+from media_store import MediaStore
+
+
+def png_bytes(tmp_path, color):
+    path = tmp_path / f"{color}.png"
+    Image.new("RGB", (32, 32), color).save(path)
+    return path.read_bytes()
+
+
+def test_saving_a_profile_picture_leaves_deduplicated_posts_unchanged(tmp_path):
+    store = MediaStore(str(tmp_path / "media"), str(tmp_path / "media_store.db"))
+    post = png_bytes(tmp_path, "red")
+    bob_post = store.add(post, "bob", "sunset.png")
+    alice_post = store.add(post, "alice", "profile_pic.png")
+
+    assert os.path.basename(alice_post) != "profile_pic.png"
+    assert os.path.samefile(alice_post, bob_post)
+
+    # The profile page writes the picture in place
+    Image.new("RGB", (32, 32), "blue").save(tmp_path / "media" / "alice" / "profile_pic.png")
+
+    with open(bob_post, "rb") as f:
+        assert f.read() == post
+    with open(alice_post, "rb") as f:
+        assert f.read() == post
+    assert store.digest_of(alice_post) == store.digest_of(bob_post)
@@ -0,0 +1,128 @@
+"""Decodes that upload a prefix strip must answer like decodes of the full image."""
+
+from io import BytesIO
+
+import numpy as np
+import pytest
+import requests
+from PIL import Image
+
+import lsb
+from stand_in_server import ServerConfig, StandInServer
+from steganography_api import SteganographyAPI, SteganographyError
+
+MESSAGE = "Copyright_alice_2024-01-01 10:00:00"
+WIDTH, HEIGHT = 640, 480
+
+
+def png(image):
+    buffer = BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def embed(cover, payload):
+    """Write raw bytes one bit per RGB value from the first pixel, as the container and null-terminated formats do."""
+    array = np.array(cover)
+    lsb.embed_bytes_array(array, payload)
+    return png(Image.fromarray(array))
+
+
+def unsupported_version(cover):
+    container = bytearray(lsb.build_container(MESSAGE))
+    container[4] = 9
+    return embed(cover, bytes(container))
+
+
+def legacy(cover, message):
+    image = cover.copy()
+    lsb.embed_data(image, message)
+    return png(image)
+
+
+@pytest.fixture(scope="module")
+def images():
+    cover = Image.fromarray(np.random.default_rng(0).integers(0, 256, (HEIGHT, WIDTH, 3), dtype=np.uint8))
+    jpeg = BytesIO()
+    cover.save(jpeg, "JPEG", quality=90)
+    return {
+        "container": lsb.encode_bytes(png(cover), MESSAGE),
+        "dense": lsb.encode_bytes(png(cover), MESSAGE, bits_per_channel=2),
+        "legacy": legacy(cover, MESSAGE),
+        "legacy past the strip": legacy(cover, MESSAGE.ljust(4096, "x")),
+        "null-terminated": embed(cover, MESSAGE.encode() + b"\0"),
+        "unsupported version": unsupported_version(cover),
+        "unmarked": png(cover),
+        "unmarked flat": png(Image.new("RGB", (WIDTH, HEIGHT), (200, 100, 50))),
+        "jpeg": jpeg.getvalue(),
+        "palette": png(cover.quantize(64)),
+        "marked palette": lsb.encode_bytes(png(cover.quantize(64)), MESSAGE),
+    }
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = StandInServer(("127.0.0.1", 0))
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def decode(base_url, data, prefix_upload):
+    """Return the outcome of a decode and the bytes uploaded to /decode."""
+    records = []
+    api = SteganographyAPI(base_url, retries=0, prefix_upload=prefix_upload)
+    api.add_sink(records.append)
+    try:
+        outcome = ("message", api.decode_bytes(data))
+    except SteganographyError as e:
+        outcome = (type(e).__name__, str(e))
+    finally:
+        api.close()
+    return outcome, sum(record.request_bytes for record in records if record.endpoint == "/decode")
+
+
+@pytest.mark.parametrize("name", [
+    "container", "dense", "legacy", "legacy past the strip", "null-terminated", "unsupported version",
+    "unmarked", "unmarked flat", "jpeg", "palette", "marked palette",
+])
+def test_strip_decode_matches_full_decode(server, images, name):
+    full, _ = decode(server.base_url, images[name], prefix_upload=False)
+    strip, _ = decode(server.base_url, images[name], prefix_upload=True)
+    assert strip == full
+
+
+def test_strip_uploads_less_than_the_image(server, images):
+    outcome, full_bytes = decode(server.base_url, images["container"], prefix_upload=False)
+    assert outcome == ("message", MESSAGE)
+    _, strip_bytes = decode(server.base_url, images["container"], prefix_upload=True)
+    assert strip_bytes < full_bytes / 10
+
+
+def test_full_image_sent_to_servers_of_unknown_mark_format(images):
+    server = StandInServer(("127.0.0.1", 0), ServerConfig(mark_format=None))
+    server.start()
+    try:
+        full = decode(server.base_url, images["container"], prefix_upload=False)
+        assert decode(server.base_url, images["container"], prefix_upload=True) == full
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_failed_mark_format_lookup_is_not_repeated(images):
+    server = StandInServer(("127.0.0.1", 0), ServerConfig(error_rate=1.0))
+    server.start()
+    records = []
+    api = SteganographyAPI(server.base_url, retries=2, prefix_upload=True)
+    api.add_sink(records.append)
+    try:
+        for _ in range(3):
+            with pytest.raises(requests.exceptions.HTTPError):
+                api.decode_bytes(images["container"])
+    finally:
+        api.close()
+        server.shutdown()
+        server.server_close()
+    assert [record.endpoint for record in records].count("/version") == 1
@@ -0,0 +1,77 @@
+"""Renditions are built in the background, evicted least recently used first, and rebuilt lazily."""
+
+import os
+import time
+
+import pytest
+from PIL import Image
+
+from thumbnails import ThumbnailCache
+
+
+def wait_for(cache, source, digest, size=None):
+    for _ in range(200):
+        path = cache.get(source, digest, size)
+        if path is not None:
+            return path
+        time.sleep(0.01)
+    raise AssertionError("the rendition was never built")
+
+
+@pytest.fixture
+def originals(tmp_path):
+    paths = {}
+    for i in range(3):
+        path = tmp_path / f"{i}.png"
+        Image.new("RGB", (1600, 1200), (i * 80, 100, 50)).save(path)
+        paths[f"digest{i}"] = str(path)
+    return paths
+
+
+def test_get_queues_a_missing_rendition_without_waiting(tmp_path, originals):
+    cache = ThumbnailCache(str(tmp_path / "cache"))
+    try:
+        source = originals["digest0"]
+        assert cache.get(source, "digest0") is None
+        with Image.open(wait_for(cache, source, "digest0")) as thumbnail:
+            assert max(thumbnail.size) == cache.size
+        with Image.open(wait_for(cache, source, "digest0", cache.preview_size)) as preview:
+            assert max(preview.size) == cache.preview_size
+    finally:
+        cache.shutdown()
+
+
+def test_least_recently_used_rendition_is_evicted_and_rebuilt(tmp_path, originals):
+    cache = ThumbnailCache(str(tmp_path / "cache"))
+    try:
+        for digest, source in originals.items():
+            cache.submit(source, digest).result()
+            os.utime(cache.path_for(digest), (1, 1) if digest == "digest0" else None)
+        assert cache.get(originals["digest1"], "digest1") is not None  # Refreshes its mtime
+
+        # Shrink the cache so the next build evicts, leaving room for about two thumbnails
+        sizes = sorted(os.path.getsize(cache.path_for(digest)) for digest in originals)
+        cache.max_bytes = (sizes[-1] + sizes[-2]) / 0.9
+        os.remove(cache.path_for("digest2"))
+        cache.submit(originals["digest2"], "digest2").result()
+
+        assert not os.path.exists(cache.path_for("digest0"))
+        assert os.path.exists(cache.path_for("digest1"))
+        assert cache.get(originals["digest0"], "digest0") is None
+        assert wait_for(cache, originals["digest0"], "digest0") == cache.path_for("digest0")
+    finally:
+        cache.shutdown()
+
+
+def test_unreadable_original_raises_instead_of_rebuilding(tmp_path):
+    source = tmp_path / "broken.png"
+    source.write_bytes(b"not an image")
+    cache = ThumbnailCache(str(tmp_path / "cache"))
+    try:
+        assert cache.get(str(source), "broken") is None
+        with pytest.raises(OSError):
+            for _ in range(200):
+                cache.get(str(source), "broken")
+                time.sleep(0.01)
+    finally:
+        cache.shutdown()
@@ -0,0 +1,145 @@
+# thumbnails.py
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+
+from PIL import Image, ImageOps, features
+
+# Longest side of a thumbnail in pixels; twice the 200 px feed width so it stays sharp on high-density screens
+THUMBNAIL_SIZE = 400
+# Longest side of the preview rendition, shown when a single post is viewed
+PREVIEW_SIZE = 1280
+# Total size of the cache directory before the least recently used thumbnails are deleted
+DEFAULT_MAX_BYTES = 256 << 20
+# Eviction deletes down to this fraction of `max_bytes`, so it does not rescan the directory on every new thumbnail
+EVICT_TO = 0.9
+WEBP_QUALITY = 80
+
+class ThumbnailCache:
+    """Content-addressed cache of WebP renditions of the image posts: feed thumbnails and larger previews
+
+    Renditions are named after the SHA-256 of the original (as stored in the post index) and the size, so
+    identical uploads share one file and a changed original never gets a stale rendition. Once the directory
+    exceeds `max_bytes`, the least recently used files are deleted; a hit refreshes the file's mtime.
+    New posts are rendered on a background worker with `submit`; `get` never waits, it queues missing or
+    evicted renditions and returns None until they are built.
+    """
+
+    def __init__(self, cache_dir: str = "thumbnails", max_bytes: int = DEFAULT_MAX_BYTES,
+                 size: int = THUMBNAIL_SIZE, workers: int = 1, preview_size: int = PREVIEW_SIZE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.size = size
+        self.preview_size = preview_size
+        self.format, self.extension = ("WEBP", "webp") if features.check("webp") else ("JPEG", "jpg")
+        self._lock = threading.Lock()
+        # In-flight generations by path, so a thumbnail is built once even if requested concurrently
+        self._pending: Dict[str, Future] = {}
+        # Originals that could not be rendered, by path, so they are not retried on every request
+        self._failed: Dict[str, Exception] = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnails")
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    def path_for(self, digest: str, size: Optional[int] = None) -> str:
+        """Return where the rendition of an original with this SHA-256 is stored; the thumbnail by default"""
+        size = size or self.size
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}_{size}.{self.extension}")
+
+    def submit(self, source_path: str, digest: str, size: Optional[int] = None) -> Future:
+        """Build a rendition on the background worker; the future resolves to its path"""
+        size = size or self.size
+        path = self.path_for(digest, size)
+        with self._lock:
+            future = self._pending.get(path)
+            if future is None:
+                future = self._pending[path] = self._executor.submit(self._build, source_path, path, size)
+                future.add_done_callback(lambda done: self._forget(path, done))
+        return future
+
+    def get(self, source_path: str, digest: str, size: Optional[int] = None) -> Optional[str]:
+        """Return the rendition of an image, or None while it is built because it is missing or was evicted
+
+        Raises the error of an earlier build if the original cannot be rendered.
+        """
+        path = self.path_for(digest, size)
+        try:
+            os.utime(path)  # Mark as recently used
+            return path
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            error = self._failed.get(path)
+        if error is not None:
+            raise error
+        self.submit(source_path, digest, size)
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of thumbnails and their total size in bytes"""
+        with self._lock:
+            return {'files': sum(1 for _ in self._entries()), 'bytes': self._total_bytes}
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _build(self, source_path: str, path: str, size: int) -> str:
+        if os.path.exists(path):
+            return path
+        with Image.open(source_path) as image:
+            image.draft("RGB", (size, size))  # JPEG originals are decoded at a reduced scale
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+            if self.format == "JPEG" and image.mode == "RGBA":
+                image = image.convert("RGB")
+
+            # Written under a temporary name, so readers never see a partial file
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".thumbnail-")
+            with os.fdopen(fd, 'wb') as f:
+                image.save(f, self.format, quality=WEBP_QUALITY)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self._total_bytes += os.path.getsize(path)
+            if self._total_bytes > self.max_bytes:
+                self._evict(keep=path)
+        return path
+
+    def _evict(self, keep: str) -> None:
+        """Delete the least recently used thumbnails until the cache is below `EVICT_TO` of `max_bytes`"""
+        entries = sorted(self._entries())
+        self._total_bytes = sum(size for _, size, _ in entries)  # Also corrects for files removed by others
+        for mtime, size, path in entries:
+            if self._total_bytes <= self.max_bytes * EVICT_TO:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._total_bytes -= size
+
+    def _entries(self):
+        """Yield (mtime, size, path) of every cached thumbnail"""
+        for directory, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.startswith('.'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def _forget(self, path: str, future: Future) -> None:
+        with self._lock:
+            self._pending.pop(path, None)
+            if isinstance(future.exception(), (OSError, ValueError)):
+                self._failed[path] = future.exception()